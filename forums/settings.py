@@ -240,6 +240,120 @@ MODERATOR_ACTIVATED = False
 # Maximum file size limit in bytes
 MAXIMUM_FILE_SIZE = MAX_FILE_SIZE_MB * 1024 * 1024
 
+####################################
+    ##  SPAM FILTER CONFIGURATION ##
+####################################
+
+# Directory holding the trained spam model artifacts
+SPAM_MODEL_DIR = os.path.join(PROJECT_DIR, 'spam_models')
+
+# Tests run with a temporary SPAM_MODEL_DIR, and never touch the models above
+TEST_RUNNER = 'website.tests.runner.TestRunner'
+
+# Number of model artifacts kept on disk, older ones are removed
+SPAM_MODEL_KEEP = 5
+
+# Seconds between checks for a model artifact trained by another process
+SPAM_MODEL_RELOAD_INTERVAL = 60
+
+# Retrain in a background thread when a moderator asks for it
+SPAM_TRAIN_IN_BACKGROUND = True
+
+# Days the status of a finished retraining job is kept, older ones are removed
+# when the next job starts
+SPAM_JOB_KEEP_DAYS = 7
+
+# Processes cleaning the posts when training, 1 cleans them in the training process
+# itself. The train_spam_filter command uses all CPUs unless told otherwise.
+SPAM_TRAIN_WORKERS = 1
+
+# Posts read from the database and handed to a worker at a time
+SPAM_CLEAN_CHUNK_SIZE = 500
+
+# Features of the spam model: 'tfidf' keeps a vocabulary of every word seen in
+# training, 'hashing' hashes the words into SPAM_HASHING_FEATURES columns, so the
+# model takes the same memory however many posts the forum has. SPAM_HASHING_IDF
+# weights the hashed features by inverse document frequency, as 'tfidf' does.
+SPAM_VECTORIZER = 'tfidf'
+SPAM_HASHING_FEATURES = 2 ** 18
+SPAM_HASHING_IDF = True
+
+# Train a model of its own for every category with at least SPAM_CATEGORY_MIN_POSTS
+# labelled posts, SPAM_CATEGORY_MIN_SPAM of them spam, next to the global model.
+# Posts of other categories are scored by the global model. Not used online.
+SPAM_CATEGORY_MODELS = False
+SPAM_CATEGORY_MIN_POSTS = 200
+SPAM_CATEGORY_MIN_SPAM = 20
+
+# Store the arrays of every trained model in a layout the server processes map
+# read-only, so that they share one copy of the model in memory
+SPAM_MODEL_SHARED = True
+
+# Keep the cleaned posts between trainings, so that only new or edited posts are cleaned again
+SPAM_CORPUS_CACHE = True
+
+# Online learning: a linear model over hashed features that is updated with every
+# moderator spam/non-spam decision, the nightly full training stays as a fallback
+SPAM_FILTER_ONLINE = False
+SPAM_ONLINE_FEATURES = 2 ** 20
+
+# Verdicts remembered for repeated posts, 0 turns the cache off
+SPAM_PREDICT_CACHE_SIZE = 10000
+
+# Spam scores are the decision margin of the model, above 0 is spam. New posts scoring
+# from SPAM_SCORE_REVIEW up to SPAM_SCORE_SPAM are hidden and held for a moderator in
+# the review queue, posts scoring higher are hidden as spam. Posts with links score
+# at least SPAM_LINK_SCORE.
+SPAM_SCORE_REVIEW = -0.25
+SPAM_SCORE_SPAM = 0.25
+SPAM_LINK_SCORE = 1.0
+
+# Index of near-duplicate posts: new posts sharing at least SPAM_DUPLICATE_SIMILARITY
+# of their word pairs with known spam are spam without asking the model, and
+# near-duplicate questions are shown as possible duplicates. Posts shorter than
+# SPAM_DUPLICATE_MIN_WORDS words are not indexed.
+SPAM_DUPLICATE_INDEX = True
+SPAM_DUPLICATE_SIMILARITY = 0.6
+SPAM_DUPLICATE_MIN_WORDS = 10
+
+# Score new posts with a candidate model (train_spam_filter --candidate) next to the
+# live one, in a background thread of every server process, to compare the two
+# before promoting the candidate. Posts beyond SPAM_SHADOW_QUEUE_SIZE waiting to
+# be scored are skipped.
+SPAM_SHADOW_SCORING = True
+SPAM_SHADOW_IN_BACKGROUND = True
+SPAM_SHADOW_QUEUE_SIZE = 1000
+
+# Save new posts straight away and classify them off the request path. They stay
+# hidden until the consumer, a 'thread' in every server process or the
+# process_spam_queue 'command', has classified them.
+SPAM_CLASSIFY_QUEUE = False
+SPAM_QUEUE_CONSUMER = 'thread'
+SPAM_QUEUE_BATCH_SIZE = 50
+SPAM_QUEUE_POLL_INTERVAL = 5
+
+# Posts classified and written back at a time by the rescore_spam command
+SPAM_RESCORE_CHUNK_SIZE = 5000
+
+# Addresses allowed to read the spam filter metrics without logging in as a moderator,
+# e.g. the address of a metrics collector. Only REMOTE_ADDR is checked: behind a
+# reverse proxy on the same host every request comes from 127.0.0.1, so do not list
+# the address of the proxy, and have it deny /moderator/spam_metrics/ to outside clients.
+SPAM_METRICS_IPS = []
+
+# Question views are counted in memory by every server process and written to the
+# database every QUESTION_VIEWS_FLUSH_INTERVAL seconds, or once QUESTION_VIEWS_BUFFER_SIZE
+# questions and viewers are waiting. 0 writes every view at once.
+QUESTION_VIEWS_FLUSH_INTERVAL = 10
+QUESTION_VIEWS_BUFFER_SIZE = 10000
+
+# Logged in users count once per question. The viewers are remembered as a userViews row
+# each with 'table', or with 'sketch' as a HyperLogLog estimate of their number, within a
+# few percent, in 2 ** QUESTION_VIEWERS_PRECISION one byte registers per question. The
+# build_viewer_sketches command turns the userViews rows into sketches.
+QUESTION_VIEWERS = 'table'
+QUESTION_VIEWERS_PRECISION = 10
+
 ####################################
     ##  CKEDITOR CONFIGURATION ##
 ####################################
@@ -154,7 +154,7 @@ def account_view_profile(request, user_id=None):
     flag = False
 
     questions = Question.objects.filter(user_id = user_id).order_by('date_created').reverse()
-    answers = Answer.objects.filter(uid = user_id).order_by('date_created').reverse()
+    answers = Answer.objects.filter(author_id = user_id).select_related('question').order_by('date_created').reverse()
     form = ProfileForm(user, instance = profile)
 
     if str(user_id) == str(request.user.id):
@@ -37,6 +37,18 @@ activate_this = '/Sites/newforums_fossee_in/django/bin/activate_this.py'
 from django.core.wsgi import get_wsgi_application
 application = get_wsgi_application()
 
+# Start the spam classification queue consumer of this server process now, so
+# that posts left pending by a restart are classified without waiting for a new one
+from django.conf import settings
+if settings.SPAM_CLASSIFY_QUEUE and settings.SPAM_QUEUE_CONSUMER == 'thread':
+    from website.spam import spamQueue
+    spamQueue.start_consumer()
+
+# Question views still buffered by this server process are written when it exits
+import atexit
+from website import viewCounter
+atexit.register(viewCounter.flush)
+
 # Apply WSGI middleware here.
 # from helloworld.wsgi import HelloWorldApplication
 # application = HelloWorldApplication(application)
@@ -1,49 +1,79 @@
 from bs4 import BeautifulSoup
+from functools import lru_cache
 import re
 import nltk
 
-def clean_string(myString):
+# Normalises post bodies for the spam filter. The regular expressions are
+# compiled and the stemmer is created once, and the stem of every distinct
+# word is remembered, as the same words come up in post after post.
+class TextNormaliser(object):
+
+    # URLs to 'httpaddr', images to 'imgtag' and email addresses to 'emailaddr'
+    url_pattern = re.compile(r'(http|https)://[^\s]*')
+    img_pattern = re.compile(r'<img([\w\W]+?)>')
+    email_pattern = re.compile(r'[^\s]+@[^\s]+[.][^\s]+')
+
+    # numbers to 'number', and $, ! and ? to proper words
+    number_pattern = re.compile(r'[0-9]+')
+    dollar_pattern = re.compile(r'[$]')
+    exclammark_pattern = re.compile(r'[!]')
+    questmark_pattern = re.compile(r'[?]')
+
+    # other punctuation, newlines, blanklines and extra whitespace
+    punctuation_pattern = re.compile(r'([^\w\s]+)|([_-]+)')
+    newline_pattern = re.compile(r'\n')
+    blankline_pattern = re.compile(r'\n\n')
+    whitespace_pattern = re.compile(r'\s+')
 
-    # convert text to lowercase
-    myString = myString.lower()
+    def __init__(self, stem_cache_size = 50000):
+        self.stemmer = nltk.stem.snowball.SnowballStemmer('english')
+        self.stem = lru_cache(maxsize = stem_cache_size)(self.stemmer.stem)
 
-    # convert URLs to 'httpaddr'
-    myString = re.sub(r'(http|https)://[^\s]*', r' httpaddr ', myString)
-    myString = re.sub(r'<img([\w\W]+?)>', r' imgtag ', myString)
+    def clean(self, myString):
 
-    # convert email addresses to 'emailaddr'
-    myString = re.sub(r'[^\s]+@[^\s]+[.][^\s]+', r' emailaddr ', myString)
+        # convert text to lowercase
+        myString = myString.lower()
 
-    # convert all hyperlinks to 'linktag'
-    soup = BeautifulSoup(myString, 'html.parser')
-    myString = soup.get_text()
-    numberLink = len(soup.find_all('a'))
-    numberImg = len(soup.find_all('img'))
-    myString = myString + numberLink * ' linktag ' + numberImg * ' imgtag '
+        # convert URLs to 'httpaddr'
+        myString = self.url_pattern.sub(r' httpaddr ', myString)
+        myString = self.img_pattern.sub(r' imgtag ', myString)
 
-    # convert numbers to 'number'
-    myString = re.sub(r'[0-9]+', r' number ', myString)
+        # convert email addresses to 'emailaddr'
+        myString = self.email_pattern.sub(r' emailaddr ', myString)
 
-    # convert $, ! and ? to proper words
-    myString = re.sub(r'[$]', r' dollar ', myString)
-    myString = re.sub(r'[!]', r' exclammark ', myString)
-    myString = re.sub(r'[?]', r' questmark ', myString)
+        # convert all hyperlinks to 'linktag'
+        soup = BeautifulSoup(myString, 'html.parser')
+        myString = soup.get_text()
+        numberLink = len(soup.find_all('a'))
+        numberImg = len(soup.find_all('img'))
+        myString = myString + numberLink * ' linktag ' + numberImg * ' imgtag '
 
-    # convert other punctuation to whitespace
-    myString = re.sub(r'([^\w\s]+)|([_-]+)', r' ', myString)
+        # convert numbers to 'number'
+        myString = self.number_pattern.sub(r' number ', myString)
 
-    # convert newlines and blanklines to special strings and extra whitespace to single
-    myString = re.sub(r'\n', r' newline ', myString)
-    myString = re.sub(r'\n\n', r' blankline ', myString)
-    myString = re.sub(r'\s+', r' ', myString)
-    myString = myString.strip(' ')
+        # convert $, ! and ? to proper words
+        myString = self.dollar_pattern.sub(r' dollar ', myString)
+        myString = self.exclammark_pattern.sub(r' exclammark ', myString)
+        myString = self.questmark_pattern.sub(r' questmark ', myString)
 
-    # perform word stemming
-    myStringWords = myString.split(' ')
-    keepwords = [word for word in myStringWords if not word.isalnum()]
-    stemmer = nltk.stem.snowball.SnowballStemmer('english')
-    stemWords = [stemmer.stem(word) for word in myStringWords]
+        # convert other punctuation to whitespace
+        myString = self.punctuation_pattern.sub(r' ', myString)
 
-    myString = ' '.join(stemWords)
+        # convert newlines and blanklines to special strings and extra whitespace to single
+        myString = self.newline_pattern.sub(r' newline ', myString)
+        myString = self.blankline_pattern.sub(r' blankline ', myString)
+        myString = self.whitespace_pattern.sub(r' ', myString)
+        myString = myString.strip(' ')
 
-    return myString
\ No newline at end of file
+        # perform word stemming
+        stem = self.stem
+        return ' '.join([stem(word) for word in myString.split(' ')])
+
+    # Hits and misses of the stem cache
+    def cache_info(self):
+        return self.stem.cache_info()
+
+normaliser = TextNormaliser()
+
+def clean_string(myString):
+    return normaliser.clean(myString)
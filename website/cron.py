@@ -69,7 +69,7 @@ class Cron(object):
             email.send(fail_silently = True)
 
     def train_spam_filter(self):
-        train()
+        train(candidate = True)
 
 
 a = Cron()
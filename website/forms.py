@@ -2,11 +2,16 @@ from builtins import object
 from django import forms
 from django.conf import settings
 from antispam.honeypot.forms import HoneypotField
-from bs4 import BeautifulSoup
 from django.forms import ModelForm, widgets
 from ckeditor.widgets import CKEditorWidget
 from website.models import *
 
+# Text of an HTML fragment. BeautifulSoup takes long to import and is only
+# needed once a form is submitted, so it is imported on first use.
+def html_text(html):
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, 'html.parser').get_text()
+
 class CustomClearableFileInput(forms.ClearableFileInput):
     template_name = 'forums/templates/clearable_file_input.html'
 
@@ -38,7 +43,7 @@ class NewQuestionForm(forms.ModelForm):
         title = title.replace('<br>', '\n')
         if title.isspace():
             raise forms.ValidationError("Title cannot be only spaces")
-        temp = BeautifulSoup(title, 'html.parser').get_text()
+        temp = html_text(title)
         if (temp.isspace() or temp == ''):
             raise forms.ValidationError("Title cannot be only tags")
         if len(title) < 12:
@@ -57,7 +62,7 @@ class NewQuestionForm(forms.ModelForm):
             raise forms.ValidationError("Body cannot be only spaces")
         if len(body) < 12:
             raise forms.ValidationError("Body should be minimum 12 characters long")
-        temp = BeautifulSoup(body, 'html.parser').get_text()
+        temp = html_text(body)
         if (temp.isspace() or temp == ''):
             raise forms.ValidationError("Body cannot be only tags")
 
@@ -124,7 +129,7 @@ class AnswerQuestionForm(forms.ModelForm):
             raise forms.ValidationError("Body cannot be only spaces")
         if len(body) < 12:
             raise forms.ValidationError("Body should be minimum 12 characters long")
-        temp = BeautifulSoup(body, 'html.parser').get_text()
+        temp = html_text(body)
         if (temp.isspace() or temp == ''):
             raise forms.ValidationError("Body cannot be only tags")
 
@@ -157,7 +162,7 @@ class AnswerCommentForm(forms.Form):
         if body.isspace():
             raise forms.ValidationError("Body cannot be only spaces")
 
-        temp = BeautifulSoup(body, 'html.parser').get_text()
+        temp = html_text(body)
         if (temp.isspace() or temp == ''):
             raise forms.ValidationError("Body cannot be only tags")
         return body
@@ -0,0 +1,71 @@
+import re
+import time
+import nltk
+import openpyxl
+from bs4 import BeautifulSoup
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from website.cleanText import TextNormaliser
+
+# clean_string as it was before TextNormaliser, kept as the baseline
+def legacy_clean_string(myString):
+
+    myString = myString.lower()
+    myString = re.sub(r'(http|https)://[^\s]*', r' httpaddr ', myString)
+    myString = re.sub(r'<img([\w\W]+?)>', r' imgtag ', myString)
+    myString = re.sub(r'[^\s]+@[^\s]+[.][^\s]+', r' emailaddr ', myString)
+
+    soup = BeautifulSoup(myString, 'html.parser')
+    myString = soup.get_text()
+    numberLink = len(soup.find_all('a'))
+    numberImg = len(soup.find_all('img'))
+    myString = myString + numberLink * ' linktag ' + numberImg * ' imgtag '
+
+    myString = re.sub(r'[0-9]+', r' number ', myString)
+    myString = re.sub(r'[$]', r' dollar ', myString)
+    myString = re.sub(r'[!]', r' exclammark ', myString)
+    myString = re.sub(r'[?]', r' questmark ', myString)
+    myString = re.sub(r'([^\w\s]+)|([_-]+)', r' ', myString)
+    myString = re.sub(r'\n', r' newline ', myString)
+    myString = re.sub(r'\n\n', r' blankline ', myString)
+    myString = re.sub(r'\s+', r' ', myString)
+    myString = myString.strip(' ')
+
+    myStringWords = myString.split(' ')
+    keepwords = [word for word in myStringWords if not word.isalnum()]
+    stemmer = nltk.stem.snowball.SnowballStemmer('english')
+    stemWords = [stemmer.stem(word) for word in myStringWords]
+
+    return ' '.join(stemWords)
+
+# Compares the throughput of the legacy and current clean_string on the DataSet.xlsx posts
+class Command(BaseCommand):
+
+    help = 'Benchmark clean_string in docs/sec on the DataSet.xlsx corpus, before and after TextNormaliser'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type = int, default = 3, help = 'Passes over the corpus per implementation')
+
+    def handle(self, *args, **options):
+
+        workBook = openpyxl.load_workbook(settings.PROJECT_DIR + '/DataSet.xlsx', read_only = True)
+        docs = [str(row[0].value) for row in workBook['Data set'].iter_rows(min_row = 2)
+                if row[0].value is not None]
+        workBook.close()
+
+        normaliser = TextNormaliser()
+        for doc in docs:
+            if normaliser.clean(doc) != legacy_clean_string(doc):
+                raise CommandError('TextNormaliser output differs from the legacy clean_string')
+        normaliser = TextNormaliser()
+
+        for name, clean in (('before', legacy_clean_string), ('after', normaliser.clean)):
+            start = time.time()
+            for i in range(options['repeat']):
+                for doc in docs:
+                    clean(doc)
+            elapsed = time.time() - start
+            self.stdout.write('{0}: {1} docs in {2:.2f}s, {3:.0f} docs/sec'.format(
+                name, len(docs) * options['repeat'], elapsed, len(docs) * options['repeat'] / elapsed))
+
+        self.stdout.write('stem cache: {0}'.format(normaliser.cache_info()))
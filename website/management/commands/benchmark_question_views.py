@@ -0,0 +1,189 @@
+import json
+import time
+import random
+import datetime
+import platform
+from collections import defaultdict
+from django.db import DatabaseError, connection, transaction
+from django.test import override_settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from website.models import Question, FossCategory, ViewerSketch
+from website import viewCounter
+
+# Estimated bytes of a userViews row: its id, question and user columns and the
+# entries of its unique (question, user) index and its question and user indexes,
+# before the page overhead of the database. Only used, and reported as an estimate,
+# when the database cannot tell the size of the table or of its rows.
+TABLE_ROW_BYTES = 40
+
+# Ways of counting views measured
+MODES = ('unbuffered', 'table', 'sketch')
+
+# A view counted the way get_question did before views were buffered
+def unbuffered_view(question, user_id):
+    if not question.userViews.filter(id = user_id).exists():
+        question.views += 1
+        question.userViews.add(user_id)
+    question.save()
+
+# Single number a query about a table returns, None if the database cannot tell
+def table_value(sql, table):
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    return row[0] if row and row[0] is not None else None
+
+# Bytes taken by a table with its indexes, counted from the pages SQLite holds,
+# None on other databases or without the dbstat virtual table
+def table_bytes(table):
+
+    if connection.vendor != 'sqlite':
+        return None
+    size = table_value('SELECT SUM(pgsize) FROM dbstat WHERE name IN '
+                       '(SELECT name FROM sqlite_master WHERE tbl_name = %s)', table)
+    return int(size) if size is not None else None
+
+# Average bytes of a row of a table with its indexes, from the statistics InnoDB
+# kept when it last analysed the table, None if there are none. They do not see
+# the rows of the benchmark, and ANALYZE TABLE would commit the transaction the
+# benchmark rolls back, so on MySQL the size is the rows counted times this.
+def row_bytes(table):
+
+    if connection.vendor != 'mysql':
+        return None
+    size = table_value('SELECT (data_length + index_length) / table_rows FROM information_schema.TABLES '
+                       'WHERE table_schema = DATABASE() AND table_name = %s AND table_rows > 0', table)
+    return float(size) if size is not None else None
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+# Count views of random users on questions, the most popular questions getting
+# most of them, and measure the time taken per view, the space taken by the
+# viewers and the error of the counts against the real number of viewers
+def run(mode, questions, user_ids, views, flush_every, rand):
+
+    exact = defaultdict(set)
+    latencies = []
+    flush_seconds = 0.0
+    table = (ViewerSketch if mode == 'sketch' else Question.userViews.through)._meta.db_table
+    size_before = table_bytes(table)
+
+    with override_settings(QUESTION_VIEWERS = 'sketch' if mode == 'sketch' else 'table',
+                           QUESTION_VIEWS_FLUSH_INTERVAL = float('inf'), QUESTION_VIEWS_BUFFER_SIZE = float('inf')):
+        viewCounter.reset()
+        for i in range(views):
+            question = questions[min(int(rand.paretovariate(1.2)) - 1, len(questions) - 1)]
+            user_id = rand.choice(user_ids)
+            exact[question.id].add(user_id)
+
+            start = time.perf_counter()
+            if mode == 'unbuffered':
+                unbuffered_view(question, user_id)
+            else:
+                viewCounter.record(question.id, user_id)
+            latencies.append(time.perf_counter() - start)
+
+            if mode != 'unbuffered' and ((i + 1) % flush_every == 0 or i + 1 == views):
+                start = time.perf_counter()
+                viewCounter.flush()
+                flush_seconds += time.perf_counter() - start
+
+    question_ids = [question.id for question in questions]
+    if mode == 'sketch':
+        sketches = ViewerSketch.objects.filter(question_id__in = question_ids).values_list('registers', flat = True)
+        rows = len(sketches)
+        estimate = sum(len(registers) + 4 for registers in sketches)
+    else:
+        rows = Question.userViews.through.objects.filter(question_id__in = question_ids).count()
+        estimate = rows * TABLE_ROW_BYTES
+
+    # Growth of the table and its indexes during the run, in whole pages, else the
+    # rows times the average row size the database knows of, else the estimate
+    size_after = table_bytes(table)
+    average = row_bytes(table)
+    if size_before is not None and size_after is not None:
+        size, source = size_after - size_before, 'measured'
+    elif average is not None:
+        size, source = int(rows * average), 'rows x average row size'
+    else:
+        size, source = estimate, 'estimated'
+
+    counted = dict(Question.objects.filter(id__in = question_ids).values_list('id', 'views'))
+    errors = [abs(counted[question_id] - 1 - len(viewers)) / len(viewers) for question_id, viewers in exact.items()]
+
+    latencies.sort()
+    return {
+        'mode': mode,
+        'views': views,
+        'viewers': sum(len(viewers) for viewers in exact.values()),
+        'rows': rows,
+        'bytes': size,
+        'bytes_source': source,
+        'estimated_bytes': estimate,
+        'record_p50_us': percentile(latencies, 0.5) * 10 ** 6,
+        'record_p99_us': percentile(latencies, 0.99) * 10 ** 6,
+        'flush_seconds': flush_seconds,
+        'per_view_us': (sum(latencies) + flush_seconds) / views * 10 ** 6,
+        'mean_error': sum(errors) / len(errors),
+        'max_error': max(errors),
+    }
+
+# Space and view path latency of counting question views unbuffered, buffered with
+# userViews rows and buffered with viewer sketches, on synthetic questions and
+# users created in a transaction that is rolled back
+class Command(BaseCommand):
+
+    help = 'Benchmark the space and time taken by counting question views and unique viewers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type = int, default = 1000, help = 'Questions viewed')
+        parser.add_argument('--users', type = int, default = 5000, help = 'Users viewing them')
+        parser.add_argument('--views', type = int, default = 50000, help = 'Views counted in every mode')
+        parser.add_argument('--flush-every', type = int, default = 1000,
+                            help = 'Views between writes of the buffered views')
+        parser.add_argument('--modes', nargs = '+', choices = MODES, default = list(MODES), help = 'Modes to measure')
+        parser.add_argument('--seed', type = int, default = 42, help = 'Seed of the random views')
+        parser.add_argument('--output', help = 'JSON file for the results, views-benchmark-<date>.json by default')
+
+    def handle(self, *args, **options):
+
+        now = datetime.datetime.now()
+        report = {
+            'date': now.isoformat(),
+            'python': platform.python_version(),
+            'questions': options['questions'],
+            'users': options['users'],
+            'seed': options['seed'],
+            'results': [],
+        }
+
+        with transaction.atomic():
+            User.objects.bulk_create([User(username = 'views-benchmark-{0}'.format(i))
+                                      for i in range(options['users'])])
+            user_ids = list(User.objects.filter(username__startswith = 'views-benchmark-').values_list('id', flat = True))
+            owner = User.objects.get(id = user_ids[0])
+
+            for mode in options['modes']:
+                category = FossCategory.objects.create(name = 'views-benchmark-{0}'.format(mode))
+                Question.objects.bulk_create([Question(user = owner, category = category, title = str(i))
+                                              for i in range(options['questions'])])
+                questions = list(Question.objects.filter(category = category))
+
+                result = run(mode, questions, user_ids, options['views'], options['flush_every'],
+                             random.Random(options['seed']))
+                report['results'].append(result)
+                self.stdout.write('{mode}: {viewers} viewers in {rows} rows of {bytes} bytes ({bytes_source}), record p50 '
+                                  '{record_p50_us:.1f}us p99 {record_p99_us:.1f}us, {per_view_us:.1f}us per view '
+                                  'with the writes, count error mean {mean_error:.3f} max {max_error:.3f}'.format(**result))
+
+            transaction.set_rollback(True)
+
+        output = options['output'] or 'views-benchmark-{0}.json'.format(now.strftime('%Y%m%d%H%M%S'))
+        with open(output, 'w') as f:
+            json.dump(report, f, indent = 2)
+        self.stdout.write('Results written to {0}'.format(output))
@@ -0,0 +1,185 @@
+import sys
+import json
+import pickle
+import time
+import random
+import resource
+import datetime
+import platform
+import tracemalloc
+import multiprocessing
+import sklearn
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from sklearn.model_selection import train_test_split
+from website import spamFilter
+
+# Measurements compared by --compare, and whether a higher value is better
+COMPARED = (
+    ('clean_docs_per_sec', True),
+    ('classify_docs_per_sec', True),
+    ('predict_docs_per_sec', True),
+    ('train_seconds', False),
+    ('train_peak_mb', False),
+    ('model_mb', False),
+    ('f_score', True),
+    ('precision', True),
+    ('recall', True),
+)
+
+# Build a corpus of size posts from real (body, label) rows. Beyond the real rows,
+# every synthetic post joins random runs of words of two real posts with the same label.
+def synthetic_corpus(rows, size, rand):
+
+    if size <= len(rows):
+        sample = rand.sample(rows, size)
+        return [body for body, label in sample], [label for body, label in sample]
+
+    byLabel = {}
+    for body, label in rows:
+        byLabel.setdefault(label, []).append(body.split())
+
+    xData = [body for body, label in rows]
+    yData = [label for body, label in rows]
+    while len(yData) < size:
+        body, label = rand.choice(rows)
+        words = []
+        for source in (body.split(), rand.choice(byLabel[label])):
+            start = rand.randint(0, max(0, len(source) - 1))
+            words.extend(source[start:start + rand.randint(5, 60)])
+        xData.append(' '.join(words))
+        yData.append(label)
+    return xData, yData
+
+# Clean bodies by a pool of workers, or in this process, the way training does
+def clean_all(bodies, workers):
+
+    pool = None
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+    try:
+        xData = []
+        spamFilter.clean_rows(((i, body, 0) for i, body in enumerate(bodies)), pool, xData, [])
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return xData
+
+# Measure cleaning, classification and training on a corpus of size posts and
+# the accuracy of the trained model on the real hold-out posts, with the given
+# feature extraction
+def run(size, trainRows, xTest, yTest, workers, seed, features):
+
+    xData, yData = synthetic_corpus(trainRows, size, random.Random(seed))
+    result = {'vectorizer': features, 'size': size, 'spam': sum(yData)}
+
+    start = time.time()
+    xClean = clean_all(xData, workers)
+    cleanSeconds = time.time() - start
+    result['clean_docs_per_sec'] = size / cleanSeconds
+
+    tracemalloc.start()
+    start = time.time()
+    vectorizer, model = spamFilter.fit(xClean, yData, features)
+    result['train_seconds'] = time.time() - start
+    result['train_peak_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    result['model_mb'] = len(pickle.dumps((vectorizer, model), protocol = pickle.HIGHEST_PROTOCOL)) / 2 ** 20
+
+    artifact = {'vectorizer': vectorizer, 'model': model}
+    start = time.time()
+    spamFilter.classify_strings(artifact, xClean)
+    classifySeconds = time.time() - start
+    result['classify_docs_per_sec'] = size / classifySeconds
+    result['predict_docs_per_sec'] = size / (cleanSeconds + classifySeconds)
+
+    fScore, precision, recall, matrix = spamFilter.calc_f_score(clean_all(xTest, 1), yTest, model, vectorizer)
+    result['f_score'] = float(fScore)
+    result['precision'] = float(precision)
+    result['recall'] = float(recall)
+    result['confusion_matrix'] = matrix.tolist()
+    return result
+
+# Throughput and accuracy of the spam filter on synthetic corpora of growing size,
+# written as JSON so that the results of two releases can be compared
+class Command(BaseCommand):
+
+    help = 'Benchmark spam filter cleaning, prediction and training and check its hold-out accuracy'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type = int, nargs = '+', default = [1000, 10000, 100000, 1000000],
+                            help = 'Corpus sizes to measure')
+        parser.add_argument('--vectorizer', nargs = '+', choices = ['tfidf', 'hashing'],
+                            help = 'Feature extraction modes to measure, SPAM_VECTORIZER by default')
+        parser.add_argument('--workers', type = int, default = 1,
+                            help = 'Processes cleaning the posts')
+        parser.add_argument('--seed', type = int, default = 42, help = 'Seed of the synthetic corpora')
+        parser.add_argument('--output', help = 'JSON file for the results, spam-benchmark-<date>.json by default')
+        parser.add_argument('--compare', help = 'JSON file of an earlier run to compare the results with')
+
+    def handle(self, *args, **options):
+
+        rows = [(str(body), label) for key, body, label in spamFilter.excel_rows()]
+        trainRows, testRows = train_test_split(rows, test_size = 0.2, random_state = options['seed'],
+                                               stratify = [label for body, label in rows])
+        xTest = [body for body, label in testRows]
+        yTest = [label for body, label in testRows]
+
+        now = datetime.datetime.now()
+        report = {
+            'date': now.isoformat(),
+            'python': platform.python_version(),
+            'sklearn': sklearn.__version__,
+            'cpus': multiprocessing.cpu_count(),
+            'workers': options['workers'],
+            'seed': options['seed'],
+            'hold_out': len(testRows),
+            'results': [],
+        }
+
+        for features in options['vectorizer'] or [settings.SPAM_VECTORIZER]:
+            for size in options['sizes']:
+                result = run(size, trainRows, xTest, yTest, options['workers'], options['seed'], features)
+                report['results'].append(result)
+                self.stdout.write('{vectorizer}, {size} posts: clean {clean_docs_per_sec:.0f} docs/sec, classify '
+                                  '{classify_docs_per_sec:.0f} docs/sec, predict {predict_docs_per_sec:.0f} docs/sec, '
+                                  'train {train_seconds:.2f}s {train_peak_mb:.1f}MB, model {model_mb:.1f}MB, F1 {f_score:.3f} '
+                                  'precision {precision:.3f} recall {recall:.3f}'.format(**result))
+
+        # Peak resident memory of the whole run, in kilobytes on Linux and bytes on macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        report['max_rss_mb'] = maxrss / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10)
+
+        output = options['output'] or 'spam-benchmark-{0}.json'.format(now.strftime('%Y%m%d%H%M%S'))
+        with open(output, 'w') as f:
+            json.dump(report, f, indent = 2)
+        self.stdout.write('Results written to {0}'.format(output))
+
+        if options['compare']:
+            self.compare(options['compare'], report)
+
+    # Print the change of every measurement against an earlier run, worse ones are marked
+    def compare(self, path, report):
+
+        try:
+            with open(path) as f:
+                baseline = json.load(f)
+        except (IOError, ValueError) as e:
+            raise CommandError('Cannot read {0}: {1}'.format(path, e))
+
+        # Runs from before SPAM_VECTORIZER measured 'tfidf'
+        earlier = dict(((result.get('vectorizer', 'tfidf'), result['size']), result) for result in baseline['results'])
+        for result in report['results']:
+            key = (result['vectorizer'], result['size'])
+            if key not in earlier:
+                continue
+            self.stdout.write('{0}, {1} posts compared with {2}:'.format(result['vectorizer'], result['size'], path))
+            for measurement, higherBetter in COMPARED:
+                old = earlier[key].get(measurement)
+                if not old:
+                    continue
+                change = (result[measurement] - old) / old * 100
+                worse = change < 0 if higherBetter else change > 0
+                self.stdout.write('  {0}: {1:.3f} -> {2:.3f} ({3:+.1f}%){4}'.format(
+                    measurement, old, result[measurement], change, ' WORSE' if worse else ''))
@@ -0,0 +1,61 @@
+import time
+from django.conf import settings
+from django.db import transaction
+from django.core.management.base import BaseCommand
+from website.models import Question, ViewerSketch
+from website.viewerSketch import HyperLogLog
+
+# Rows per DELETE query, SQLite allows at most 999 query parameters
+DELETE_BATCH_SIZE = 500
+
+# Turns the userViews rows into viewer sketches, before QUESTION_VIEWERS is set
+# to 'sketch'. Running it again adds the rows written since to the sketches.
+class Command(BaseCommand):
+
+    help = 'Build the viewer sketches of the questions from their userViews rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type = int, default = 1000,
+                            help = 'Questions converted at a time')
+        parser.add_argument('--delete-rows', action = 'store_true',
+                            help = 'Delete the userViews rows once they are in the sketches')
+
+    def handle(self, *args, **options):
+
+        start = time.time()
+        through = Question.userViews.through
+        question_ids = list(through.objects.order_by('question_id').values_list('question_id', flat = True).distinct())
+        chunk_size = options['chunk_size']
+        rows = 0
+        size = 0
+
+        for offset in range(0, len(question_ids), chunk_size):
+            chunk = question_ids[offset:offset + chunk_size]
+            sketches = {}
+            row_ids = []
+            for row_id, question_id, user_id in (through.objects.filter(question_id__in = chunk)
+                                                 .values_list('id', 'question_id', 'user_id')):
+                sketches.setdefault(question_id, HyperLogLog(settings.QUESTION_VIEWERS_PRECISION)).add(user_id)
+                row_ids.append(row_id)
+            rows += len(row_ids)
+
+            with transaction.atomic():
+                stored = ViewerSketch.objects.select_for_update().filter(question_id__in = chunk)
+                for question_id, registers in stored.values_list('question_id', 'registers'):
+                    # Its rows may have been deleted since by another run
+                    sketch = sketches.pop(question_id, HyperLogLog(settings.QUESTION_VIEWERS_PRECISION))
+                    sketch.merge(HyperLogLog.from_bytes(registers))
+                    registers = sketch.to_bytes()
+                    ViewerSketch.objects.filter(question_id = question_id).update(registers = registers)
+                    size += len(registers)
+                created = [ViewerSketch(question_id = question_id, registers = sketch.to_bytes())
+                           for question_id, sketch in sketches.items()]
+                ViewerSketch.objects.bulk_create(created)
+                size += sum(len(sketch.registers) for sketch in created)
+                if options['delete_rows']:
+                    # Only the rows read, the ones written meanwhile are left for the next run
+                    for i in range(0, len(row_ids), DELETE_BATCH_SIZE):
+                        through.objects.filter(id__in = row_ids[i:i + DELETE_BATCH_SIZE]).delete()
+
+        self.stdout.write('Built the viewer sketches of {0} questions from {1} rows{2} in {3:.2f}s, {4} bytes'.format(
+            len(question_ids), rows, ', deleted' if options['delete_rows'] else '', time.time() - start, size))
@@ -0,0 +1,17 @@
+import time
+from django.core.management.base import BaseCommand
+from website.spamFingerprint import backfill
+
+# Builds the near-duplicate index for the posts written before it existed
+class Command(BaseCommand):
+
+    help = 'Index the questions and answers for near-duplicate and spam wave detection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type = int,
+                            help = 'Only index the posts of the last days, and drop the older ones from the index')
+
+    def handle(self, *args, **options):
+        start = time.time()
+        count = backfill(options['days'])
+        self.stdout.write('Indexed {0} posts in {1:.2f}s'.format(count, time.time() - start))
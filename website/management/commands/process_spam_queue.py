@@ -0,0 +1,24 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from website.spamQueue import process_queue, queue_stats
+
+# Consumer of the spam classification queue, for SPAM_QUEUE_CONSUMER = 'command'
+class Command(BaseCommand):
+
+    help = 'Classify the posts waiting in the spam classification queue and publish them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type = int, default = settings.SPAM_QUEUE_BATCH_SIZE,
+                            help = 'Posts classified at a time')
+        parser.add_argument('--loop', action = 'store_true',
+                            help = 'Keep polling the queue every SPAM_QUEUE_POLL_INTERVAL seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            count = process_queue(options['batch_size'])
+            if count or not options['loop']:
+                self.stdout.write('Classified {0} posts, queue: {1}'.format(count, queue_stats()))
+            if not options['loop']:
+                break
+            time.sleep(settings.SPAM_QUEUE_POLL_INTERVAL)
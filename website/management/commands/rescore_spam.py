@@ -0,0 +1,39 @@
+import multiprocessing
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from website.spamRescore import rescore
+
+# Applies the current spam model to the posts already on the forum, e.g. after a retraining
+class Command(BaseCommand):
+
+    help = 'Rescore all questions and answers with the current spam model'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action = 'store_true',
+                            help = 'Only report the posts that would change, without saving anything')
+        parser.add_argument('--workers', type = int, default = multiprocessing.cpu_count(),
+                            help = 'Processes cleaning the posts, defaults to the number of CPUs')
+        parser.add_argument('--chunk-size', type = int, default = settings.SPAM_RESCORE_CHUNK_SIZE,
+                            help = 'Posts classified and written back at a time')
+        parser.add_argument('--only', action = 'append', choices = ['questions', 'answers'],
+                            help = 'Kind of posts to rescore, may be given more than once')
+
+    def handle(self, *args, **options):
+
+        try:
+            report = rescore(options['dry_run'], options['workers'], options['chunk_size'], options['only'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        verb = 'would change' if report['dry_run'] else 'changed'
+
+        self.stdout.write('Rescored with spam model {0} in {1:.2f}s'.format(report['model'], report['seconds']))
+        for kind in sorted(report['scored']):
+            self.stdout.write('  {0}: {1} scored, {2} {3} to spam, {4} {3} to not spam, {5} {3} to review'.format(
+                kind, report['scored'][kind], report['to_spam'][kind], verb, report['to_not_spam'][kind],
+                report['to_review'][kind]))
+
+        if report['categories']:
+            self.stdout.write('By category:')
+        for category, counts in sorted(report['categories'].items()):
+            self.stdout.write('  {0}: {1} to spam, {2} to not spam, {3} to review'.format(
+                category, counts['to_spam'], counts['to_not_spam'], counts['to_review']))
@@ -0,0 +1,25 @@
+import multiprocessing
+from django.core.management.base import BaseCommand
+from website.spamFilter import train, load_artifact, candidate_version
+
+# Builds a new candidate spam model artifact offline. The first model goes live
+# straight away, later ones once they are promoted.
+class Command(BaseCommand):
+
+    help = 'Train the spam filter and store the model as a new candidate artifact'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type = int, default = multiprocessing.cpu_count(),
+                            help = 'Processes cleaning the posts, defaults to the number of CPUs')
+
+    def handle(self, *args, **options):
+        version = train(options['workers'], candidate = True)
+        artifact = load_artifact(version)
+        self.stdout.write('Stored {0} spam model {1} trained on {2} posts ({3} spam)'.format(
+            'candidate' if candidate_version() == version else 'live', version, artifact['corpus_size'], artifact['spam_count']))
+        for category in artifact.get('categories') or ():
+            category_artifact = load_artifact(version, category)
+            self.stdout.write('  category {0}: {1} posts ({2} spam)'.format(
+                category, category_artifact['corpus_size'], category_artifact['spam_count']))
+        for stage, seconds in sorted(artifact['timings'].items()):
+            self.stdout.write('  {0}: {1:.2f}s'.format(stage, seconds))
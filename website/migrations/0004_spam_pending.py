@@ -0,0 +1,23 @@
+# Generated by Django 2.1.3 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0003_auto_20181119_1235'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='spam_pending',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.AddField(
+            model_name='answer',
+            name='spam_pending',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+    ]
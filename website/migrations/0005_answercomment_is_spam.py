@@ -0,0 +1,18 @@
+# Generated by Django 2.1.3 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0004_spam_pending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answercomment',
+            name='is_spam',
+            field=models.BooleanField(default=False),
+        ),
+    ]
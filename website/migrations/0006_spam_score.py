@@ -0,0 +1,41 @@
+# Generated by Django 2.1.3 on 2026-10-18 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0005_answercomment_is_spam'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answer',
+            name='spam_review',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='answer',
+            name='spam_score',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='spam_review',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='spam_score',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(fields=['spam_review', 'spam_score'], name='website_ans_spam_re_12cbe5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['spam_review', 'spam_score'], name='website_que_spam_re_6dc7a3_idx'),
+        ),
+    ]
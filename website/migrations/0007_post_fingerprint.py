@@ -0,0 +1,36 @@
+# Generated by Django 2.1.3 on 2026-10-18 13:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0006_spam_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FingerprintBand',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(db_index=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PostFingerprint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('signature', models.BinaryField()),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('answer', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='website.Answer')),
+                ('question', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='website.Question')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='fingerprintband',
+            name='fingerprint',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='website.PostFingerprint'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.1.3 on 2026-10-18 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0007_post_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpamShadowScore',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('candidate', models.CharField(db_index=True, max_length=30)),
+                ('live', models.CharField(max_length=30)),
+                ('live_score', models.FloatField()),
+                ('candidate_score', models.FloatField()),
+                ('live_ms', models.FloatField()),
+                ('candidate_ms', models.FloatField()),
+                ('agree', models.BooleanField(default=True)),
+                ('body', models.TextField(blank=True)),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 2.1.3 on 2026-10-18 17:05
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# The uid columns of answers and comments become foreign keys to their
+# authors. The column keeps its name and values, the field is renamed first
+# so that the data stays where it is.
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('website', '0008_spam_shadow_score'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='answer',
+            name='uid',
+            field=models.IntegerField(db_column='uid'),
+        ),
+        migrations.RenameField(
+            model_name='answer',
+            old_name='uid',
+            new_name='author',
+        ),
+        migrations.AlterField(
+            model_name='answer',
+            name='author',
+            field=models.ForeignKey(db_column='uid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='answercomment',
+            name='uid',
+            field=models.IntegerField(db_column='uid'),
+        ),
+        migrations.RenameField(
+            model_name='answercomment',
+            old_name='uid',
+            new_name='author',
+        ),
+        migrations.AlterField(
+            model_name='answercomment',
+            name='author',
+            field=models.ForeignKey(db_column='uid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 2.1.3 on 2026-10-18 18:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0009_answer_author'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ViewerSketch',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='website.Question')),
+                ('registers', models.BinaryField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.1.3 on 2026-10-18 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0010_viewer_sketch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answer',
+            name='spam_moderated',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='spam_moderated',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 2.1.3 on 2026-10-18 23:40
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Q
+
+
+# Posts decided before spam_moderated existed carry a label the spam model
+# would not have given them: shown although their score hides them, hidden
+# although their score publishes them or out of the review queue although
+# their score holds them. Spam without a score was marked by hand or by the
+# duplicate index, and is kept as it is too.
+def mark_moderated(apps, schema_editor):
+    for name in ('Question', 'Answer'):
+        model = apps.get_model('website', name)
+        model.objects.filter(spam_pending=False, spam_review=False).filter(
+            Q(is_spam=False, spam_score__gte=settings.SPAM_SCORE_REVIEW) |
+            Q(is_spam=True, spam_score__lt=settings.SPAM_SCORE_SPAM) |
+            Q(is_spam=True, spam_score__isnull=True)
+        ).update(spam_moderated=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0011_spam_moderated'),
+    ]
+
+    operations = [
+        migrations.RunPython(mark_moderated, migrations.RunPython.noop),
+    ]
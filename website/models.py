@@ -48,6 +48,13 @@ class Question(models.Model):
     userViews = models.ManyToManyField(User, blank = True, related_name = 'postViews')
     num_votes = models.IntegerField(default = 0)
     is_spam = models.BooleanField(default = False)
+    # Waiting in the spam classification queue, is_spam stays True until then
+    spam_pending = models.BooleanField(default = False, db_index = True)
+    # Decision margin of the spam model, and held for a moderator as the model was unsure
+    spam_score = models.FloatField(null = True, blank = True)
+    spam_review = models.BooleanField(default = False)
+    # is_spam was decided by a moderator, rescoring leaves it as it is
+    spam_moderated = models.BooleanField(default = False)
     image = ResizedImageField(size = [800, 800], upload_to = "images/questions/", blank = True)
 
     def __str__(self):
@@ -56,10 +63,13 @@ class Question(models.Model):
     class Meta(object):
 
         get_latest_by = "date_created"
+        # The moderator review queue
+        indexes = [models.Index(fields = ['spam_review', 'spam_score'])]
 
 class Answer(models.Model):
 
-    uid  = models.IntegerField()
+    # Kept in the uid column, users deleted before it was a relation leave answers without an author
+    author = models.ForeignKey(User, on_delete = models.DO_NOTHING, db_column = 'uid', db_constraint = False)
     question = models.ForeignKey(Question, on_delete = models.CASCADE)
     body = RichTextField()
     date_created = models.DateTimeField(auto_now_add = True)
@@ -68,26 +78,90 @@ class Answer(models.Model):
     userDownVotes = models.ManyToManyField(User, blank = True, related_name = 'postAnswerDownVotes', default = 0)
     num_votes = models.IntegerField(default = 0)
     is_spam = models.BooleanField(default = False)
+    # Waiting in the spam classification queue, is_spam stays True until then
+    spam_pending = models.BooleanField(default = False, db_index = True)
+    # Decision margin of the spam model, and held for a moderator as the model was unsure
+    spam_score = models.FloatField(null = True, blank = True)
+    spam_review = models.BooleanField(default = False)
+    # is_spam was decided by a moderator, rescoring leaves it as it is
+    spam_moderated = models.BooleanField(default = False)
     image = ResizedImageField(size = [800, 800], upload_to = "images/answers/", blank = True)
 
+    # Id of the author
+    @property
+    def uid(self):
+        return self.author_id
+
+    @uid.setter
+    def uid(self, uid):
+        self.author_id = uid
+
     def user(self):
-        user = User.objects.get(id = self.uid)
-        return user
+        return self.author
 
     def __str__(self):
         return '{0} - {1} - {2}'.format(self.question.category.name, self.question.title, self.body)
 
+    class Meta(object):
+
+        # The moderator review queue
+        indexes = [models.Index(fields = ['spam_review', 'spam_score'])]
+
 class AnswerComment(models.Model):
 
-    uid = models.IntegerField()
+    # Kept in the uid column, as for answers
+    author = models.ForeignKey(User, on_delete = models.DO_NOTHING, db_column = 'uid', db_constraint = False)
     answer = models.ForeignKey(Answer, on_delete = models.CASCADE)
     body = models.TextField(blank = False)
     date_created = models.DateTimeField(auto_now_add = True)
     date_modified = models.DateTimeField(auto_now = True)
+    # Set when rescoring the forum with the spam model
+    is_spam = models.BooleanField(default = False)
+
+    # Id of the author
+    @property
+    def uid(self):
+        return self.author_id
+
+    @uid.setter
+    def uid(self, uid):
+        self.author_id = uid
 
     def user(self):
-        user = User.objects.get(id = self.uid)
-        return user
+        return self.author
+
+# Compressed HyperLogLog sketch of the logged in viewers of a question, kept
+# instead of userViews rows when QUESTION_VIEWERS is 'sketch'
+class ViewerSketch(models.Model):
+
+    question = models.OneToOneField(Question, on_delete = models.CASCADE, primary_key = True)
+    registers = models.BinaryField()
+
+# MinHash signature of a question or answer body, for finding near-duplicate posts
+class PostFingerprint(models.Model):
+
+    question = models.OneToOneField(Question, null = True, blank = True, on_delete = models.CASCADE)
+    answer = models.OneToOneField(Answer, null = True, blank = True, on_delete = models.CASCADE)
+    signature = models.BinaryField()
+    date_created = models.DateTimeField(auto_now_add = True)
+
+# Locality-sensitive hash of one band of a signature, posts sharing one are candidate duplicates
+class FingerprintBand(models.Model):
+
+    fingerprint = models.ForeignKey(PostFingerprint, on_delete = models.CASCADE)
+    value = models.BigIntegerField(db_index = True)
+
+# Score of a new post by a candidate spam model next to the live one, the body is only kept when they disagree
+class SpamShadowScore(models.Model):
+    candidate = models.CharField(max_length = 30, db_index = True)
+    live = models.CharField(max_length = 30)
+    live_score = models.FloatField()
+    candidate_score = models.FloatField()
+    live_ms = models.FloatField()
+    candidate_ms = models.FloatField()
+    agree = models.BooleanField(default = True)
+    body = models.TextField(blank = True)
+    date_created = models.DateTimeField(auto_now_add = True)
 
 class Notification(models.Model):
 
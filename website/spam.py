@@ -0,0 +1,35 @@
+import importlib
+import threading
+
+# Lazy entry point of the spam subsystem. The spam modules pull in sklearn,
+# numpy, scipy, nltk, BeautifulSoup and openpyxl, which take longer to import
+# than Django itself. Code that is loaded on every start, like the views, uses
+# the modules through this facade, so that they are only imported when a post
+# is first checked for spam and management commands and the test runner start
+# at Django's own speed.
+
+# A module imported on first attribute access
+class LazyModule(object):
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._module is None:
+                self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attribute):
+        return getattr(self._module or self._load(), attribute)
+
+    def __repr__(self):
+        return '<lazy module {0}{1}>'.format(self._name, '' if self._module is None else ' (loaded)')
+
+spamFilter = LazyModule('website.spamFilter')
+spamJobs = LazyModule('website.spamJobs')
+spamQueue = LazyModule('website.spamQueue')
+spamShadow = LazyModule('website.spamShadow')
+spamFingerprint = LazyModule('website.spamFingerprint')
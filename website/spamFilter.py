@@ -1,51 +1,329 @@
 from builtins import str
 from builtins import range
+import os
+import time
+import shutil
+import json
+import pickle
+import hashlib
+import tempfile
+import datetime
+import threading
+import multiprocessing
+from collections import OrderedDict
 import openpyxl
 import numpy as np
 from django.conf import settings
 from .cleanText import clean_string
 from sklearn.svm import LinearSVC
+from sklearn.linear_model import SGDClassifier
+from sklearn.utils.class_weight import compute_class_weight
 from sklearn.metrics import confusion_matrix, f1_score, precision_score, recall_score
-from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
-from website.models import Question, Answer
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer, HashingVectorizer, TfidfTransformer
+from sklearn.pipeline import make_pipeline
+from website.models import Question, Answer, SpamShadowScore
+from website.spamShared import save_shared, load_shared, META_FIELDS
+from website import spamMetrics
 
-# Get the original dataset
-def store():
+# Prefix and suffix of the model artifact files in SPAM_MODEL_DIR
+ARTIFACT_PREFIX = 'spam-model-'
+ARTIFACT_SUFFIX = '.pickle'
+
+# Cleaned posts from earlier trainings. Bump the version whenever clean_string
+# changes, so that the cached texts are cleaned again.
+CORPUS_CACHE_NAME = 'cleaned-corpus.pickle'
+CORPUS_CACHE_VERSION = 1
+
+# Rows of DataSet.xlsx, read once and kept until the workbook changes
+DATASET_CACHE_NAME = 'dataset.pickle'
+
+# Moderator decisions learnt by an online model, one journal per model version
+JOURNAL_PREFIX = 'spam-journal-'
+JOURNAL_SUFFIX = '.jsonl'
+
+# Memory-mapped layout of an artifact, next to its pickle
+SHARED_SUFFIX = '.shared'
+
+# Prefix of the artifacts of the category models trained with a model version
+CATEGORY_PREFIX = 'spam-category-'
+
+# Rewritten whenever a training run publishes a new model, the server processes
+# reload as soon as they see it change instead of waiting for the reload interval
+PUBLISHED_NAME = 'published'
+
+# Holds the version of the candidate model, trained but not live until it is
+# promoted. Candidates are scored in shadow mode alongside the live model.
+CANDIDATE_NAME = 'candidate'
+
+# The loaded model artifact, set lazily on first prediction. It is only ever
+# replaced as a whole, so a prediction never mixes a vectorizer and a model
+# from different training runs.
+_live = None
+
+# Time of the last check for a newer artifact in SPAM_MODEL_DIR
+_last_check = 0
+
+# The state of the published file at that check
+_published = None
+
+# Only one training run at a time per process
+_train_lock = threading.Lock()
+
+# Online models are updated in place, predictions must not see a half-applied update
+_online_lock = threading.Lock()
+
+# Category models are loaded once per process, on the first post of their category
+_category_lock = threading.Lock()
+
+# Recent spam scores of predict(), keyed by content hash. Only valid for the model
+# they were computed with, so the cache empties itself when the model changes.
+class VerdictCache(object):
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.model_key = None
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, model_key, key):
+        with self.lock:
+            if model_key != self.model_key:
+                self.entries.clear()
+                self.model_key = model_key
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def count(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def put(self, model_key, keys, value):
+        with self.lock:
+            if model_key != self.model_key or settings.SPAM_PREDICT_CACHE_SIZE <= 0:
+                return
+            for key in keys:
+                self.entries[key] = value
+                self.entries.move_to_end(key)
+            while len(self.entries) > settings.SPAM_PREDICT_CACHE_SIZE:
+                self.entries.popitem(last = False)
+
+    def info(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries)}
+
+_verdicts = VerdictCache()
+
+# Clean a chunk of post bodies, run in the worker processes
+def clean_chunk(bodies):
+    return [str(clean_string(body)) for body in bodies]
+
+def body_hash(body):
+    return hashlib.sha1(str(body).encode('utf-8')).hexdigest()
+
+# Clean (key, body, label) rows chunk by chunk, keeping their order. With a pool the
+# chunks are cleaned by the workers while the next rows are still being read.
+# With a cache, a dict of key -> (body hash, cleaned text), only new or edited
+# bodies are cleaned, and the entries of rows that are gone are removed.
+# Returns the number of bodies cleaned.
+def clean_rows(rows, pool, xData, yData, cache = None):
+
+    pending = []
+    seen = set()
+
+    def submit(chunk):
+        bodies = [body for index, key, digest, body in chunk]
+        if pool is None:
+            pending.append((chunk, clean_chunk(bodies)))
+        else:
+            pending.append((chunk, pool.apply_async(clean_chunk, (bodies, ))))
+
+    chunk = []
+    for key, body, label in rows:
+        yData.append(label)
+        digest = None
+        if cache is not None:
+            digest = body_hash(body)
+            seen.add(key)
+            if key in cache and cache[key][0] == digest:
+                xData.append(cache[key][1])
+                continue
+
+        # Filled in once the chunk is cleaned
+        xData.append(None)
+        chunk.append((len(xData) - 1, key, digest, body))
+        if len(chunk) == settings.SPAM_CLEAN_CHUNK_SIZE:
+            submit(chunk)
+            chunk = []
+    if chunk:
+        submit(chunk)
+
+    cleaned = 0
+    for chunk, result in pending:
+        if pool is not None:
+            result = result.get()
+        for (index, key, digest, body), text in zip(chunk, result):
+            xData[index] = text
+            if cache is not None:
+                cache[key] = (digest, text)
+        cleaned += len(chunk)
+
+    if cache is not None:
+        for key in set(cache) - seen:
+            del cache[key]
+
+    return cleaned
+
+# Path of the cleaned corpus cache
+def corpus_cache_path():
+    return os.path.join(settings.SPAM_MODEL_DIR, CORPUS_CACHE_NAME)
+
+# Read the cleaned corpus cache, an empty one if there is none or it is outdated
+def load_corpus_cache():
+
+    try:
+        with open(corpus_cache_path(), 'rb') as f:
+            cache = pickle.load(f)
+    except (IOError, OSError, EOFError, pickle.UnpicklingError):
+        cache = None
+
+    if cache is None or cache.get('version') != CORPUS_CACHE_VERSION:
+        cache = {'version': CORPUS_CACHE_VERSION}
+    return cache
+
+def save_corpus_cache(cache):
+    write_atomic(corpus_cache_path(), pickle.dumps(cache, protocol = pickle.HIGHEST_PROTOCOL))
+
+def file_checksum(path):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+# Read the labelled rows of the original dataset from the Excel file as
+# (row number, body, label), streaming it in read-only mode
+def read_excel_rows(file_location):
+
+    workBook = openpyxl.load_workbook(file_location, read_only = True)
+    rows = []
+
+    try:
+        for i, row in enumerate(workBook['Data set'].iter_rows(min_row = 2), 2):
+            if (len(row) < 2 or str(row[1].value) == 'None'):
+                continue
+            if (str(row[1].value) == "1"):
+                rows.append((i, row[0].value, 1))
+            else:
+                rows.append((i, row[0].value, 0))
+    finally:
+        workBook.close()
+
+    return rows
+
+# Rows of the original dataset in the Excel file. They are kept in a pickle in
+# SPAM_MODEL_DIR, which is used as long as the workbook has the same mtime and
+# size, or failing that the same checksum.
+def excel_rows():
 
-    # Add data from Excel file
     file_location = settings.PROJECT_DIR + '/DataSet.xlsx'
-    workBookOld = openpyxl.load_workbook(file_location)
-    dataSheetOld = workBookOld['Data set']
+    cache_location = os.path.join(settings.SPAM_MODEL_DIR, DATASET_CACHE_NAME)
+    stat = os.stat(file_location)
+
+    try:
+        with open(cache_location, 'rb') as f:
+            cache = pickle.load(f)
+    except (IOError, OSError, EOFError, pickle.UnpicklingError):
+        cache = None
+
+    if (cache is not None and cache['mtime'] == stat.st_mtime and cache['size'] == stat.st_size):
+        return cache['rows']
+
+    checksum = file_checksum(file_location)
+    if (cache is not None and cache['sha1'] == checksum):
+        rows = cache['rows']
+    else:
+        rows = read_excel_rows(file_location)
+
+    cache = {
+        'mtime': stat.st_mtime,
+        'size': stat.st_size,
+        'sha1': checksum,
+        'rows': rows,
+    }
+    write_atomic(cache_location, pickle.dumps(cache, protocol = pickle.HIGHEST_PROTOCOL))
+    return rows
+
+# Rows of the original dataset, which belong to no category
+def dataset_rows(categories = None):
+    rows = excel_rows()
+    if categories is not None:
+        categories.extend([None] * len(rows))
+    return rows
+
+# Rows of forum questions or answers, streamed from the database. The labels
+# always come from the database, as moderators change them without editing the body.
+# The category of every row is appended to categories if it is given.
+def post_rows(queryset, category_field, categories = None):
+    rows = queryset.values_list('id', 'body', 'is_spam', category_field)
+    for post_id, body, is_spam, category in rows.iterator(chunk_size = settings.SPAM_CLEAN_CHUNK_SIZE):
+        if categories is not None:
+            categories.append(category)
+        yield post_id, body, int(is_spam)
+
+# Get the original dataset. The posts are cleaned by SPAM_TRAIN_WORKERS processes
+# unless another number of workers is given, and the time spent on every part of
+# the dataset is recorded in timings. With SPAM_CORPUS_CACHE only the rows that
+# are new or edited since the last training are cleaned. If a categories list
+# is given, the category id of every post is appended to it, None for the dataset.
+def store(workers = None, timings = None, categories = None):
+
+    if workers is None:
+        workers = settings.SPAM_TRAIN_WORKERS
+    if timings is None:
+        timings = {}
 
     xData = []
     yData = []
 
-    rows = dataSheetOld.max_row
+    stages = (
+        ('excel', lambda: dataset_rows(categories)),
+        ('questions', lambda: post_rows(Question.objects.filter(spam_pending = False, spam_review = False),
+                                        'category_id', categories)),
+        ('answers', lambda: post_rows(Answer.objects.filter(spam_pending = False, spam_review = False),
+                                      'question__category_id', categories)),
+    )
 
-    for i in range(2, rows+1):
+    corpus_cache = None
+    if settings.SPAM_CORPUS_CACHE:
+        corpus_cache = load_corpus_cache()
 
-        if (str(dataSheetOld.cell(row = i, column = 2).value) != 'None'):
-            xData.append(str(clean_string(dataSheetOld.cell(row = i, column = 1).value)))
-            if (str(dataSheetOld.cell(row = i, column = 2).value) == "1"):
-                yData.append(1)
-            else:
-                yData.append(0)
+    pool = None
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
 
-    # Add data from forum questions
-    for question in Question.objects.all():
-        xData.append(str(clean_string(question.body)))
-        if (question.is_spam):
-            yData.append(1)
-        else:
-            yData.append(0)
+    try:
+        for stage, rows in stages:
+            start = time.time()
+            count = len(yData)
+            cache = None
+            if corpus_cache is not None:
+                cache = corpus_cache.setdefault(stage, {})
+            cleaned = clean_rows(rows(), pool, xData, yData, cache)
+            timings[stage] = time.time() - start
+            print("Cleaned {0} of {1} {2} rows in {3:.2f}s".format(cleaned, len(yData) - count, stage, timings[stage]))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
 
-    # Add data from forum answers
-    for answer in Answer.objects.all():
-        xData.append(str(clean_string(answer.body)))
-        if (answer.is_spam):
-            yData.append(1)
-        else:
-            yData.append(0)
+    if corpus_cache is not None:
+        save_corpus_cache(corpus_cache)
 
     return xData, yData
 
@@ -54,20 +332,472 @@ def store():
     # xTrain, xTest, yTrain, yTest = train_test_split(xData, yData, test_size = 0.2, random_state = 42)
     # return xTrain, xTest, yTrain, yTest
 
-# Train the data when server checks happening
-def train():
+# Fresh, unfitted estimators for a training run. In online mode the features
+# are hashed, so the vectorizer needs no fitting and the model can be updated
+# one post at a time with partial_fit. With features = 'hashing' the features
+# are hashed as well, so the vectorizer keeps no vocabulary and its size does
+# not grow with the corpus; only the IDF weights are fitted. The features are
+# SPAM_VECTORIZER unless given.
+def new_vectorizer(features = None):
+    if features is None:
+        features = settings.SPAM_VECTORIZER
+    if settings.SPAM_FILTER_ONLINE:
+        return HashingVectorizer(stop_words = 'english', n_features = settings.SPAM_ONLINE_FEATURES,
+                                 alternate_sign = False)
+    if features == 'hashing':
+        if settings.SPAM_HASHING_IDF:
+            return make_pipeline(HashingVectorizer(stop_words = 'english', n_features = settings.SPAM_HASHING_FEATURES,
+                                                   alternate_sign = False, norm = None),
+                                 TfidfTransformer())
+        return HashingVectorizer(stop_words = 'english', n_features = settings.SPAM_HASHING_FEATURES,
+                                 alternate_sign = False)
+    return TfidfVectorizer(stop_words = 'english', max_df = 75)
 
-    print("Training spam filter...")
+def new_model(yTrain = None):
+    if settings.SPAM_FILTER_ONLINE:
+        # partial_fit does not support class_weight = 'balanced', so the weights are fixed here
+        classes = np.array([0, 1])
+        weights = compute_class_weight('balanced', classes = classes, y = yTrain)
+        return SGDClassifier(loss = 'hinge', class_weight = dict(zip(classes, weights)),
+                             max_iter = 50, tol = 1e-3, random_state = 42)
+    return LinearSVC(class_weight = 'balanced')
 
-    # Create training data
-    xTrain, yTrain = store()
-    global vectorizer
+# File name of a model version without suffix, or of the model of a category trained with it
+def artifact_name(version, category = None):
+    if category is None:
+        return ARTIFACT_PREFIX + version
+    return '{0}{1}-{2}'.format(CATEGORY_PREFIX, version, category)
+
+# Path of the artifact file for a model version
+def artifact_path(version, category = None):
+    return os.path.join(settings.SPAM_MODEL_DIR, artifact_name(version, category) + ARTIFACT_SUFFIX)
+
+# Path of the online learning journal for a model version
+def journal_path(version):
+    return os.path.join(settings.SPAM_MODEL_DIR, JOURNAL_PREFIX + version + JOURNAL_SUFFIX)
+
+# Path of the memory-mapped layout of a model version
+def shared_path(version, category = None):
+    return os.path.join(settings.SPAM_MODEL_DIR, artifact_name(version, category) + SHARED_SUFFIX)
+
+def published_path():
+    return os.path.join(settings.SPAM_MODEL_DIR, PUBLISHED_NAME)
+
+# Identity of the published file, it changes with every rewrite
+def published_state():
+    try:
+        stat = os.stat(published_path())
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns)
+
+# Version named by the published file, None if there is none or its artifact is gone
+def published_version():
+    try:
+        with open(published_path()) as f:
+            version = f.read().strip()
+    except (IOError, OSError):
+        return None
+    if not os.path.isfile(artifact_path(version)):
+        return None
+    return version
+
+# Tell the server processes that a new model version is available
+def publish(version):
+    global _published
+    write_atomic(published_path(), version.encode('utf-8'))
+    _published = published_state()
+
+def candidate_path():
+    return os.path.join(settings.SPAM_MODEL_DIR, CANDIDATE_NAME)
+
+# Version of the candidate model, None if there is none
+def candidate_version():
+    try:
+        with open(candidate_path()) as f:
+            version = f.read().strip()
+    except (IOError, OSError):
+        return None
+    if not os.path.isfile(artifact_path(version)):
+        return None
+    return version
+
+# All stored model versions, oldest first
+def list_versions():
+    if not os.path.isdir(settings.SPAM_MODEL_DIR):
+        return []
+    versions = []
+    for file_name in os.listdir(settings.SPAM_MODEL_DIR):
+        if file_name.startswith(ARTIFACT_PREFIX) and file_name.endswith(ARTIFACT_SUFFIX):
+            versions.append(file_name[len(ARTIFACT_PREFIX):-len(ARTIFACT_SUFFIX)])
+    return sorted(versions)
+
+# Write data to a file through a temporary file, so that readers never see a partial file
+def write_atomic(path, data):
+
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    fd, tmp_path = tempfile.mkstemp(dir = directory, suffix = '.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+# Write a model artifact to disk, with its memory-mapped layout when SPAM_MODEL_SHARED
+# is set, and remove the oldest ones beyond SPAM_MODEL_KEEP with their category
+# models, except the published and the candidate versions
+def save_artifact(artifact):
+
+    category = artifact.get('category')
+    write_atomic(artifact_path(artifact['version'], category),
+                 pickle.dumps(artifact, protocol = pickle.HIGHEST_PROTOCOL))
+    if (settings.SPAM_MODEL_SHARED and not artifact.get('online')):
+        save_shared(artifact, shared_path(artifact['version'], category))
+    if category is not None:
+        return
+
+    kept = (published_version(), candidate_version())
+    for version in list_versions()[:-settings.SPAM_MODEL_KEEP]:
+        if version not in kept:
+            remove_version(version)
+
+# Remove a file that another process may have removed already
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+# Remove the artifact of a model version with its journal, shared layout and
+# category models. Files already gone are skipped, another process pruning or
+# rolling back at the same time may have removed them.
+def remove_version(version):
+
+    remove_file(artifact_path(version))
+    remove_file(journal_path(version))
+    # Processes still mapping the files keep them until they move on
+    shutil.rmtree(shared_path(version), ignore_errors = True)
+    for file_name in os.listdir(settings.SPAM_MODEL_DIR):
+        if file_name.startswith(artifact_name(version, '')):
+            path = os.path.join(settings.SPAM_MODEL_DIR, file_name)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors = True)
+            else:
+                remove_file(path)
+
+# Read a model artifact, the newest one if no version is given, or the
+# model of a category trained with it
+def load_artifact(version = None, category = None):
+
+    if version is None:
+        versions = list_versions()
+        if not versions:
+            return None
+        version = versions[-1]
+
+    with open(artifact_path(version, category), 'rb') as f:
+        return pickle.load(f)
+
+# Load a model version, or the model of a category, for predictions,
+# memory-mapped if it has a shared layout
+def load_live(version, category = None):
+
+    if settings.SPAM_MODEL_SHARED:
+        artifact = load_shared(shared_path(version, category))
+        if artifact is not None:
+            return artifact
+    return load_artifact(version, category)
+
+# Fit a new vectorizer and model on cleaned strings and their labels
+def fit(xTrain, yTrain, features = None):
+
+    vectorizer = new_vectorizer(features)
     xTrainMatrix = vectorizer.fit_transform(xTrain)
     yTrainMatrix = np.asarray(yTrain)
 
-    global model
+    model = new_model(yTrainMatrix)
     model.fit(xTrainMatrix, yTrainMatrix)
+    return vectorizer, model
+
+# Fit a vectorizer and model for every (xTrain, yTrain) job, in parallel by a pool
+# of workers if there are more than one
+def fit_all(jobs, workers, features = None):
+
+    if (workers <= 1 or len(jobs) <= 1):
+        return [fit(xTrain, yTrain, features) for xTrain, yTrain in jobs]
+
+    pool = multiprocessing.Pool(min(workers, len(jobs)))
+    try:
+        return pool.starmap(fit, [(xTrain, yTrain, features) for xTrain, yTrain in jobs])
+    finally:
+        pool.close()
+        pool.join()
 
+# Whether training runs fit category models, online models are always global
+def category_models_enabled():
+    return settings.SPAM_CATEGORY_MODELS and not settings.SPAM_FILTER_ONLINE
+
+# The categories with enough labelled posts, spam and not spam, for a model of
+# their own, as a dict of category id -> indices of their rows in the corpus
+def category_corpora(categories, yTrain):
+
+    rows = {}
+    for i, category in enumerate(categories):
+        if category is not None:
+            rows.setdefault(category, []).append(i)
+
+    corpora = {}
+    for category, indices in rows.items():
+        spam_count = sum(yTrain[i] for i in indices)
+        if (len(indices) >= settings.SPAM_CATEGORY_MIN_POSTS and
+                settings.SPAM_CATEGORY_MIN_SPAM <= spam_count < len(indices)):
+            corpora[category] = indices
+    return corpora
+
+# Train the data and store the result as a new model artifact. A candidate
+# model is stored without going live, see promote().
+def train(workers = None, candidate = False, features = None):
+
+    with _train_lock:
+        return _train(workers, candidate, features)
+
+def _train(workers, candidate, features):
+
+    print("Training spam filter...")
+
+    if workers is None:
+        workers = settings.SPAM_TRAIN_WORKERS
+    if features is None:
+        features = settings.SPAM_VECTORIZER
+
+    # Create training data
+    timings = {}
+    categories = [] if category_models_enabled() else None
+    xTrain, yTrain = store(workers, timings, categories)
+    start = time.time()
+
+    # Fit a complete new vectorizer/model pair, and one for every category with
+    # enough posts, the live ones are left untouched meanwhile
+    corpora = category_corpora(categories, yTrain) if categories is not None else {}
+    jobs = [(xTrain, yTrain)]
+    for category in sorted(corpora):
+        jobs.append(([xTrain[i] for i in corpora[category]], [yTrain[i] for i in corpora[category]]))
+    fitted = fit_all(jobs, workers, features)
+    timings['fit'] = time.time() - start
+    print("Fitted spam model and {0} category models in {1:.2f}s".format(len(corpora), timings['fit']))
+
+    now = datetime.datetime.now()
+    version = now.strftime('%Y%m%d%H%M%S%f')
+    if settings.SPAM_FILTER_ONLINE:
+        features = 'hashing'
+    # A candidate is scored against the live model, so the first model trained
+    # goes live straight away
+    live = current_version()
+
+    # The category models are stored first, they are only looked for once the
+    # global model that lists them is published
+    for category, (xCategory, yCategory), (vectorizer, model) in zip(sorted(corpora), jobs[1:], fitted[1:]):
+        save_artifact({
+            'version': version,
+            'category': category,
+            'created': now,
+            'corpus_size': len(yCategory),
+            'spam_count': int(sum(yCategory)),
+            'online': False,
+            'features': features,
+            'timings': {},
+            'vectorizer': vectorizer,
+            'model': model,
+        })
+
+    vectorizer, model = fitted[0]
+    artifact = {
+        'version': version,
+        'created': now,
+        'corpus_size': len(yTrain),
+        'spam_count': int(sum(yTrain)),
+        'online': settings.SPAM_FILTER_ONLINE,
+        'features': features,
+        'categories': sorted(corpora),
+        'timings': timings,
+        'vectorizer': vectorizer,
+        'model': model,
+    }
+    save_artifact(artifact)
+
+    if candidate and live is not None:
+        # Replaces any earlier candidate, the live model stays as it is
+        previous = candidate_version()
+        write_atomic(candidate_path(), version.encode('utf-8'))
+        if previous is not None:
+            remove_version(previous)
+            remove_shadow_scores(previous)
+        return version
+
+    publish(version)
+    go_live(version)
+    return version
+
+# Switch this process to a model version
+def go_live(version):
+    global _live
+    # Predict from the shared pages like the other processes, not from a private copy
+    _live = load_live(version)
+
+# Make the candidate model the live one. Returns its version, None if there is no candidate.
+def promote():
+
+    with _train_lock:
+        version = candidate_version()
+        if version is None:
+            return None
+        remove_file(candidate_path())
+        publish(version)
+        go_live(version)
+        remove_shadow_scores(version)
+        return version
+
+# Drop the candidate model. Returns its version, None if there is no candidate.
+def discard_candidate():
+
+    with _train_lock:
+        version = candidate_version()
+        if version is None:
+            return None
+        remove_file(candidate_path())
+        remove_version(version)
+        remove_shadow_scores(version)
+        return version
+
+# Drop the comparison of a candidate with the live model once it is promoted or gone
+def remove_shadow_scores(version):
+    SpamShadowScore.objects.filter(candidate = version).delete()
+
+# Remove the live model and go back to the version before it. Returns the
+# version now live, None if there is no older version to go back to.
+def rollback():
+
+    with _train_lock:
+        version = current_version()
+        previous = rollback_version()
+        if previous is None:
+            return None
+        remove_version(version)
+        publish(previous)
+        go_live(previous)
+        return previous
+
+# Version a rollback goes back to: the newest one older than the live model
+# that is not the candidate, None if there is none
+def rollback_version():
+    version = current_version()
+    older = [other for other in live_versions() if version is not None and other < version]
+    return older[-1] if older else None
+
+# Stored versions that may go live, oldest first: all but the candidate
+def live_versions():
+    candidate = candidate_version()
+    return [version for version in list_versions() if version != candidate]
+
+# Version that should be live: the published one, or the newest that is not
+# the candidate when nothing has been published
+def current_version():
+    version = published_version()
+    if version is not None:
+        return version
+    versions = live_versions()
+    return versions[-1] if versions else None
+
+# Get the model used for predictions, loading the published version on first
+# use, or the newest artifact that is not a candidate if none is published.
+# None until train_spam_filter has run, e.g. on a fresh installation. Models
+# promoted or rolled back by other processes are picked up as soon as they are
+# published, and otherwise every SPAM_MODEL_RELOAD_INTERVAL seconds.
+def live_artifact():
+
+    global _live, _last_check, _published
+    now = time.time()
+    published = published_state()
+
+    if (_live is None or published != _published or now - _last_check >= settings.SPAM_MODEL_RELOAD_INTERVAL):
+        _last_check = now
+        _published = published
+        version = current_version()
+        if version is not None and (_live is None or version != _live['version']):
+            try:
+                _live = load_live(version)
+            except (IOError, OSError):
+                # The artifact was pruned in the meantime, keep the current model
+                pass
+
+        # Catch up with moderator decisions learnt by other processes
+        if (_live is not None and _live.get('online')):
+            apply_journal()
+
+    return _live
+
+# Apply the journal entries the live online model has not learnt yet
+def apply_journal():
+
+    artifact = _live
+    with _online_lock:
+
+        try:
+            with open(journal_path(artifact['version']), 'rb') as f:
+                f.seek(artifact.get('journal_offset', 0))
+                data = f.read()
+        except (IOError, OSError):
+            return
+
+        # Leave a line that is still being written for the next time
+        end = data.rfind(b'\n') + 1
+        if end == 0:
+            return
+        entries = [json.loads(line) for line in data[:end].decode('utf-8').splitlines()]
+
+        featureMatrix = artifact['vectorizer'].transform([entry['text'] for entry in entries])
+        labels = np.asarray([entry['spam'] for entry in entries])
+        artifact['model'].partial_fit(featureMatrix, labels, classes = np.array([0, 1]))
+        artifact['journal_offset'] = artifact.get('journal_offset', 0) + end
+
+# Learn from a moderator marking a post as spam or non-spam. This only costs
+# as much as cleaning the post. Without online learning the decision is
+# picked up by the next full training instead.
+def learn(body, is_spam):
+
+    if not settings.SPAM_FILTER_ONLINE:
+        return
+
+    artifact = live_artifact()
+    # No model yet, or the live model was trained before online learning was switched on
+    if (artifact is None or not artifact.get('online')):
+        return
+
+    entry = json.dumps({'spam': int(bool(is_spam)), 'text': clean_string(body)})
+    # A single append is atomic, so several processes can share the journal
+    with open(journal_path(artifact['version']), 'a') as f:
+        f.write(entry + '\n')
+
+    apply_journal()
+
+# Run the model of an artifact over a list of cleaned strings
+def classify(artifact, strings):
+
+    if artifact.get('online'):
+        with _online_lock:
+            return artifact['model'].predict(artifact['vectorizer'].transform(strings))
+
+    return artifact['model'].predict(artifact['vectorizer'].transform(strings))
+
+# Run the model of an artifact over a list of cleaned strings and return the decision margins
+def decision(artifact, strings):
+
+    if artifact.get('online'):
+        with _online_lock:
+            return artifact['model'].decision_function(artifact['vectorizer'].transform(strings))
+
+    return artifact['model'].decision_function(artifact['vectorizer'].transform(strings))
 
 # Calculating the F-score
 def calc_f_score(xTest, yTest, model, vectorizer):
@@ -83,24 +813,212 @@ def calc_f_score(xTest, yTest, model, vectorizer):
     recall = recall_score(yTestMatrix, result, pos_label = 0)
     return fScore, precision, recall, matrix
 
-# Test new data for Spam
-def predict(emailBody):
+# The category whose own model scores the posts of a category, None if they
+# are scored by the global model
+def category_key(artifact, category):
+    if (settings.SPAM_CATEGORY_MODELS and category in (artifact.get('categories') or ())):
+        return category
+    return None
 
-    string = clean_string(emailBody)
-    if ('httpaddr' in string or 'linktag' in string):
-        return "Spam"
+# The model artifact scoring posts of a category. Category models are loaded
+# on the first post of their category and kept with the global model.
+def category_artifact(artifact, category):
+
+    category = category_key(artifact, category)
+    if category is None:
+        return artifact
+
+    with _category_lock:
+        models = artifact.setdefault('category_models', {})
+        if category not in models:
+            try:
+                models[category] = load_live(artifact['version'], category)
+            except (IOError, OSError):
+                # The version was pruned in the meantime, the global model will do
+                models[category] = artifact
+        return models[category]
+
+# Decision margins of cleaned strings of the given categories, every category
+# model is run over the strings of its category as a single matrix
+def decision_by_category(artifact, strings, categories):
+
+    groups = OrderedDict()
+    for i, category in enumerate(categories):
+        groups.setdefault(category_key(artifact, category), []).append(i)
 
-    global vectorizer
-    featureMatrix = vectorizer.transform([string])
-    global model
-    result = model.predict(featureMatrix)
+    margins = np.zeros(len(strings))
+    for category, indices in groups.items():
+        margins[indices] = decision(category_artifact(artifact, category), [strings[i] for i in indices])
+    return margins
 
-    if (1 in result):
-        return "Spam"
+# Spam scores of cleaned strings: the decision margin of the model, run over the
+# strings as a single matrix. Above 0 is spam, and the further from 0 the surer.
+# Strings with links score at least SPAM_LINK_SCORE. If the categories of the
+# strings are given, they are scored by the model of their category.
+def score_strings(artifact, strings, categories = None):
+
+    if not strings:
+        return []
+
+    if categories is None:
+        margins = decision(artifact, strings)
     else:
-        return "Not Spam"
+        margins = decision_by_category(artifact, strings, categories)
+
+    scores = []
+    for string, margin in zip(strings, margins):
+        margin = float(margin)
+        if has_link(string):
+            margin = max(margin, settings.SPAM_LINK_SCORE)
+        scores.append(margin)
+    return scores
+
+def has_link(string):
+    return ('httpaddr' in string or 'linktag' in string)
+
+# Score of a cleaned string while no model is trained: posts with links are
+# spam, the others are published
+def keyword_score(string):
+    return settings.SPAM_LINK_SCORE if has_link(string) else -settings.SPAM_LINK_SCORE
+
+def verdict(score):
+    return "Spam" if score > 0 else "Not Spam"
+
+# What to do with a post of a given score: 'publish' it, hold it for 'review'
+# by a moderator, or hide it as 'spam'
+def triage(score):
+    if score >= settings.SPAM_SCORE_SPAM:
+        return 'spam'
+    if score >= settings.SPAM_SCORE_REVIEW:
+        return 'review'
+    return 'publish'
+
+# Store the spam score of a question or answer, and hide it unless it is
+# clearly not spam. Held posts wait in the moderator review queue.
+def apply_score(post, score):
+    outcome = triage(score)
+    post.spam_score = score
+    post.is_spam = (outcome != 'publish')
+    post.spam_review = (outcome == 'review')
+    return outcome
+
+# Verdicts for a list of cleaned strings, of the given categories if any
+def classify_strings(artifact, strings, categories = None):
+    return [verdict(score) for score in score_strings(artifact, strings, categories)]
+
+# Score new data for Spam, with the model of its category if it has one. The score
+# is looked up by a hash of the body first, so that repeated posts are not cleaned
+# again, then by a hash of the cleaned text.
+def score(emailBody, category = None):
+
+    start = time.time()
+    artifact = live_artifact()
+    if artifact is None:
+        return keyword_score(timed_clean(emailBody))
+    # Moderator decisions learnt online change the model without a new version
+    model_key = (artifact['version'], artifact.get('journal_offset', 0))
+    # Posts scored by a category model are cached apart from the others
+    scope = '{0}:'.format(category_key(artifact, category))
+
+    body_key = 'body:' + scope + body_hash(emailBody)
+    result = _verdicts.get(model_key, body_key)
+    if result is not None:
+        _verdicts.count(True)
+    else:
+        string = timed_clean(emailBody)
+        string_key = 'text:' + scope + body_hash(string)
+        result = _verdicts.get(model_key, string_key)
+        _verdicts.count(result is not None)
+
+        if result is None:
+            model_start = time.time()
+            result = score_strings(artifact, [string], [category])[0]
+            spamMetrics.observe('model', time.time() - model_start)
+
+        _verdicts.put(model_key, (body_key, string_key), result)
+
+    count_verdict(artifact, category, result)
+    spamMetrics.observe('score', time.time() - start)
+    return result
+
+# Clean a post body for scoring, recording how long it took and whether it has links
+def timed_clean(emailBody):
+    start = time.time()
+    string = clean_string(emailBody)
+    spamMetrics.observe('clean', time.time() - start)
+    if has_link(string):
+        spamMetrics.count('link_posts')
+    return string
+
+# Count a score of the live model for the metrics
+def count_verdict(artifact, category, result):
+    spamMetrics.count('verdicts', verdict = 'spam' if result > 0 else 'not_spam',
+                      category = category, model = artifact['version'])
+
+# Test new data for Spam
+def predict(emailBody, category = None):
+    return verdict(score(emailBody, category))
+
+# Score a list of posts at once, of the given categories if any. The posts that
+# are not in the verdict cache are run through the models as a single matrix each.
+def score_batch(emailBodies, categories = None):
+
+    start = time.time()
+    artifact = live_artifact()
+    if artifact is None:
+        return [keyword_score(timed_clean(emailBody)) for emailBody in emailBodies]
+    model_key = (artifact['version'], artifact.get('journal_offset', 0))
+    if categories is None:
+        categories = [None] * len(emailBodies)
+
+    scores = [None] * len(emailBodies)
+    keys = [None] * len(emailBodies)
+    strings = []
+    indices = []
+
+    for i, (emailBody, category) in enumerate(zip(emailBodies, categories)):
+
+        scope = '{0}:'.format(category_key(artifact, category))
+        body_key = 'body:' + scope + body_hash(emailBody)
+        scores[i] = _verdicts.get(model_key, body_key)
+        if scores[i] is not None:
+            _verdicts.count(True)
+            continue
+
+        string = timed_clean(emailBody)
+        keys[i] = (body_key, 'text:' + scope + body_hash(string))
+        scores[i] = _verdicts.get(model_key, keys[i][1])
+        _verdicts.count(scores[i] is not None)
+
+        if scores[i] is None:
+            strings.append(string)
+            indices.append(i)
+
+    if strings:
+        model_start = time.time()
+        for i, result in zip(indices, score_strings(artifact, strings, [categories[i] for i in indices])):
+            scores[i] = result
+        spamMetrics.observe('model', time.time() - model_start)
+
+    for i, result in enumerate(scores):
+        if keys[i] is not None:
+            _verdicts.put(model_key, keys[i], result)
+        count_verdict(artifact, categories[i], result)
+
+    spamMetrics.observe('score', time.time() - start)
+    return scores
+
+# Test a list of posts for Spam at once
+def predict_batch(emailBodies, categories = None):
+    return [verdict(result) for result in score_batch(emailBodies, categories)]
 
-model = LinearSVC(class_weight = 'balanced')
-vectorizer = TfidfVectorizer(stop_words = 'english', max_df = 75)
-train()
+# Hits and misses of the verdict cache
+def predict_cache_info():
+    return _verdicts.info()
 
+# Metadata of the model this process scores posts with, None before the first post
+def live_info():
+    artifact = _live
+    if artifact is None:
+        return None
+    return dict((field, artifact.get(field)) for field in META_FIELDS)
@@ -0,0 +1,156 @@
+import re
+import zlib
+import hashlib
+import datetime
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from website.models import Question, Answer, PostFingerprint, FingerprintBand
+
+# Near-duplicate index of post bodies. A body is reduced to the set of its word
+# pairs, and that set to a MinHash signature: for each of SIGNATURE_SIZE hash
+# functions, the smallest hash of any pair. Two signatures agree in about as
+# many places as the two sets share pairs. The signature is cut into BANDS, and
+# posts that agree on a whole band are candidates, so a lookup is one indexed
+# query on the band hashes. Spam waves with small edits share most of their
+# pairs and land in the same bands.
+
+SIGNATURE_SIZE = 64
+BANDS = 16
+ROWS = SIGNATURE_SIZE // BANDS
+
+# Hash functions (a * x + b) mod PRIME, fixed so that signatures stay comparable
+PRIME = 4294967311
+_random = np.random.RandomState(20181118)
+_a = _random.randint(1, 2 ** 31, SIGNATURE_SIZE).astype(np.uint64)
+_b = _random.randint(0, 2 ** 32, SIGNATURE_SIZE).astype(np.uint64)
+
+tag_pattern = re.compile(r'<[^>]*>')
+word_pattern = re.compile(r'\w+')
+
+# The word pairs of a body, without markup
+def shingles(body):
+    words = word_pattern.findall(tag_pattern.sub(' ', str(body).lower()))
+    if len(words) < settings.SPAM_DUPLICATE_MIN_WORDS:
+        return set()
+    return set(zip(words, words[1:]))
+
+# MinHash signature of a body, None if the index is off or the body is too short to compare
+def signature(body):
+
+    if not settings.SPAM_DUPLICATE_INDEX:
+        return None
+    pairs = shingles(body)
+    if not pairs:
+        return None
+
+    hashes = np.fromiter((zlib.crc32((first + ' ' + second).encode('utf-8')) for first, second in pairs),
+                         dtype = np.uint64, count = len(pairs))
+    return (((hashes[:, None] * _a + _b) % PRIME).min(axis = 0) & 0xffffffff).astype(np.uint32)
+
+# Share of pairs two bodies have in common, estimated from their signatures
+def similarity(first, second):
+    return float((first == second).mean())
+
+# Hash of every band of a signature, signed to fit a BigIntegerField
+def band_values(sig):
+    values = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(bytes([band]) + sig[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size = 8)
+        values.append(int.from_bytes(digest.digest(), 'little', signed = True))
+    return values
+
+# Fingerprint lookup of a question or answer
+def post_lookup(post):
+    return {'question': post} if isinstance(post, Question) else {'answer': post}
+
+# Indexed posts similar to a signature, most similar first, leaving out the
+# fingerprint of the post given as exclude. Every match is a (similarity,
+# fingerprint id, question id, answer id, known spam) tuple.
+def matches(sig, exclude = None):
+
+    if sig is None:
+        return []
+
+    candidates = PostFingerprint.objects.filter(fingerprintband__value__in = band_values(sig))
+    if exclude is not None:
+        candidates = candidates.exclude(**post_lookup(exclude))
+    rows = candidates.values_list(
+        'id', 'signature', 'question_id', 'answer_id',
+        'question__is_spam', 'question__spam_pending', 'question__spam_review',
+        'answer__is_spam', 'answer__spam_pending', 'answer__spam_review')
+
+    results = []
+    seen = set()
+    for (fingerprint_id, signature, question_id, answer_id, question_spam, question_pending, question_review,
+         answer_spam, answer_pending, answer_review) in rows:
+        # A post shows up once for every band it shares
+        if fingerprint_id in seen:
+            continue
+        seen.add(fingerprint_id)
+        match = similarity(sig, np.frombuffer(bytes(signature), dtype = np.uint32))
+        if match < settings.SPAM_DUPLICATE_SIMILARITY:
+            continue
+        # Posts waiting for classification or review are not known to be spam yet
+        if question_id:
+            known_spam = question_spam and not question_pending and not question_review
+        else:
+            known_spam = answer_spam and not answer_pending and not answer_review
+        results.append((match, fingerprint_id, question_id, answer_id, known_spam))
+
+    results.sort(key = lambda result: -result[0])
+    return results
+
+# Whether a signature is a near-duplicate of a post that is known to be spam,
+# other than the post itself when an edited post is checked again
+def is_spam_duplicate(sig, post = None):
+    return any(known_spam for match, fingerprint_id, question_id, answer_id, known_spam in matches(sig, post))
+
+# Published questions that are near-duplicates of a question, most similar first
+def possible_duplicates(question, limit = 5):
+
+    stored = PostFingerprint.objects.filter(question = question).values_list('signature', flat = True).first()
+    if stored is None:
+        return []
+
+    sig = np.frombuffer(bytes(stored), dtype = np.uint32)
+    ids = [question_id for match, fingerprint_id, question_id, answer_id, known_spam
+           in matches(sig, exclude = question) if question_id]
+    questions = Question.objects.filter(is_spam = False).in_bulk(ids)
+    return [questions[question_id] for question_id in ids if question_id in questions][:limit]
+
+# Add a question or answer to the index, or update it after an edit. The
+# signature is computed from the body unless it is given.
+def add(post, sig = None):
+
+    if sig is None:
+        sig = signature(post.body)
+
+    lookup = post_lookup(post)
+    with transaction.atomic():
+        PostFingerprint.objects.filter(**lookup).delete()
+        if sig is None:
+            return None
+        fingerprint = PostFingerprint.objects.create(signature = sig.tobytes(), **lookup)
+        FingerprintBand.objects.bulk_create([FingerprintBand(fingerprint = fingerprint, value = value)
+                                             for value in band_values(sig)])
+    return fingerprint
+
+# Index all questions and answers, or those of the last days, and drop the
+# fingerprints of older posts. Returns the number of posts indexed.
+def backfill(days = None, chunk_size = 500):
+
+    count = 0
+    for model, post_field in ((Question, 'question'), (Answer, 'answer')):
+
+        posts = model.objects.order_by('id')
+        if days is not None:
+            since = timezone.now() - datetime.timedelta(days = days)
+            posts = posts.filter(date_created__gte = since)
+            PostFingerprint.objects.filter(**{post_field + '__date_created__lt': since}).delete()
+
+        for post in posts.only('id', 'body').iterator(chunk_size = chunk_size):
+            add(post)
+            count += 1
+    return count
@@ -0,0 +1,125 @@
+import os
+import json
+import time
+import uuid
+import datetime
+import threading
+import traceback
+from django.conf import settings
+from django.db import connection
+from website import spamFilter
+
+# Spam filter retraining jobs. A job trains a candidate spam model in a
+# background thread and records its progress in a small JSON file in
+# SPAM_MODEL_DIR/jobs/, so that every server process can report the status of
+# any job. The candidate only goes live once a moderator promotes it.
+
+# The job running in this process, if any
+_current_job = None
+_current_thread = None
+_jobs_lock = threading.Lock()
+
+# Directory of the job status files
+def jobs_dir():
+    return os.path.join(settings.SPAM_MODEL_DIR, 'jobs')
+
+# Path of the status file for a job
+def job_path(job_id):
+    return os.path.join(jobs_dir(), job_id + '.json')
+
+def save_job(job):
+    spamFilter.write_atomic(job_path(job['id']), json.dumps(job).encode('utf-8'))
+
+# Get the status of a job, None if the job is not known
+def get_job(job_id):
+    try:
+        with open(job_path(job_id)) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+def now():
+    return datetime.datetime.now().isoformat()
+
+# Remove the status files of the jobs finished more than SPAM_JOB_KEEP_DAYS ago.
+# A finished job is not saved again, so its file was last written when it finished.
+# Returns the number of jobs removed.
+def prune_jobs():
+
+    if not os.path.isdir(jobs_dir()):
+        return 0
+
+    cutoff = time.time() - settings.SPAM_JOB_KEEP_DAYS * 24 * 3600
+    removed = 0
+    for file_name in os.listdir(jobs_dir()):
+        if not file_name.endswith('.json'):
+            continue
+        path = os.path.join(jobs_dir(), file_name)
+        try:
+            if os.path.getmtime(path) >= cutoff:
+                continue
+            job = get_job(file_name[:-len('.json')])
+            if job is None or 'finished' not in job:
+                continue
+            os.remove(path)
+        except FileNotFoundError:
+            # Pruned by another process meanwhile
+            continue
+        removed += 1
+    return removed
+
+# Train the spam filter for a job, updating the job status as it goes
+def run_job(job):
+
+    job['status'] = 'running'
+    job['started'] = now()
+    save_job(job)
+
+    try:
+        job['version'] = spamFilter.train(candidate = True)
+        job['status'] = 'done'
+    except Exception as e:
+        traceback.print_exc()
+        job['status'] = 'failed'
+        job['error'] = str(e)
+    finally:
+        job['finished'] = now()
+        save_job(job)
+
+    return job
+
+def run_job_in_thread(job):
+    try:
+        run_job(job)
+    finally:
+        # The thread got its own database connection, don't leak it
+        connection.close()
+
+# Start retraining and return the job id immediately. If this process is
+# already retraining, the running job is returned instead of starting another.
+def start_training():
+
+    global _current_job, _current_thread
+
+    with _jobs_lock:
+
+        if _current_thread is not None and _current_thread.is_alive():
+            return _current_job['id']
+
+        prune_jobs()
+        job = {
+            'id': uuid.uuid4().hex,
+            'status': 'queued',
+            'queued': now(),
+        }
+        save_job(job)
+
+        if settings.SPAM_TRAIN_IN_BACKGROUND:
+            _current_job = job
+            _current_thread = threading.Thread(target = run_job_in_thread, args = (job, ), name = 'spam-train-' + job['id'])
+            _current_thread.daemon = True
+            _current_thread.start()
+        else:
+            run_job(job)
+
+    return job['id']
@@ -0,0 +1,175 @@
+import bisect
+import threading
+from collections import Counter
+
+# Instrumentation of the spam filter: latency histograms of the stages of
+# scoring a post and counters of the verdicts, kept in memory by every server
+# process. They are exposed as plain text in the Prometheus exposition format
+# by the spam metrics view and summarised on the moderator spam model page.
+
+# Upper bounds in seconds of the latency histogram buckets, the last bucket is unbounded
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Stages timed, in the order they are shown
+STAGES = ('clean', 'model', 'score')
+
+# Counts of observations per bucket, with their sum
+class Histogram(object):
+
+    def __init__(self, buckets = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    # Upper bound of the bucket holding the given fraction of the observations,
+    # None if there are none or it is beyond the last bound
+    def quantile(self, fraction):
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+_lock = threading.Lock()
+_histograms = dict((stage, Histogram()) for stage in STAGES)
+
+# Counts keyed by (name, sorted label items)
+_counters = Counter()
+
+# Record how long a stage took, in seconds
+def observe(stage, seconds):
+    with _lock:
+        _histograms[stage].observe(seconds)
+
+# Add to a counter with the given labels
+def count(name, amount = 1, **labels):
+    key = (name, tuple(sorted((label, str(value)) for label, value in labels.items())))
+    with _lock:
+        _counters[key] += amount
+
+# Copy of the histograms and counters, safe to read while posts are scored
+def snapshot():
+    with _lock:
+        histograms = {}
+        for stage, histogram in _histograms.items():
+            copy = Histogram(histogram.buckets)
+            copy.counts = list(histogram.counts)
+            copy.sum = histogram.sum
+            copy.count = histogram.count
+            histograms[stage] = copy
+        return histograms, Counter(_counters)
+
+# Forget everything recorded so far
+def reset():
+    with _lock:
+        for stage in STAGES:
+            _histograms[stage] = Histogram()
+        _counters.clear()
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{0}="{1}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                          for key, value in labels) + '}'
+
+# The metrics of this process as text. model is the metadata of the live model,
+# cache the hits and misses of the verdict cache, queue the stats of the spam
+# classification queue if there is one.
+def render(model, cache, queue = None):
+
+    histograms, counters = snapshot()
+    lines = []
+
+    lines.append('# HELP spam_stage_seconds Time spent per call in each stage of scoring a post.')
+    lines.append('# TYPE spam_stage_seconds histogram')
+    for stage in STAGES:
+        histogram = histograms[stage]
+        cumulative = 0
+        for bound, bucket_count in zip(histogram.buckets + ('+Inf', ), histogram.counts):
+            cumulative += bucket_count
+            lines.append('spam_stage_seconds_bucket{0} {1}'.format(
+                format_labels((('stage', stage), ('le', bound))), cumulative))
+        lines.append('spam_stage_seconds_sum{0} {1}'.format(format_labels((('stage', stage), )), histogram.sum))
+        lines.append('spam_stage_seconds_count{0} {1}'.format(format_labels((('stage', stage), )), histogram.count))
+
+    names = sorted(set(name for name, labels in counters))
+    for name in names:
+        lines.append('# TYPE spam_{0}_total counter'.format(name))
+        for (counter_name, labels), value in sorted(counters.items()):
+            if counter_name == name:
+                lines.append('spam_{0}_total{1} {2}'.format(name, format_labels(labels), value))
+
+    lines.append('# TYPE spam_verdict_cache_total counter')
+    lines.append('spam_verdict_cache_total{{result="hit"}} {0}'.format(cache['hits']))
+    lines.append('spam_verdict_cache_total{{result="miss"}} {0}'.format(cache['misses']))
+
+    if model is not None:
+        lines.append('# TYPE spam_model_info gauge')
+        lines.append('spam_model_info{0} 1'.format(format_labels(
+            (('version', model['version']), ('features', model.get('features')), ('created', model['created'])))))
+        lines.append('# TYPE spam_model_corpus_size gauge')
+        lines.append('spam_model_corpus_size {0}'.format(model['corpus_size']))
+        lines.append('# TYPE spam_model_spam_count gauge')
+        lines.append('spam_model_spam_count {0}'.format(model['spam_count']))
+        lines.append('# TYPE spam_model_category_models gauge')
+        lines.append('spam_model_category_models {0}'.format(len(model.get('categories') or ())))
+        lines.append('# TYPE spam_model_training_seconds gauge')
+        for stage, seconds in sorted((model.get('timings') or {}).items()):
+            lines.append('spam_model_training_seconds{0} {1}'.format(format_labels((('stage', stage), )), seconds))
+
+    if queue is not None:
+        lines.append('# TYPE spam_queue_pending gauge')
+        lines.append('spam_queue_pending{{model="question"}} {0}'.format(queue['pending_questions']))
+        lines.append('spam_queue_pending{{model="answer"}} {0}'.format(queue['pending_answers']))
+        lines.append('# TYPE spam_queue_classified_total counter')
+        lines.append('spam_queue_classified_total {0}'.format(queue['classified']))
+        lines.append('# TYPE spam_queue_failed_total counter')
+        lines.append('spam_queue_failed_total {0}'.format(queue['failed']))
+        if queue['classified']:
+            lines.append('# HELP spam_queue_latency_seconds Time from posting to classification of the recent posts.')
+            lines.append('# TYPE spam_queue_latency_seconds summary')
+            for quantile, key in (('0.5', 'latency_p50'), ('0.95', 'latency_p95'), ('1', 'latency_max')):
+                lines.append('spam_queue_latency_seconds{{quantile="{0}"}} {1}'.format(quantile, queue[key]))
+
+    return '\n'.join(lines) + '\n'
+
+# Summary for the moderator dashboard: stage latencies in milliseconds and verdicts per model
+def summary():
+
+    histograms, counters = snapshot()
+    stages = []
+    for stage in STAGES:
+        histogram = histograms[stage]
+        stages.append({
+            'stage': stage,
+            'count': histogram.count,
+            'avg_ms': histogram.sum / histogram.count * 1000 if histogram.count else None,
+            'p50_ms': milliseconds(histogram.quantile(0.5)),
+            'p95_ms': milliseconds(histogram.quantile(0.95)),
+        })
+
+    verdicts = Counter()
+    for (name, labels), value in counters.items():
+        if name == 'verdicts':
+            labels = dict(labels)
+            verdicts[(labels['model'], labels['verdict'])] += value
+
+    return {
+        'stages': stages,
+        'verdicts': [{'model': model, 'verdict': verdict.replace('_', ' '), 'count': value}
+                     for (model, verdict), value in sorted(verdicts.items())],
+        'link_posts': sum(value for (name, labels), value in counters.items() if name == 'link_posts'),
+    }
+
+def milliseconds(seconds):
+    return seconds * 1000 if seconds is not None else None
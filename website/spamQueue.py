@@ -0,0 +1,160 @@
+import threading
+import traceback
+from collections import deque
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+from website.models import Question, Answer, Notification
+from website import spamFilter, spamShadow
+
+# Spam classification queue for new posts. With SPAM_CLASSIFY_QUEUE a new
+# question or answer is saved straight away as pending: spam_pending is set and
+# is_spam stays True, so it is hidden wherever spam is hidden. The queue is the
+# set of pending posts in the database. A consumer scores them in batches and
+# publishes the ones that are not spam, or holds them for review. The consumer is either a thread in
+# the server process (SPAM_QUEUE_CONSUMER = 'thread') or the process_spam_queue
+# management command (SPAM_QUEUE_CONSUMER = 'command').
+
+# Lookup of the category of the posts of a model, for the category spam models
+CATEGORY_FIELDS = {Question: 'category_id', Answer: 'question__category_id'}
+
+# Seconds from posting to publishing of the recently classified posts
+_latencies = deque(maxlen = 1000)
+_latencies_lock = threading.Lock()
+
+# Posts held for review because scoring them failed, in this process
+_failed = 0
+
+_consumer = None
+_consumer_lock = threading.Lock()
+_wake_up = threading.Event()
+
+# Mark a post as waiting for classification, before it is saved
+def hold(post):
+    post.is_spam = True
+    post.spam_pending = True
+
+# Let the consumer know that a post was queued
+def notify():
+    if settings.SPAM_QUEUE_CONSUMER == 'thread':
+        start_consumer()
+        _wake_up.set()
+
+# Notify the owner of the question about a published answer, as question_answer does
+def publish_answer(answer):
+    question = answer.question
+    if (question.user.id != answer.uid):
+        notification = Notification()
+        notification.uid = question.user.id
+        notification.qid = question.id
+        notification.aid = answer.id
+        notification.save()
+
+# Classify one batch of pending posts of a model and publish them.
+# Returns the number of posts classified.
+def process_batch(model, limit):
+
+    posts = list(model.objects.filter(spam_pending = True, spam_moderated = False).annotate(spam_category = F(CATEGORY_FIELDS[model]))
+                 .order_by('date_created')[:limit])
+    if not posts:
+        return 0
+
+    try:
+        scores = spamFilter.score_batch([post.body for post in posts], [post.spam_category for post in posts])
+    except Exception:
+        # Score the posts one by one, so that a post that cannot be scored
+        # does not keep the others in the queue
+        traceback.print_exc()
+        scores = [score_post(post) for post in posts]
+    now = timezone.now()
+
+    for post, score in zip(posts, scores):
+        if score is None:
+            hold_for_review(post)
+            outcome = 'review'
+        else:
+            outcome = spamFilter.apply_score(post, score)
+            spamShadow.submit(post.body, post.spam_category, score)
+        # Only the consumer that takes the post off the queue publishes it, and
+        # never over a moderator's decision
+        updated = model.objects.filter(id = post.id, spam_pending = True, spam_moderated = False).update(
+            spam_pending = False, is_spam = post.is_spam, spam_review = post.spam_review, spam_score = score)
+        if not updated:
+            continue
+        with _latencies_lock:
+            _latencies.append((now - post.date_created).total_seconds())
+        if (model is Answer and outcome == 'publish'):
+            publish_answer(post)
+
+    return len(posts)
+
+# Score of a single post, None if scoring it fails
+def score_post(post):
+    try:
+        return spamFilter.score(post.body, post.spam_category)
+    except Exception:
+        traceback.print_exc()
+        return None
+
+# Take a post that could not be scored off the queue and leave it to a moderator
+def hold_for_review(post):
+    global _failed
+    post.is_spam = True
+    post.spam_review = True
+    post.spam_score = None
+    _failed += 1
+
+# Classify everything that is pending, batch by batch. Returns the number of posts classified.
+def process_queue(batch_size = None):
+
+    if batch_size is None:
+        batch_size = settings.SPAM_QUEUE_BATCH_SIZE
+
+    total = 0
+    for model in (Question, Answer):
+        while True:
+            count = process_batch(model, batch_size)
+            total += count
+            if count < batch_size:
+                break
+    return total
+
+def consume():
+    while True:
+        _wake_up.wait(settings.SPAM_QUEUE_POLL_INTERVAL)
+        _wake_up.clear()
+        try:
+            connection.close_if_unusable_or_obsolete()
+            process_queue()
+        except Exception:
+            traceback.print_exc()
+
+# Start the consumer thread of this process, if it is not running yet
+def start_consumer():
+
+    global _consumer
+    with _consumer_lock:
+        if _consumer is None or not _consumer.is_alive():
+            _consumer = threading.Thread(target = consume, name = 'spam-queue')
+            _consumer.daemon = True
+            _consumer.start()
+
+# Queue depth and classification latency of the posts classified by this process
+def queue_stats():
+
+    with _latencies_lock:
+        latencies = sorted(_latencies)
+
+    stats = {
+        'pending_questions': Question.objects.filter(spam_pending = True).count(),
+        'pending_answers': Answer.objects.filter(spam_pending = True).count(),
+        'classified': len(latencies),
+        'failed': _failed,
+    }
+    if latencies:
+        stats['latency_avg'] = sum(latencies) / len(latencies)
+        stats['latency_p50'] = latencies[len(latencies) // 2]
+        stats['latency_p95'] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        stats['latency_max'] = latencies[-1]
+    return stats
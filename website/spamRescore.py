@@ -0,0 +1,138 @@
+import time
+import multiprocessing
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, When, Value, FloatField
+from website.models import Question, Answer
+from website import spamFilter
+
+# Rescoring of the existing forum posts with the current spam model, e.g. after
+# a retraining. The posts are streamed from the database chunk by chunk, every
+# chunk is cleaned (by a pool of workers if asked for) and scored as a single
+# matrix. Questions and answers are triaged like new posts, their scores and
+# labels are written back with one UPDATE per label, and the posts the model is
+# unsure about go to the review queue. Comments are left out, they have no
+# review queue a moderator could take them off.
+
+# Posts per UPDATE query of their scores, each takes three query parameters
+SCORE_BATCH_SIZE = 300
+
+# The kinds of posts rescored: name, posts to rescore and the lookup of their category.
+# Posts waiting in the classification queue or in the review queue are left there,
+# and so are the ones decided by a moderator.
+def targets():
+    return (
+        ('questions', Question.objects.filter(spam_pending = False, spam_review = False, spam_moderated = False),
+         'category'),
+        ('answers', Answer.objects.filter(spam_pending = False, spam_review = False, spam_moderated = False),
+         'question__category'),
+    )
+
+# Stream (id, body, is_spam, category name, category id) rows of a queryset in lists of chunk_size rows
+def row_chunks(queryset, category_field, chunk_size):
+
+    rows = queryset.order_by('id').values_list('id', 'body', 'is_spam', category_field + '__name', category_field)
+    chunk = []
+    for row in rows.iterator(chunk_size = chunk_size):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# Set is_spam, spam_review and spam_score of posts scored with apply_score
+def update_scores(queryset, posts):
+
+    labels = defaultdict(list)
+    for post in posts:
+        labels[(post.is_spam, post.spam_review)].append(post)
+
+    for (is_spam, spam_review), labelled in labels.items():
+        for i in range(0, len(labelled), SCORE_BATCH_SIZE):
+            batch = labelled[i:i + SCORE_BATCH_SIZE]
+            scores = Case(*[When(id = post.id, then = Value(post.spam_score)) for post in batch],
+                          output_field = FloatField())
+            queryset.filter(id__in = [post.id for post in batch]).update(
+                is_spam = is_spam, spam_review = spam_review, spam_score = scores)
+
+# Score a chunk of rows, with the model of their category
+def rescore_chunk(artifact, pool, chunk):
+
+    xData = []
+    spamFilter.clean_rows(((post_id, body, is_spam) for post_id, body, is_spam, category, category_id in chunk),
+                          pool, xData, [])
+    return spamFilter.score_strings(artifact, xData, [row[4] for row in chunk])
+
+# Rescore all posts, or only the given kinds, with the live spam model. With dry_run
+# nothing is written. Returns a report of the posts scored, the labels that
+# change (or would change) and the posts routed to review, per kind and per category.
+def rescore(dry_run = False, workers = None, chunk_size = None, kinds = None):
+
+    if workers is None:
+        workers = settings.SPAM_TRAIN_WORKERS
+    if chunk_size is None:
+        chunk_size = settings.SPAM_RESCORE_CHUNK_SIZE
+
+    # The same model for the whole run, even if a newer one is trained meanwhile
+    artifact = spamFilter.live_artifact()
+    if artifact is None:
+        raise ValueError('No spam model has been trained yet, run train_spam_filter first')
+    start = time.time()
+
+    report = {
+        'model': artifact['version'],
+        'dry_run': dry_run,
+        'scored': Counter(),
+        'to_spam': Counter(),
+        'to_not_spam': Counter(),
+        'to_review': Counter(),
+        'categories': {},
+    }
+
+    pool = None
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+
+    try:
+        for kind, queryset, category_field in targets():
+            if kinds and kind not in kinds:
+                continue
+
+            for chunk in row_chunks(queryset, category_field, chunk_size):
+                scores = rescore_chunk(artifact, pool, chunk)
+                report['scored'][kind] += len(chunk)
+
+                posts = []
+                to_spam = []
+                to_not_spam = []
+                for (post_id, body, was_spam, category, category_id), score in zip(chunk, scores):
+                    counts = report['categories'].setdefault(category, Counter())
+                    post = queryset.model(id = post_id)
+                    outcome = spamFilter.apply_score(post, score)
+                    is_spam = post.is_spam
+                    posts.append(post)
+
+                    if outcome == 'review':
+                        report['to_review'][kind] += 1
+                        counts['to_review'] += 1
+                    elif is_spam and not was_spam:
+                        to_spam.append(post_id)
+                        counts['to_spam'] += 1
+                    elif was_spam and not is_spam:
+                        to_not_spam.append(post_id)
+                        counts['to_not_spam'] += 1
+                report['to_spam'][kind] += len(to_spam)
+                report['to_not_spam'][kind] += len(to_not_spam)
+
+                if not dry_run:
+                    with transaction.atomic():
+                        update_scores(queryset, posts)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    report['seconds'] = time.time() - start
+    return report
@@ -0,0 +1,163 @@
+import time
+import threading
+import traceback
+from collections import deque
+from django.conf import settings
+from django.db import connection
+from website.cleanText import clean_string
+from website.models import SpamShadowScore
+from website import spamFilter
+
+# Shadow scoring of new posts by a candidate spam model. Every post scored for
+# real is handed over with its live score, and a thread in the server process
+# scores it again with the candidate and the live model, timing both, and
+# records the result. The request only pays for appending to a queue. The
+# comparison report lets a moderator promote the candidate or discard it.
+
+# Posts waiting to be scored by the candidate, as (body, category, live score)
+_pending = deque()
+
+# Posts dropped because the queue was full
+_dropped = 0
+
+_consumer = None
+_consumer_lock = threading.Lock()
+_wake_up = threading.Event()
+
+# The loaded candidate model, reloaded when the candidate changes
+_candidate = None
+
+# Disagreements shown in the comparison report
+REPORT_SAMPLES = 20
+
+# Hand a scored post over for shadow scoring
+def submit(body, category, live_score):
+
+    global _dropped
+    if not settings.SPAM_SHADOW_SCORING or spamFilter.candidate_version() is None:
+        return
+    if len(_pending) >= settings.SPAM_SHADOW_QUEUE_SIZE:
+        _dropped += 1
+        return
+
+    _pending.append((body, category, live_score))
+    if settings.SPAM_SHADOW_IN_BACKGROUND:
+        start_consumer()
+        _wake_up.set()
+    else:
+        process_pending()
+
+# The candidate model, None if there is none
+def candidate_artifact():
+
+    global _candidate
+    version = spamFilter.candidate_version()
+    if version is None:
+        _candidate = None
+    elif _candidate is None or _candidate['version'] != version:
+        try:
+            _candidate = spamFilter.load_live(version)
+        except (IOError, OSError):
+            # Promoted or discarded in the meantime
+            _candidate = None
+    return _candidate
+
+# Score of a cleaned string by a model and the milliseconds it took
+def timed_score(artifact, string, category):
+    start = time.time()
+    result = spamFilter.score_strings(artifact, [string], [category])[0]
+    return result, (time.time() - start) * 1000
+
+# Score the queued posts with the candidate and record the results. Without a
+# candidate the posts are dropped. Returns the number of posts recorded.
+def process_pending():
+
+    entries = []
+    while _pending:
+        entries.append(_pending.popleft())
+    if not entries:
+        return 0
+
+    candidate = candidate_artifact()
+    if candidate is None:
+        return 0
+    live = spamFilter.live_artifact()
+    if live is None:
+        return 0
+
+    scores = []
+    for body, category, live_score in entries:
+        string = clean_string(body)
+        # The live model is timed on the same string, its score is the one the post got
+        live_ms = timed_score(live, string, category)[1]
+        candidate_score, candidate_ms = timed_score(candidate, string, category)
+        agree = (spamFilter.verdict(live_score) == spamFilter.verdict(candidate_score))
+        scores.append(SpamShadowScore(
+            candidate = candidate['version'], live = live['version'],
+            live_score = live_score, candidate_score = candidate_score,
+            live_ms = live_ms, candidate_ms = candidate_ms,
+            agree = agree, body = '' if agree else body,
+        ))
+
+    SpamShadowScore.objects.bulk_create(scores)
+    return len(scores)
+
+def consume():
+    while True:
+        _wake_up.wait(settings.SPAM_QUEUE_POLL_INTERVAL)
+        _wake_up.clear()
+        try:
+            connection.close_if_unusable_or_obsolete()
+            process_pending()
+        except Exception:
+            traceback.print_exc()
+
+# Start the shadow scoring thread of this process, if it is not running yet
+def start_consumer():
+
+    global _consumer
+    with _consumer_lock:
+        if _consumer is None or not _consumer.is_alive():
+            _consumer = threading.Thread(target = consume, name = 'spam-shadow')
+            _consumer.daemon = True
+            _consumer.start()
+
+# Value below which the given fraction of the sorted values lie
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+# Latency percentiles of a list of milliseconds
+def latency_stats(values):
+    values = sorted(values)
+    if not values:
+        return {}
+    return {
+        'p50': percentile(values, 0.5),
+        'p95': percentile(values, 0.95),
+        'p99': percentile(values, 0.99),
+        'max': values[-1],
+    }
+
+# Comparison of the candidate model with the live one over the posts scored
+# in shadow mode: agreement rate, latency percentiles of both models and the
+# most recent disagreements. None if there is no candidate.
+def report():
+
+    version = spamFilter.candidate_version()
+    if version is None:
+        return None
+
+    scores = SpamShadowScore.objects.filter(candidate = version)
+    rows = list(scores.values_list('agree', 'live_ms', 'candidate_ms'))
+    agreed = sum(1 for agree, live_ms, candidate_ms in rows if agree)
+
+    return {
+        'candidate': version,
+        'live': spamFilter.current_version(),
+        'compared': len(rows),
+        'agreement': agreed / len(rows) if rows else None,
+        'live_ms': latency_stats([live_ms for agree, live_ms, candidate_ms in rows]),
+        'candidate_ms': latency_stats([candidate_ms for agree, live_ms, candidate_ms in rows]),
+        'disagreements': list(scores.filter(agree = False).order_by('-date_created')[:REPORT_SAMPLES]),
+        'dropped': _dropped,
+    }
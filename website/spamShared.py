@@ -0,0 +1,152 @@
+import os
+import json
+import tempfile
+import numpy as np
+import scipy.sparse as sp
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import normalize
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer
+
+# Shared layout of a spam model artifact. The arrays of a fitted vectorizer and
+# model are written as .npy files next to the pickled artifact, and every server
+# process maps them read-only instead of unpickling its own copy, so the pages
+# are shared through the page cache. The vocabulary is a sorted array of terms
+# searched with numpy rather than a dict. Online models are updated in place and
+# are always loaded from the pickle.
+
+META_NAME = 'meta.json'
+
+# Artifact fields copied to the shared layout
+META_FIELDS = ('version', 'created', 'corpus_size', 'spam_count', 'features', 'categories', 'timings')
+
+# Turns cleaned strings into the feature matrix of the fitted vectorizer
+class SharedVectorizer(object):
+
+    def __init__(self, meta, arrays):
+        self.kind = meta['vectorizer']
+        self.norm = meta['norm']
+        self.terms = arrays.get('terms')
+        self.columns = arrays.get('columns')
+        self.idf = arrays.get('idf')
+        params = dict(meta['params'], ngram_range = tuple(meta['params']['ngram_range']))
+        if self.kind == 'tfidf':
+            self.analyzer = TfidfVectorizer(**params).build_analyzer()
+        else:
+            self.hasher = HashingVectorizer(**params)
+
+    def counts(self, strings):
+
+        if self.kind == 'hashing':
+            return self.hasher.transform(strings)
+
+        # Look all the tokens of the batch up at once in the sorted vocabulary
+        rows = []
+        tokens = []
+        for row, string in enumerate(strings):
+            analysed = self.analyzer(string)
+            rows.extend([row] * len(analysed))
+            tokens.extend(analysed)
+
+        matrix = sp.csr_matrix((len(strings), len(self.terms)))
+        if not tokens:
+            return matrix
+
+        tokens = np.array(tokens)
+        found = np.searchsorted(self.terms, tokens)
+        found[found == len(self.terms)] = 0
+        known = self.terms[found] == tokens
+        columns = self.columns[found[known]]
+        rows = np.asarray(rows)[known]
+        return sp.csr_matrix((np.ones(len(rows)), (rows, columns)), shape = matrix.shape)
+
+    def transform(self, strings):
+        matrix = self.counts(strings)
+        if self.idf is not None:
+            matrix = matrix.multiply(self.idf).tocsr()
+        if self.norm:
+            matrix = normalize(matrix, norm = self.norm, copy = False)
+        return matrix
+
+# Linear model over the shared coefficients
+class SharedClassifier(object):
+
+    def __init__(self, meta, arrays):
+        self.coef = arrays['coef']
+        self.intercept = meta['intercept']
+        self.classes = np.asarray(meta['classes'])
+
+    def decision_function(self, matrix):
+        return matrix.dot(self.coef) + self.intercept
+
+    def predict(self, matrix):
+        return self.classes[(self.decision_function(matrix) > 0).astype(int)]
+
+# Parameters of a vectorizer that can be written as JSON, the dtype is always float64
+def vectorizer_params(vectorizer, **changes):
+    params = dict(vectorizer.get_params(), **changes)
+    del params['dtype']
+    return params
+
+# The arrays and parameters of the vectorizers new_vectorizer() makes
+def vectorizer_layout(vectorizer):
+
+    if isinstance(vectorizer, Pipeline):
+        hasher, transformer = [step for name, step in vectorizer.steps]
+        return ({'vectorizer': 'hashing', 'params': vectorizer_params(hasher), 'norm': transformer.norm},
+                {'idf': transformer.idf_})
+
+    if isinstance(vectorizer, HashingVectorizer):
+        params = vectorizer_params(vectorizer, norm = None)
+        return {'vectorizer': 'hashing', 'params': params, 'norm': vectorizer.norm}, {}
+
+    # Only the analyzer is rebuilt from the parameters of a TfidfVectorizer
+    params = vectorizer_params(vectorizer)
+    terms = sorted(vectorizer.vocabulary_)
+    arrays = {
+        'terms': np.array(terms),
+        'columns': np.array([vectorizer.vocabulary_[term] for term in terms], dtype = np.int32),
+        'idf': vectorizer.idf_,
+    }
+    return {'vectorizer': 'tfidf', 'params': params, 'norm': vectorizer.norm}, arrays
+
+# Write the shared layout of an artifact to path. The directory is renamed into
+# place when complete, so that readers never see a partial one.
+def save_shared(artifact, path):
+
+    meta, arrays = vectorizer_layout(artifact['vectorizer'])
+    model = artifact['model']
+    meta['intercept'] = float(model.intercept_[0])
+    meta['classes'] = [int(label) for label in model.classes_]
+    arrays['coef'] = np.ascontiguousarray(model.coef_[0])
+    for field in META_FIELDS:
+        meta[field] = artifact.get(field)
+    meta['created'] = str(meta['created'])
+
+    directory = tempfile.mkdtemp(dir = os.path.dirname(path), suffix = '.tmp')
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, name + '.npy'), array)
+    with open(os.path.join(directory, META_NAME), 'w') as f:
+        json.dump(meta, f)
+    os.chmod(directory, 0o755)
+    os.rename(directory, path)
+
+# Map the shared layout at path into an artifact, None if there is none
+def load_shared(directory):
+
+    try:
+        with open(os.path.join(directory, META_NAME)) as f:
+            meta = json.load(f)
+        arrays = {}
+        for file_name in os.listdir(directory):
+            if file_name.endswith('.npy'):
+                arrays[file_name[:-4]] = np.load(os.path.join(directory, file_name), mmap_mode = 'r')
+    except (IOError, OSError):
+        # No shared layout, or it was pruned in the meantime
+        return None
+
+    artifact = dict((field, meta.get(field)) for field in META_FIELDS)
+    artifact['online'] = False
+    artifact['shared'] = True
+    artifact['vectorizer'] = SharedVectorizer(meta, arrays)
+    artifact['model'] = SharedClassifier(meta, arrays)
+    return artifact
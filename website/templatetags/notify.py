@@ -4,10 +4,13 @@ from website.models import Question, Answer, Notification
 
 register = template.Library()
 
-def get_notification(nid):
-    notification =  Notification.objects.get(pk = nid)
-    question = Question.objects.get(pk = notification.qid);
-    answer = Answer.objects.get(pk = notification.aid)
+# notification may have the question and answer it is about set by the view,
+# the ones it has not are looked up
+def get_notification(notification):
+    if not isinstance(notification, Notification):
+        notification = Notification.objects.get(pk = notification)
+    question = getattr(notification, 'question', None) or Question.objects.get(pk = notification.qid)
+    answer = getattr(notification, 'answer', None) or Answer.objects.get(pk = notification.aid)
     context = {
         'notification': notification,
         'question': question,
@@ -21,15 +24,15 @@ def notification_count(user_id):
     return count
 register.simple_tag(notification_count)
 
-# retriving the latest post of a category
+# retriving whether a category has questions, categories annotated with
+# question_count by the view need no query
 def latest_question(category):
-    question = None
-    try:
-        question = Question.objects.filter(category = category).order_by('-date_created')[0]
-    except:
-        pass
+    question_count = getattr(category, 'question_count', None)
+    if question_count is None:
+        question_count = Question.objects.filter(category = category).count()
     context = {
-        'question': question
+        'category': category,
+        'question_count': question_count,
     }
     return context
 register.inclusion_tag('website/templates/latest_question.html')(latest_question)
@@ -12,12 +12,12 @@ def can_edit(user, obj):
         return False
 register.filter(can_edit)
 
+# Looked up once per user object, templates ask for every post on the page
 def is_moderator(user):
     try:
-        if user.groups.count() > 0:
-            return True
-        else:
-            return False
+        if not hasattr(user, '_is_moderator'):
+            user._is_moderator = user.groups.count() > 0
+        return user._is_moderator
     except:
         return False
 register.filter(is_moderator)
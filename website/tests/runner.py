@@ -0,0 +1,19 @@
+import shutil
+import tempfile
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+# Runs the tests with a temporary spam model directory, so that no test trains
+# into, publishes over or prunes the spam models of the checkout it runs in
+class TestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super(TestRunner, self).setup_test_environment(**kwargs)
+        self.model_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(SPAM_MODEL_DIR = self.model_dir)
+        self.settings_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.settings_override.disable()
+        shutil.rmtree(self.model_dir)
+        super(TestRunner, self).teardown_test_environment(**kwargs)
@@ -0,0 +1,24 @@
+import shutil
+import tempfile
+from django.test import TestCase, override_settings
+from website import spamFilter
+
+# Tests of the spam filter and of the views scoring posts: every test gets a
+# temporary spam model directory and starts without a loaded model. Settings in
+# spam_settings are overridden along with it.
+class SpamModelTestCase(TestCase):
+
+    spam_settings = {}
+
+    def setUp(self):
+        """Use a temporary spam model directory and no loaded model"""
+        self.model_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(SPAM_MODEL_DIR = self.model_dir, **self.spam_settings)
+        self.settings_override.enable()
+        spamFilter._live = None
+        self.addCleanup(self.remove_model_dir)
+
+    def remove_model_dir(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.model_dir)
+        spamFilter._live = None
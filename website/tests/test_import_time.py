@@ -0,0 +1,46 @@
+import os
+import sys
+import json
+import subprocess
+from django.conf import settings
+from django.test import SimpleTestCase
+from website.spam import LazyModule
+
+# Imported by the spam subsystem only, and slower to import than Django itself
+HEAVY_MODULES = ('numpy', 'scipy', 'sklearn', 'nltk', 'bs4', 'openpyxl')
+
+# Import a module in a fresh interpreter and report what it imported, and how long it took
+SCRIPT = '''
+import sys, time, json, importlib, django
+django.setup()
+start = time.time()
+importlib.import_module(sys.argv[1])
+print(json.dumps({'seconds': time.time() - start, 'modules': sorted(sys.modules)}))
+'''
+
+class ImportTimeTest(SimpleTestCase):
+
+    def import_report(self, module):
+        env = dict(os.environ, PYTHONPATH = os.pathsep.join(sys.path),
+                   DJANGO_SETTINGS_MODULE = os.environ.get('DJANGO_SETTINGS_MODULE', 'forums.settings'))
+        output = subprocess.check_output([sys.executable, '-c', SCRIPT, module], env = env)
+        report = json.loads(output.decode('utf-8').splitlines()[-1])
+        # The time depends on the machine, it is only reported
+        sys.stderr.write('\n{0} imported in {1:.3f}s\n'.format(module, report['seconds']))
+        return report
+
+    def test_views_import_no_spam_dependencies(self):
+        report = self.import_report('website.views')
+        loaded = [module for module in HEAVY_MODULES if module in report['modules']]
+        self.assertEqual(loaded, [])
+
+    def test_urls_import_no_spam_dependencies(self):
+        report = self.import_report(settings.ROOT_URLCONF)
+        loaded = [module for module in HEAVY_MODULES if module in report['modules']]
+        self.assertEqual(loaded, [])
+
+    def test_lazy_module(self):
+        module = LazyModule('website.spamMetrics')
+        self.assertIn('lazy module website.spamMetrics>', repr(module))
+        self.assertEqual(module.STAGES, ('clean', 'model', 'score'))
+        self.assertIn('(loaded)', repr(module))
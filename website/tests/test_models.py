@@ -156,6 +156,13 @@ class AnswerModelTest(TestCase):
         user = User.objects.get(username="johndoe")
         self.assertEqual(user, answer.user())
 
+    def test_uid(self):
+        answer = Answer.objects.get(body="TestAnswer")
+        user = User.objects.get(username="johndoe")
+        self.assertEqual(user.id, answer.uid)
+        self.assertEqual(user, answer.author)
+        self.assertQuerysetEqual(Answer.objects.filter(author=user), [repr(answer)])
+
 class AnswerCommentModelTest(TestCase):
 
     @classmethod
@@ -170,4 +177,10 @@ class AnswerCommentModelTest(TestCase):
     def test_user(self):
         answer_comment = AnswerComment.objects.get(body="TestAnswerComment")
         user = User.objects.get(username="johndoe")
-        self.assertEqual(user, answer_comment.user())
\ No newline at end of file
+        self.assertEqual(user, answer_comment.user())
+
+    def test_uid(self):
+        answer_comment = AnswerComment.objects.get(body="TestAnswerComment")
+        user = User.objects.get(username="johndoe")
+        self.assertEqual(user.id, answer_comment.uid)
+        self.assertEqual(user, answer_comment.author)
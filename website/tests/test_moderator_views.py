@@ -4,6 +4,8 @@ from django.contrib.auth.models import User, Group
 from django.conf import settings
 from website.models import *
 from website.forms import *
+from website import spamFilter
+from website.tests.spamModel import SpamModelTestCase
 
 
 class AnswerDeleteViewTest(TestCase):
@@ -104,6 +106,7 @@ class MarkAnswerSpamViewTest(TestCase):
                                         {'selector': 'spam'})
         answer = Answer.objects.get(id=answer_id)
         self.assertTrue(answer.is_spam)
+        self.assertTrue(answer.spam_moderated)
 
     def test_view_post_answer_non_spam(self):
         self.client.login(username='johndoe', password='johndoe')
@@ -275,4 +278,181 @@ class ModeratorUnansweredViewTest(TestCase):
         question_id = Question.objects.get(title='TestQuestion').id
         self.assertTrue('questions' in response.context)
         self.assertQuerysetEqual(response.context['questions'],\
-                                    ['<Question: {0} - TestCategory -  - TestQuestion - johndoe>'.format(question_id)])
\ No newline at end of file
+                                    ['<Question: {0} - TestCategory -  - TestQuestion - johndoe>'.format(question_id)])
+
+class TrainSpamFilterViewTest(SpamModelTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create sample moderator"""
+        user = User.objects.create_user("johndoe", "johndoe@example.com", "johndoe")
+        User.objects.create_user("johndoe2", "johndoe2@example.com", "johndoe2")
+        category = FossCategory.objects.create(name="TestCategory", email="category@example.com")
+        group = Group.objects.create(name="TestCategory_moderator")
+        ModeratorGroup.objects.create(group=group, category=category)
+        user.groups.add(group)
+
+    spam_settings = {'SPAM_TRAIN_IN_BACKGROUND': False}
+
+    def test_view_redirect_if_not_logged_in(self):
+        response = self.client.get(reverse('website:train_spam_filter'))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.url.startswith('/accounts/login/'))
+
+    def test_view_redirect_if_not_moderator(self):
+        self.client.login(username='johndoe2', password='johndoe2')
+        response = self.client.get(reverse('website:train_spam_filter'), follow=True)
+        self.assertRedirects(response, reverse('website:home'))
+
+    def test_view_redirects_to_moderator_home(self):
+        self.client.login(username='johndoe', password='johndoe')
+        response = self.client.get(reverse('website:train_spam_filter'))
+        self.assertRedirects(response, reverse('website:moderator_home'))
+
+    def test_view_ajax_returns_job(self):
+        self.client.login(username='johndoe', password='johndoe')
+        response = self.client.get(reverse('website:train_spam_filter'), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()['job_id']
+        self.assertEqual(response.json()['status_url'], reverse('website:train_spam_filter_status', args=(job_id, )))
+
+    def test_view_status(self):
+        self.client.login(username='johndoe', password='johndoe')
+        response = self.client.get(reverse('website:train_spam_filter'), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        response = self.client.get(response.json()['status_url'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'done')
+        self.assertEqual(response.json()['version'], spamFilter.list_versions()[-1])
+
+    def test_view_status_unknown_job(self):
+        self.client.login(username='johndoe', password='johndoe')
+        response = self.client.get(reverse('website:train_spam_filter_status', args=('unknown', )))
+        self.assertEqual(response.status_code, 404)
+
+class ReviewQueueViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create sample moderator and held posts"""
+        user = User.objects.create_user("johndoe", "johndoe@example.com", "johndoe")
+        User.objects.create_user("johndoe2", "johndoe2@example.com", "johndoe2")
+        category = FossCategory.objects.create(name="TestCategory", email="category@example.com")
+        other = FossCategory.objects.create(name="OtherCategory", email="other@example.com")
+        group = Group.objects.create(name="TestCategory_moderator")
+        ModeratorGroup.objects.create(group=group, category=category)
+        user.groups.add(group)
+        question = Question.objects.create(user=user, category=category, title="TestQuestion", body="Test question body")
+        Question.objects.create(user=user, category=category, title="HeldQuestion", body="Held question body",
+                                is_spam=True, spam_review=True, spam_score=-0.1)
+        Question.objects.create(user=user, category=category, title="SurerQuestion", body="Surer question body",
+                                is_spam=True, spam_review=True, spam_score=0.2)
+        Question.objects.create(user=user, category=other, title="OtherQuestion", body="Other question body",
+                                is_spam=True, spam_review=True, spam_score=0)
+        Answer.objects.create(question=question, uid=user.id, body="Held answer body",
+                              is_spam=True, spam_review=True, spam_score=0.1)
+
+    def test_view_redirect_if_not_moderator(self):
+        self.client.login(username='johndoe2', password='johndoe2')
+        response = self.client.get(reverse('website:moderator_review'), follow=True)
+        self.assertRedirects(response, reverse('website:home'))
+
+    def test_view_ordered_by_score(self):
+        self.client.login(username='johndoe', password='johndoe')
+        response = self.client.get(reverse('website:moderator_review'))
+        self.assertTemplateUsed(response, 'website/templates/moderator/review.html')
+        self.assertEqual([question.title for question in response.context['questions']],
+                         ['SurerQuestion', 'HeldQuestion'])
+        self.assertEqual([answer.body for answer in response.context['answers']], ['Held answer body'])
+
+    def test_mark_not_spam(self):
+        self.client.login(username='johndoe', password='johndoe')
+        question = Question.objects.get(title='HeldQuestion')
+        response = self.client.post(reverse('website:moderator_review_post', args=('question', question.id)),
+                                    {'selector': 'non-spam'})
+        self.assertRedirects(response, reverse('website:moderator_review'))
+        question.refresh_from_db()
+        self.assertFalse(question.is_spam)
+        self.assertFalse(question.spam_review)
+        self.assertTrue(question.spam_moderated)
+
+    def test_decision_takes_post_off_queue(self):
+        self.client.login(username='johndoe', password='johndoe')
+        Question.objects.filter(title='HeldQuestion').update(spam_pending=True)
+        question = Question.objects.get(title='HeldQuestion')
+        self.client.post(reverse('website:moderator_review_post', args=('question', question.id)),
+                         {'selector': 'non-spam'})
+        question.refresh_from_db()
+        self.assertFalse(question.spam_pending)
+
+    def test_mark_spam(self):
+        self.client.login(username='johndoe', password='johndoe')
+        question = Question.objects.get(title='HeldQuestion')
+        self.client.post(reverse('website:moderator_review_post', args=('question', question.id)),
+                         {'selector': 'spam'})
+        question.refresh_from_db()
+        self.assertTrue(question.is_spam)
+        self.assertFalse(question.spam_review)
+
+    def test_published_answer_notifies(self):
+        self.client.login(username='johndoe', password='johndoe')
+        answer = Answer.objects.get(body='Held answer body')
+        answer.uid = User.objects.get(username='johndoe2').id
+        answer.save()
+        self.client.post(reverse('website:moderator_review_post', args=('answer', answer.id)),
+                         {'selector': 'non-spam'})
+        self.assertEqual(Notification.objects.get().aid, answer.id)
+
+    def test_unknown_post_type(self):
+        self.client.login(username='johndoe', password='johndoe')
+        response = self.client.post(reverse('website:moderator_review_post', args=('comment', 1)),
+                                    {'selector': 'spam'})
+        self.assertEqual(response.status_code, 404)
+
+class SpamModelViewTest(SpamModelTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create sample moderator"""
+        user = User.objects.create_user("johndoe", "johndoe@example.com", "johndoe")
+        User.objects.create_user("johndoe2", "johndoe2@example.com", "johndoe2")
+        category = FossCategory.objects.create(name="TestCategory", email="category@example.com")
+        group = Group.objects.create(name="TestCategory_moderator")
+        ModeratorGroup.objects.create(group=group, category=category)
+        user.groups.add(group)
+
+    def setUp(self):
+        """Train a live and a candidate model into a temporary model directory"""
+        super(SpamModelViewTest, self).setUp()
+        self.live = spamFilter.train()
+        self.candidate = spamFilter.train(candidate=True)
+
+    def test_view_redirect_if_not_moderator(self):
+        self.client.login(username='johndoe2', password='johndoe2')
+        response = self.client.get(reverse('website:moderator_spam_model'), follow=True)
+        self.assertRedirects(response, reverse('website:home'))
+
+    def test_view_report(self):
+        self.client.login(username='johndoe', password='johndoe')
+        response = self.client.get(reverse('website:moderator_spam_model'))
+        self.assertTemplateUsed(response, 'website/templates/moderator/spam-model.html')
+        self.assertEqual(response.context['live']['version'], self.live)
+        self.assertEqual(response.context['report']['candidate'], self.candidate)
+        self.assertFalse(response.context['can_rollback'])
+
+    def test_promote_and_rollback(self):
+        self.client.login(username='johndoe', password='johndoe')
+        response = self.client.post(reverse('website:moderator_spam_model'), {'action': 'promote'})
+        self.assertRedirects(response, reverse('website:moderator_spam_model'))
+        self.assertEqual(spamFilter.live_artifact()['version'], self.candidate)
+        self.client.post(reverse('website:moderator_spam_model'), {'action': 'rollback'})
+        self.assertEqual(spamFilter.live_artifact()['version'], self.live)
+
+    def test_discard(self):
+        self.client.login(username='johndoe', password='johndoe')
+        self.client.post(reverse('website:moderator_spam_model'), {'action': 'discard'})
+        self.assertIsNone(spamFilter.candidate_version())
+
+    def test_unknown_action(self):
+        self.client.login(username='johndoe', password='johndoe')
+        response = self.client.post(reverse('website:moderator_spam_model'), {'action': 'delete'})
+        self.assertEqual(response.status_code, 404)
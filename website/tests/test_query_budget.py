@@ -0,0 +1,129 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.contrib.auth.models import User, Group
+from website.models import *
+from website import viewCounter
+
+# Query budgets of the views. Every test renders a view, adds questions,
+# answers, comments, notifications and categories to the forum and renders it
+# again. The view must stay within its budget both times and issue the same
+# number of queries, so a view or template that queries once per post fails.
+
+# Answers with comments on a question, with a notification to the question's
+# author for each of them
+def add_answers(question, users, answers, comments):
+    for i in range(answers):
+        answer = Answer.objects.create(question=question, uid=users[i % len(users)].id, body="Answer body")
+        answer.userUpVotes.add(users[0])
+        Notification.objects.create(uid=question.user.id, qid=question.id, aid=answer.id)
+        for j in range(comments):
+            comment = AnswerComment.objects.create(answer=answer, uid=users[j % len(users)].id, body="Comment body")
+            Notification.objects.create(uid=question.user.id, qid=question.id, aid=answer.id, cid=comment.id)
+
+# N questions by the given users in each category, with M answers of K comments each
+def seed(users, categories, questions, answers, comments):
+    for category in categories:
+        for i in range(questions):
+            question = Question.objects.create(user=users[i % len(users)], category=category,
+                                               title="Question {0}".format(i), body="Question body")
+            question.userUpVotes.add(users[-1])
+            add_answers(question, users, answers, comments)
+
+# Views of questions are written at once, so that they count against the budget
+@override_settings(QUESTION_VIEWS_FLUSH_INTERVAL=0)
+class QueryBudgetTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data"""
+        cls.owner = User.objects.create_user("johndoe", "johndoe@example.com", "johndoe",
+                                             first_name="John", last_name="Doe")
+        cls.users = [cls.owner] + [User.objects.create_user("user{0}".format(i), "user@example.com", "user")
+                                   for i in range(3)]
+        cls.category = FossCategory.objects.create(name="TestCategory", email="category@example.com")
+
+        cls.moderator = User.objects.create_user("moderator", "moderator@example.com", "moderator")
+        cls.moderator.groups.add(Group.objects.create(name="forum_moderator"))
+        cls.category_moderator = User.objects.create_user("categorymoderator", "moderator@example.com", "moderator")
+        group = Group.objects.create(name="TestCategory_moderator")
+        ModeratorGroup.objects.create(group=group, category=cls.category)
+        cls.category_moderator.groups.add(group)
+
+        seed(cls.users, [cls.category], 1, 1, 1)
+        cls.question = Question.objects.get(category=cls.category)
+
+    def setUp(self):
+        viewCounter.reset()
+
+    # Grow every dimension of the forum the views list or count
+    def grow(self):
+        categories = [self.category] + [FossCategory.objects.create(name="Category{0}".format(i),
+                                                                    email="category@example.com")
+                                        for i in range(3)]
+        seed(self.users, categories, 4, 3, 2)
+        add_answers(self.question, self.users, 4, 3)
+
+    def count_queries(self, url, user):
+        if user is not None:
+            self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertQueryBudget(self, budget, url, user=None):
+        # The first visit of a user to a question also records the viewer
+        self.count_queries(url, user)
+        before = self.count_queries(url, user)
+        self.grow()
+        after = self.count_queries(url, user)
+        self.assertLessEqual(before, budget, "{0} over its budget of {1} queries".format(url, budget))
+        self.assertEqual(before, after, "{0} queries grow with the posts".format(url))
+
+class WebsiteQueryBudgetTest(QueryBudgetTestCase):
+
+    def test_home(self):
+        self.assertQueryBudget(3, reverse('website:home'))
+
+    def test_questions(self):
+        self.assertQueryBudget(1, reverse('website:questions'))
+
+    def test_filter(self):
+        self.assertQueryBudget(1, reverse('website:filter', args=("TestCategory",)))
+
+    def test_search(self):
+        self.assertQueryBudget(1, reverse('website:search'))
+
+    def test_notifications(self):
+        self.assertQueryBudget(7, reverse('website:user_notifications', args=(self.owner.id,)), self.owner)
+
+    def test_view_profile(self):
+        self.assertQueryBudget(8, reverse('view_profile', args=(self.owner.id,)), self.owner)
+
+    def test_get_question(self):
+        self.assertQueryBudget(8, reverse('website:get_question', args=(self.question.id,)))
+
+    def test_get_question_logged_in(self):
+        self.assertQueryBudget(17, reverse('website:get_question', args=(self.question.id,)), self.owner)
+
+class ModeratorQueryBudgetTest(QueryBudgetTestCase):
+
+    def test_moderator_home(self):
+        self.assertQueryBudget(6, reverse('website:moderator_home'), self.moderator)
+
+    def test_moderator_home_category_moderator(self):
+        self.assertQueryBudget(9, reverse('website:moderator_home'), self.category_moderator)
+
+    def test_moderator_questions(self):
+        self.assertQueryBudget(5, reverse('website:moderator_questions'), self.moderator)
+
+    def test_moderator_questions_category_moderator(self):
+        self.assertQueryBudget(8, reverse('website:moderator_questions'), self.category_moderator)
+
+    def test_moderator_unanswered(self):
+        self.assertQueryBudget(8, reverse('website:moderator_unanswered'), self.category_moderator)
+
+    def test_moderator_review(self):
+        self.assertQueryBudget(6, reverse('website:moderator_review'), self.moderator)
@@ -0,0 +1,569 @@
+import os
+import json
+import time
+import random
+import numpy as np
+import shutil
+import tempfile
+import openpyxl
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.core.management import call_command
+from django.contrib.auth.models import User
+from io import StringIO
+from website import spamFilter, spamJobs
+from website.tests.spamModel import SpamModelTestCase
+from website.management.commands.benchmark_spam_filter import synthetic_corpus
+from website.cleanText import TextNormaliser, clean_string
+from website.models import FossCategory, Question, Answer
+
+class SpamModelStoreTest(SpamModelTestCase):
+
+    spam_settings = {'SPAM_MODEL_KEEP': 2}
+
+    def test_no_versions_in_empty_store(self):
+        self.assertEqual(spamFilter.list_versions(), [])
+        self.assertIsNone(spamFilter.load_artifact())
+
+    def test_train_writes_artifact(self):
+        version = spamFilter.train()
+        self.assertEqual(spamFilter.list_versions(), [version])
+        self.assertTrue(os.path.isfile(spamFilter.artifact_path(version)))
+        artifact = spamFilter.load_artifact()
+        self.assertEqual(artifact['version'], version)
+        self.assertTrue(artifact['corpus_size'] > 0)
+
+    def test_old_artifacts_removed(self):
+        versions = [spamFilter.train() for i in range(3)]
+        self.assertEqual(spamFilter.list_versions(), versions[1:])
+
+    def test_remove_version_already_removed(self):
+        version = spamFilter.train()
+        os.remove(spamFilter.artifact_path(version))
+        spamFilter.remove_version(version)
+        spamFilter.remove_version(version)
+        self.assertEqual(spamFilter.list_versions(), [])
+        self.assertFalse(os.path.exists(spamFilter.shared_path(version)))
+
+    def test_predict_loads_newest_artifact(self):
+        version = spamFilter.train()
+        spamFilter._live = None
+        spamFilter.predict('How do I plot a graph in Scilab?')
+        self.assertEqual(spamFilter._live['version'], version)
+
+    def test_keywords_when_store_empty(self):
+        self.assertIsNone(spamFilter.live_artifact())
+        self.assertEqual(spamFilter.predict('How do I plot a graph in Scilab?'), 'Not Spam')
+        self.assertEqual(spamFilter.score_batch(['Buy now at http://example.com']), [settings.SPAM_LINK_SCORE])
+        self.assertEqual(spamFilter.list_versions(), [])
+
+    def test_predict_link_is_spam(self):
+        self.assertEqual(spamFilter.predict('Buy now at http://example.com'), 'Spam')
+
+    def test_management_command(self):
+        out = StringIO()
+        call_command('train_spam_filter', stdout = out)
+        version = spamFilter.list_versions()[-1]
+        self.assertIn('Stored live spam model {0}'.format(version), out.getvalue())
+        self.assertEqual(spamFilter.current_version(), version)
+
+    def test_management_command_trains_candidate(self):
+        live = spamFilter.train()
+        out = StringIO()
+        call_command('train_spam_filter', stdout = out)
+        version = spamFilter.list_versions()[-1]
+        self.assertIn('Stored candidate spam model {0}'.format(version), out.getvalue())
+        self.assertEqual(spamFilter.candidate_version(), version)
+        self.assertEqual(spamFilter.current_version(), live)
+
+    @override_settings(SPAM_VECTORIZER = 'hashing', SPAM_HASHING_FEATURES = 2 ** 12)
+    def test_hashing_vectorizer(self):
+        spamFilter.train()
+        artifact = spamFilter.load_artifact()
+        self.assertEqual(artifact['features'], 'hashing')
+        self.assertEqual(artifact['model'].coef_.shape, (1, 2 ** 12))
+        self.assertEqual(spamFilter.predict('How do I plot a graph in Scilab?'), 'Not Spam')
+
+    @override_settings(SPAM_HASHING_FEATURES = 2 ** 12)
+    def test_features_given(self):
+        spamFilter.train(features = 'hashing')
+        artifact = spamFilter.load_artifact()
+        self.assertEqual(artifact['features'], 'hashing')
+        self.assertEqual(artifact['model'].coef_.shape, (1, 2 ** 12))
+
+    @override_settings(SPAM_VECTORIZER = 'hashing', SPAM_HASHING_FEATURES = 2 ** 12, SPAM_HASHING_IDF = False)
+    def test_hashing_vectorizer_without_idf(self):
+        spamFilter.train()
+        self.assertFalse(hasattr(spamFilter.load_artifact()['vectorizer'], 'steps'))
+        self.assertEqual(spamFilter.predict('How do I plot a graph in Scilab?'), 'Not Spam')
+
+    def test_newer_artifact_is_picked_up(self):
+        spamFilter.train()
+        artifact = dict(spamFilter.load_artifact(), version = '99999999999999999999')
+        spamFilter.save_artifact(artifact)
+        spamFilter.publish(artifact['version'])
+        with override_settings(SPAM_MODEL_RELOAD_INTERVAL = 0):
+            self.assertEqual(spamFilter.live_artifact()['version'], artifact['version'])
+
+    def test_newer_artifact_waits_for_reload_interval(self):
+        version = spamFilter.train()
+        spamFilter.save_artifact(dict(spamFilter.load_artifact(), version = '99999999999999999999'))
+        spamFilter.publish('99999999999999999999')
+        spamFilter._last_check = time.time()
+        with override_settings(SPAM_MODEL_RELOAD_INTERVAL = 3600):
+            self.assertEqual(spamFilter.live_artifact()['version'], version)
+
+class SharedSpamModelTest(SpamModelTestCase):
+
+    spam_settings = {'SPAM_MODEL_KEEP': 2}
+
+    def test_live_model_is_mapped(self):
+        version = spamFilter.train()
+        self.assertTrue(os.path.isdir(spamFilter.shared_path(version)))
+        spamFilter._live = None
+        artifact = spamFilter.live_artifact()
+        self.assertTrue(artifact['shared'])
+        self.assertIsInstance(artifact['model'].coef, np.memmap)
+
+    def test_same_verdicts_as_pickle(self):
+        spamFilter.train()
+        strings = [clean_string(body) for body in
+                   ['How do I plot a graph in Scilab?', 'swiss replica watches buy', 'cheap loans, call now', '']]
+        pickled = spamFilter.load_artifact()
+        self.assertEqual(list(spamFilter.classify(spamFilter._live, strings)),
+                         list(spamFilter.classify(pickled, strings)))
+
+    @override_settings(SPAM_VECTORIZER = 'hashing', SPAM_HASHING_FEATURES = 2 ** 12)
+    def test_hashing_same_verdicts_as_pickle(self):
+        spamFilter.train()
+        xData, yData = spamFilter.store(workers = 1)
+        pickled = spamFilter.load_artifact()
+        self.assertEqual(list(spamFilter.classify(spamFilter._live, xData)),
+                         list(spamFilter.classify(pickled, xData)))
+
+    @override_settings(SPAM_MODEL_SHARED = False)
+    def test_shared_layout_disabled(self):
+        version = spamFilter.train()
+        self.assertFalse(os.path.exists(spamFilter.shared_path(version)))
+        self.assertNotIn('shared', spamFilter.live_artifact())
+
+    def test_old_layouts_removed(self):
+        versions = [spamFilter.train() for i in range(3)]
+        self.assertFalse(os.path.exists(spamFilter.shared_path(versions[0])))
+        self.assertTrue(os.path.isdir(spamFilter.shared_path(versions[2])))
+
+    def test_published_model_reloaded_at_once(self):
+        spamFilter.train()
+        old = spamFilter._live
+        old_published = spamFilter._published
+        version = spamFilter.train()
+        # As seen by a process that has not reloaded yet
+        spamFilter._live = old
+        spamFilter._published = old_published
+        spamFilter._last_check = time.time()
+        with override_settings(SPAM_MODEL_RELOAD_INTERVAL = 3600):
+            self.assertEqual(spamFilter.live_artifact()['version'], version)
+
+@override_settings(SPAM_CATEGORY_MODELS = True, SPAM_CATEGORY_MIN_POSTS = 10, SPAM_CATEGORY_MIN_SPAM = 3)
+class CategorySpamModelTest(SpamModelTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create sample data"""
+        user = User.objects.create_user("johndoe", "johndoe@example.com", "johndoe")
+        category = FossCategory.objects.create(name="Scilab", email="scilab@example.com")
+        sparse = FossCategory.objects.create(name="eSim", email="esim@example.com")
+        for i in range(8):
+            Question.objects.create(user=user, category=category, title="Question{0}".format(i),
+                                    body="How do I simulate xcos block diagram number {0}?".format(i))
+        for i in range(4):
+            Question.objects.create(user=user, category=category, title="Spam{0}".format(i),
+                                    body="Cheap casino bonus offer number {0}".format(i), is_spam=True)
+        Question.objects.create(user=user, category=sparse, title="Netlist", body="How do I export a netlist?")
+
+    spam_settings = {'SPAM_MODEL_KEEP': 2}
+
+    def setUp(self):
+        """Use a temporary model directory and no loaded model"""
+        super(CategorySpamModelTest, self).setUp()
+        self.category = FossCategory.objects.get(name='Scilab').id
+        self.sparse = FossCategory.objects.get(name='eSim').id
+
+    def test_only_large_categories_get_models(self):
+        version = spamFilter.train()
+        self.assertEqual(spamFilter.load_artifact()['categories'], [self.category])
+        artifact = spamFilter.load_artifact(version, self.category)
+        self.assertEqual((artifact['corpus_size'], artifact['spam_count']), (12, 4))
+        self.assertTrue(os.path.isdir(spamFilter.shared_path(version, self.category)))
+        self.assertEqual(spamFilter.list_versions(), [version])
+
+    def test_trained_in_parallel(self):
+        spamFilter.train(workers = 2)
+        self.assertEqual(spamFilter.live_artifact()['categories'], [self.category])
+
+    def test_loaded_lazily(self):
+        spamFilter.train()
+        spamFilter._live = None
+        artifact = spamFilter.live_artifact()
+        self.assertNotIn('category_models', artifact)
+        spamFilter.score('How do I export a netlist?', self.sparse)
+        self.assertNotIn('category_models', artifact)
+        spamFilter.score('How do I simulate xcos?', self.category)
+        self.assertEqual(list(artifact['category_models']), [self.category])
+
+    def test_scored_by_category_model(self):
+        spamFilter.train()
+        artifact = spamFilter.live_artifact()
+        body = 'Cheap casino bonus offer today'
+        margin = spamFilter.decision(spamFilter.category_artifact(artifact, self.category), [clean_string(body)])[0]
+        self.assertEqual(spamFilter.score(body, self.category), float(margin))
+        self.assertEqual(spamFilter.score(body, self.sparse), spamFilter.score(body))
+        self.assertEqual(spamFilter.score_batch([body, body], [self.category, None]),
+                         [spamFilter.score(body, self.category), spamFilter.score(body)])
+
+    def test_global_model_when_disabled(self):
+        spamFilter.train()
+        body = 'Cheap casino bonus offer today'
+        with override_settings(SPAM_CATEGORY_MODELS = False):
+            self.assertEqual(spamFilter.score(body, self.category), spamFilter.score(body))
+
+    def test_old_category_models_removed(self):
+        versions = [spamFilter.train() for i in range(3)]
+        self.assertFalse(os.path.exists(spamFilter.artifact_path(versions[0], self.category)))
+        self.assertFalse(os.path.exists(spamFilter.shared_path(versions[0], self.category)))
+        self.assertTrue(os.path.isfile(spamFilter.artifact_path(versions[2], self.category)))
+
+@override_settings(SPAM_TRAIN_IN_BACKGROUND = False)
+class SpamTrainingJobTest(SpamModelTestCase):
+
+    def test_job_done(self):
+        job = spamJobs.get_job(spamJobs.start_training())
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['version'], spamFilter.list_versions()[-1])
+        self.assertEqual(spamFilter._live['version'], job['version'])
+
+    def test_job_trains_candidate(self):
+        live = spamFilter.train()
+        job = spamJobs.get_job(spamJobs.start_training())
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(spamFilter.candidate_version(), job['version'])
+        self.assertEqual(spamFilter.current_version(), live)
+        self.assertEqual(spamFilter.live_artifact()['version'], live)
+
+    def test_job_failed(self):
+        with override_settings(PROJECT_DIR = self.model_dir):
+            job = spamJobs.get_job(spamJobs.start_training())
+        self.assertEqual(job['status'], 'failed')
+        self.assertTrue(job['error'])
+        self.assertEqual(spamFilter.list_versions(), [])
+
+    def test_unknown_job(self):
+        self.assertIsNone(spamJobs.get_job('unknown'))
+
+    def test_old_jobs_pruned(self):
+        finished = time.time() - 8 * 24 * 3600
+        spamJobs.save_job({'id': 'old', 'status': 'done', 'finished': '2026-10-10T10:00:00'})
+        spamJobs.save_job({'id': 'running', 'status': 'running', 'started': '2026-10-10T10:00:00'})
+        for job_id in ('old', 'running'):
+            os.utime(spamJobs.job_path(job_id), (finished, finished))
+        recent = spamJobs.get_job(spamJobs.start_training())
+        self.assertIsNone(spamJobs.get_job('old'))
+        self.assertEqual(spamJobs.get_job('running')['status'], 'running')
+        self.assertEqual(spamJobs.get_job(recent['id']), recent)
+        spamJobs.start_training()
+        self.assertEqual(spamJobs.get_job(recent['id']), recent)
+
+@override_settings(SPAM_FILTER_ONLINE = True, SPAM_ONLINE_FEATURES = 2 ** 16)
+class OnlineSpamLearningTest(SpamModelTestCase):
+
+    spam_body = 'Cheap watches and replica bags, best prices guaranteed, order today'
+
+    def setUp(self):
+        """Train an online model in a temporary model directory"""
+        super(OnlineSpamLearningTest, self).setUp()
+        self.version = spamFilter.train()
+
+    def score(self, body):
+        artifact = spamFilter.live_artifact()
+        matrix = artifact['vectorizer'].transform([spamFilter.clean_string(body)])
+        return artifact['model'].decision_function(matrix)[0]
+
+    def test_trained_model_is_online(self):
+        self.assertTrue(spamFilter.live_artifact()['online'])
+
+    def test_learn_spam_raises_score(self):
+        before = self.score(self.spam_body)
+        spamFilter.learn(self.spam_body, True)
+        self.assertTrue(self.score(self.spam_body) > before)
+
+    def test_learn_writes_journal(self):
+        spamFilter.learn(self.spam_body, True)
+        spamFilter.learn(self.spam_body, False)
+        with open(spamFilter.journal_path(self.version)) as f:
+            self.assertEqual(len(f.readlines()), 2)
+
+    def test_journal_replayed_by_other_process(self):
+        spamFilter.learn(self.spam_body, True)
+        score = self.score(self.spam_body)
+        # A fresh process loads the artifact and replays the journal
+        spamFilter._live = None
+        self.assertAlmostEqual(self.score(self.spam_body), score)
+
+    def test_learn_ignored_when_offline(self):
+        with override_settings(SPAM_FILTER_ONLINE = False):
+            spamFilter.learn(self.spam_body, True)
+        self.assertFalse(os.path.isfile(spamFilter.journal_path(self.version)))
+
+    def test_full_training_starts_new_journal(self):
+        spamFilter.learn(self.spam_body, True)
+        version = spamFilter.train()
+        self.assertEqual(spamFilter._live.get('journal_offset', 0), 0)
+        self.assertFalse(os.path.isfile(spamFilter.journal_path(version)))
+
+class CleanStringTest(TestCase):
+
+    def test_tokens_replaced(self):
+        self.assertEqual(clean_string('Mail me at john@example.com now!'), 'mail me at emailaddr now exclammark')
+        self.assertEqual(clean_string('<a href="x">site</a> costs $5?'),
+                         'site cost dollar number questmark linktag')
+        self.assertEqual(clean_string('see http://example.com'), 'see httpaddr')
+
+    def test_words_stemmed(self):
+        self.assertEqual(clean_string('Plotting graphs'), 'plot graph')
+
+    def test_stem_cache(self):
+        normaliser = TextNormaliser(stem_cache_size = 10)
+        normaliser.clean('plotting plotting plotting')
+        self.assertEqual(normaliser.cache_info().misses, 1)
+        self.assertEqual(normaliser.cache_info().hits, 2)
+
+@override_settings(SPAM_CLEAN_CHUNK_SIZE = 7)
+class SpamCorpusTest(SpamModelTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create sample questions and answers"""
+        user = User.objects.create_user("johndoe", "johndoe@example.com", "johndoe")
+        category = FossCategory.objects.create(name="TestCategory", email="category@example.com")
+        for i in range(20):
+            question = Question.objects.create(user=user, category=category, title="TestQuestion{0}".format(i),
+                                               body="Question body {0}".format(i), is_spam=(i % 3 == 0))
+            Answer.objects.create(question=question, uid=user.id, body="Answer body {0}".format(i),
+                                  is_spam=(i % 4 == 0))
+
+    def test_labels_follow_posts(self):
+        xData, yData = spamFilter.store(workers = 1)
+        self.assertEqual(len(xData), len(yData))
+        self.assertEqual(xData[-40:-20], ['question bodi number'] * 20)
+        self.assertEqual(yData[-40:-20], [int(i % 3 == 0) for i in range(20)])
+        self.assertEqual(yData[-20:], [int(i % 4 == 0) for i in range(20)])
+
+    def test_workers_keep_order(self):
+        self.assertEqual(spamFilter.store(workers = 3), spamFilter.store(workers = 1))
+
+    def test_timings(self):
+        timings = {}
+        spamFilter.store(workers = 1, timings = timings)
+        self.assertEqual(sorted(timings.keys()), ['answers', 'excel', 'questions'])
+
+    def test_cache_matches_uncached(self):
+        with override_settings(SPAM_CORPUS_CACHE = False):
+            uncached = spamFilter.store(workers = 1)
+        spamFilter.store(workers = 1)
+        self.assertEqual(spamFilter.store(workers = 1), uncached)
+
+    def test_cache_follows_edits_and_deletes(self):
+        spamFilter.store(workers = 1)
+        question = Question.objects.get(title="TestQuestion1")
+        question.body = "Edited body"
+        question.is_spam = True
+        question.save()
+        Question.objects.get(title="TestQuestion2").delete()
+        xData, yData = spamFilter.store(workers = 1)
+        with override_settings(SPAM_CORPUS_CACHE = False):
+            self.assertEqual(spamFilter.store(workers = 1), (xData, yData))
+        cache = spamFilter.load_corpus_cache()
+        self.assertEqual(cache['questions'][question.id][1], 'edit bodi')
+        self.assertEqual(len(cache['questions']), 19)
+        self.assertEqual(len(cache['answers']), 19)
+
+    def test_only_changed_rows_cleaned(self):
+        cache = {}
+        rows = [(1, 'First body', 0), (2, 'Second body', 1)]
+        self.assertEqual(spamFilter.clean_rows(rows, None, [], [], cache), 2)
+        xData = []
+        rows = [(1, 'First body', 1), (3, 'Third body', 0)]
+        self.assertEqual(spamFilter.clean_rows(rows, None, xData, [], cache), 1)
+        self.assertEqual(xData, ['first bodi', 'third bodi'])
+        self.assertEqual(sorted(cache.keys()), [1, 3])
+
+class DataSetCacheTest(SpamModelTestCase):
+
+    def setUp(self):
+        """Use a copy of the dataset and a temporary model directory"""
+        super(DataSetCacheTest, self).setUp()
+        self.project_dir = tempfile.mkdtemp()
+        self.dataset = os.path.join(settings.PROJECT_DIR, 'DataSet.xlsx')
+        shutil.copy(self.dataset, self.project_dir)
+        self.project_override = override_settings(PROJECT_DIR = self.project_dir)
+        self.project_override.enable()
+        self.workbook = os.path.join(self.project_dir, 'DataSet.xlsx')
+
+    def tearDown(self):
+        self.project_override.disable()
+        shutil.rmtree(self.project_dir)
+
+    def test_rows_match_workbook(self):
+        rows = spamFilter.excel_rows()
+        workBook = openpyxl.load_workbook(self.workbook)
+        sheet = workBook['Data set']
+        labelled = [i for i in range(2, sheet.max_row + 1) if sheet.cell(row = i, column = 2).value is not None]
+        self.assertEqual([row[0] for row in rows], labelled)
+        for i, body, label in rows[:50]:
+            self.assertEqual(body, sheet.cell(row = i, column = 1).value)
+            self.assertEqual(label, int(str(sheet.cell(row = i, column = 2).value) == "1"))
+
+    def test_cached_rows_reused(self):
+        rows = spamFilter.excel_rows()
+        os.remove(self.workbook)
+        shutil.copy(self.dataset, self.project_dir)
+        os.utime(self.workbook, (0, 0))
+        self.assertEqual(spamFilter.excel_rows(), rows)
+
+    def test_changed_workbook_read_again(self):
+        spamFilter.excel_rows()
+        workBook = openpyxl.Workbook()
+        sheet = workBook.active
+        sheet.title = 'Data set'
+        sheet.append(['Body', 'Spam'])
+        sheet.append(['Buy cheap watches', 1])
+        sheet.append(['How do I plot in Scilab?', 0])
+        sheet.append(['Unlabelled post', None])
+        workBook.save(self.workbook)
+        self.assertEqual(spamFilter.excel_rows(), [(2, 'Buy cheap watches', 1), (3, 'How do I plot in Scilab?', 0)])
+
+class PredictCacheTest(SpamModelTestCase):
+
+    body = 'How do I plot a graph in Scilab?'
+
+    def setUp(self):
+        """Train into a temporary model directory and start with an empty verdict cache"""
+        super(PredictCacheTest, self).setUp()
+        spamFilter._verdicts = spamFilter.VerdictCache()
+        spamFilter.train()
+
+    def tearDown(self):
+        spamFilter._verdicts = spamFilter.VerdictCache()
+
+    def test_repeated_body_hits(self):
+        verdict = spamFilter.predict(self.body)
+        self.assertEqual(spamFilter.predict(self.body), verdict)
+        info = spamFilter.predict_cache_info()
+        self.assertEqual((info['hits'], info['misses']), (1, 1))
+
+    def test_same_cleaned_text_hits(self):
+        spamFilter.predict(self.body)
+        spamFilter.predict('<p>How do I plot a graph in  Scilab?</p>')
+        self.assertEqual(spamFilter.predict_cache_info()['hits'], 1)
+
+    def test_new_model_empties_cache(self):
+        spamFilter.predict(self.body)
+        spamFilter.train()
+        spamFilter.predict(self.body)
+        info = spamFilter.predict_cache_info()
+        self.assertEqual((info['hits'], info['misses'], info['size']), (0, 2, 2))
+
+    def test_cache_bounded(self):
+        with override_settings(SPAM_PREDICT_CACHE_SIZE = 3):
+            for i in range(5):
+                spamFilter.predict('Question number {0}'.format(i))
+        self.assertEqual(spamFilter.predict_cache_info()['size'], 3)
+
+    def test_cache_disabled(self):
+        with override_settings(SPAM_PREDICT_CACHE_SIZE = 0):
+            spamFilter.predict(self.body)
+            spamFilter.predict(self.body)
+        self.assertEqual(spamFilter.predict_cache_info()['hits'], 0)
+
+class SpamBenchmarkTest(SpamModelTestCase):
+
+    def test_synthetic_corpus_size(self):
+        rows = [('buy cheap watches now', 1), ('how do I plot a graph', 0)]
+        xData, yData = synthetic_corpus(rows, 10, random.Random(1))
+        self.assertEqual(len(xData), 10)
+        self.assertEqual(yData[:2], [1, 0])
+        for body, label in zip(xData, yData):
+            self.assertTrue(set(body.split()) <= set(rows[1 - label][0].split()))
+
+    def test_management_command(self):
+        output = os.path.join(self.model_dir, 'benchmark.json')
+        call_command('benchmark_spam_filter', '--sizes', '200', '1200', '--output', output, stdout = StringIO())
+        with open(output) as f:
+            report = json.load(f)
+        self.assertEqual([result['size'] for result in report['results']], [200, 1200])
+        for result in report['results']:
+            self.assertTrue(result['f_score'] > 0.8)
+            self.assertTrue(result['clean_docs_per_sec'] > 0)
+
+    def test_vectorizers(self):
+        output = os.path.join(self.model_dir, 'benchmark.json')
+        call_command('benchmark_spam_filter', '--sizes', '200', '--vectorizer', 'tfidf', 'hashing',
+                     '--output', output, stdout = StringIO())
+        with open(output) as f:
+            report = json.load(f)
+        self.assertEqual([result['vectorizer'] for result in report['results']], ['tfidf', 'hashing'])
+
+    def test_compare(self):
+        output = os.path.join(self.model_dir, 'benchmark.json')
+        call_command('benchmark_spam_filter', '--sizes', '200', '--output', output, stdout = StringIO())
+        out = StringIO()
+        call_command('benchmark_spam_filter', '--sizes', '200', '--output', output, '--compare', output, stdout = out)
+        self.assertIn('f_score: ', out.getvalue())
+
+class SpamScoreTest(SpamModelTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create sample data"""
+        user = User.objects.create_user("johndoe", "johndoe@example.com", "johndoe")
+        category = FossCategory.objects.create(name="TestCategory", email="category@example.com")
+        Question.objects.create(user=user, category=category, title="HeldQuestion", body="Held question body",
+                                is_spam=True, spam_review=True, spam_score=0)
+
+    def setUp(self):
+        """Train into a temporary model directory"""
+        super(SpamScoreTest, self).setUp()
+        spamFilter.train()
+
+    def test_score_matches_predict(self):
+        for body in ['How do I plot a graph in Scilab?', 'swiss replica watches buy', 'cheap loans, call now']:
+            self.assertEqual(spamFilter.predict(body), 'Spam' if spamFilter.score(body) > 0 else 'Not Spam')
+
+    def test_link_score(self):
+        body = 'Buy now at http://example.com'
+        with override_settings(SPAM_LINK_SCORE = -10):
+            margin = spamFilter.score(body)
+        spamFilter._verdicts.entries.clear()
+        self.assertEqual(spamFilter.score(body), max(margin, 1.0))
+
+    def test_triage(self):
+        with override_settings(SPAM_SCORE_REVIEW = -0.5, SPAM_SCORE_SPAM = 0.5):
+            self.assertEqual(spamFilter.triage(-0.6), 'publish')
+            self.assertEqual(spamFilter.triage(-0.5), 'review')
+            self.assertEqual(spamFilter.triage(0.4), 'review')
+            self.assertEqual(spamFilter.triage(0.5), 'spam')
+
+    def test_apply_score(self):
+        question = Question.objects.get(title='HeldQuestion')
+        self.assertEqual(spamFilter.apply_score(question, -1), 'publish')
+        self.assertEqual((question.spam_score, question.is_spam, question.spam_review), (-1, False, False))
+        spamFilter.apply_score(question, 0)
+        self.assertEqual((question.is_spam, question.spam_review), (True, True))
+
+    def test_score_batch_matches_score(self):
+        bodies = ['How do I plot a graph in Scilab?', 'Buy now at http://example.com', 'swiss replica watches buy']
+        self.assertEqual(spamFilter.score_batch(bodies), [spamFilter.score(body) for body in bodies])
+
+    def test_held_posts_not_trained_on(self):
+        xData, yData = spamFilter.store(workers = 1)
+        self.assertEqual(len(yData), len(spamFilter.excel_rows()))
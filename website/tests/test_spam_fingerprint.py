@@ -0,0 +1,134 @@
+import datetime
+from io import StringIO
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.core.management import call_command
+from django.contrib.auth.models import User, Group
+from website.models import FossCategory, ModeratorGroup, Question, Answer, PostFingerprint, FingerprintBand
+from website import spamFilter, spamFingerprint
+from website.tests.spamModel import SpamModelTestCase
+
+SPAM_BODY = ('Get the best replica watches at the lowest prices, free shipping on every order '
+             'and a discount of forty percent for new customers who order today')
+EDITED_SPAM_BODY = ('Get the best replica watches at the lowest prices, free shipping on all orders '
+                    'and a discount of forty percent for new customers who order today')
+QUESTION_BODY = ('How do I plot two graphs in the same window in Scilab, the second one keeps '
+                 'replacing the first one when I call plot2d again')
+
+class SpamFingerprintTest(SpamModelTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create sample data"""
+        user = User.objects.create_user("johndoe", "johndoe@example.com", "johndoe")
+        User.objects.create_user("johndoe2", "johndoe2@example.com", "johndoe2", first_name="John", last_name="Doe")
+        category = FossCategory.objects.create(name="TestCategory", email="category@example.com")
+        group = Group.objects.create(name="TestCategory_moderator")
+        ModeratorGroup.objects.create(group=group, category=category)
+        user.groups.add(group)
+        Question.objects.create(user=user, category=category, title="SpamQuestion", body=SPAM_BODY, is_spam=True)
+        Question.objects.create(user=user, category=category, title="PlotQuestion", body=QUESTION_BODY)
+
+    def setUp(self):
+        """Index the sample posts"""
+        super(SpamFingerprintTest, self).setUp()
+        spamFingerprint.backfill()
+
+    def test_short_body_not_indexed(self):
+        self.assertIsNone(spamFingerprint.signature('Test question body'))
+
+    @override_settings(SPAM_DUPLICATE_INDEX = False)
+    def test_index_disabled(self):
+        self.assertIsNone(spamFingerprint.signature(SPAM_BODY))
+
+    def test_similarity(self):
+        spam = spamFingerprint.signature(SPAM_BODY)
+        self.assertEqual(spamFingerprint.similarity(spam, spamFingerprint.signature('<p>' + SPAM_BODY + '</p>')), 1)
+        self.assertTrue(spamFingerprint.similarity(spam, spamFingerprint.signature(EDITED_SPAM_BODY)) >= 0.6)
+        self.assertTrue(spamFingerprint.similarity(spam, spamFingerprint.signature(QUESTION_BODY)) < 0.2)
+
+    def test_spam_duplicate(self):
+        self.assertTrue(spamFingerprint.is_spam_duplicate(spamFingerprint.signature(EDITED_SPAM_BODY)))
+        self.assertFalse(spamFingerprint.is_spam_duplicate(spamFingerprint.signature(QUESTION_BODY)))
+
+    def test_edited_post_not_own_duplicate(self):
+        question = Question.objects.get(title='SpamQuestion')
+        sig = spamFingerprint.signature(EDITED_SPAM_BODY)
+        self.assertFalse(spamFingerprint.is_spam_duplicate(sig, question))
+        other = Question.objects.create(user=question.user, category=question.category, title="SpamAgain",
+                                        body=SPAM_BODY, is_spam=True)
+        spamFingerprint.add(other)
+        self.assertTrue(spamFingerprint.is_spam_duplicate(sig, question))
+
+    def test_held_spam_not_known(self):
+        Question.objects.filter(title='SpamQuestion').update(spam_review = True)
+        self.assertFalse(spamFingerprint.is_spam_duplicate(spamFingerprint.signature(EDITED_SPAM_BODY)))
+
+    def test_new_question_spam_duplicate(self):
+        self.client.login(username='johndoe2', password='johndoe2')
+        category = FossCategory.objects.get(name='TestCategory')
+        self.client.post(reverse('website:new_question'),\
+                         {'category': category.id, 'body': EDITED_SPAM_BODY, 'title': 'Test question title', 'tutorial': None})
+        question = Question.objects.get(title='Test question title')
+        self.assertTrue(question.is_spam)
+        # Flagged by the index without asking the spam filter
+        self.assertIsNone(question.spam_score)
+        self.assertTrue(PostFingerprint.objects.filter(question = question).exists())
+
+    def test_possible_duplicate_question(self):
+        user = User.objects.get(username='johndoe')
+        question = Question.objects.create(user=user, category=FossCategory.objects.get(name='TestCategory'),
+                                           title="PlotAgain", body=QUESTION_BODY + ' too')
+        spamFingerprint.add(question)
+        self.client.login(username='johndoe', password='johndoe')
+        response = self.client.get(reverse('website:get_question', args=(question.id, )))
+        self.assertEqual(response.context['possible_duplicates'], [Question.objects.get(title='PlotQuestion')])
+        self.assertContains(response, 'Possible duplicate question')
+
+    def test_possible_duplicates_for_moderators_only(self):
+        question = Question.objects.get(title='PlotQuestion')
+        response = self.client.get(reverse('website:get_question', args=(question.id, )))
+        self.assertNotIn('possible_duplicates', response.context)
+        self.client.login(username='johndoe2', password='johndoe2')
+        response = self.client.get(reverse('website:get_question', args=(question.id, )))
+        self.assertNotIn('possible_duplicates', response.context)
+
+    def test_spam_duplicates_not_counted_in_limit(self):
+        user = User.objects.get(username='johndoe')
+        category = FossCategory.objects.get(name='TestCategory')
+        question = Question.objects.create(user=user, category=category, title="PlotAgain", body=QUESTION_BODY + ' too')
+        spam = Question.objects.create(user=user, category=category, title="PlotSpam", body=QUESTION_BODY + ' too',
+                                       is_spam=True)
+        spamFingerprint.add(question)
+        spamFingerprint.add(spam)
+        self.assertEqual(spamFingerprint.possible_duplicates(question, limit=1),
+                         [Question.objects.get(title='PlotQuestion')])
+
+    def test_answer_edit_updates_index(self):
+        question = Question.objects.get(title='PlotQuestion')
+        answer = Answer.objects.create(question=question, uid=question.user.id, body=QUESTION_BODY)
+        self.client.login(username='johndoe', password='johndoe')
+        self.client.post(reverse('website:ajax_answer_update'), {'answer_id': answer.id, 'answer_body': SPAM_BODY})
+        self.assertEqual(bytes(PostFingerprint.objects.get(answer=answer).signature),
+                         spamFingerprint.signature(SPAM_BODY).tobytes())
+
+    def test_edit_updates_index(self):
+        question = Question.objects.get(title='PlotQuestion')
+        question.body = SPAM_BODY.replace('watches', 'bags')
+        spamFingerprint.add(question)
+        self.assertEqual(PostFingerprint.objects.count(), 2)
+        self.assertEqual(FingerprintBand.objects.count(), 2 * spamFingerprint.BANDS)
+        self.assertTrue(spamFingerprint.is_spam_duplicate(spamFingerprint.signature(EDITED_SPAM_BODY)))
+
+    def test_deleted_post_leaves_index(self):
+        Question.objects.filter(title='SpamQuestion').delete()
+        self.assertFalse(spamFingerprint.is_spam_duplicate(spamFingerprint.signature(EDITED_SPAM_BODY)))
+        self.assertEqual(FingerprintBand.objects.count(), spamFingerprint.BANDS)
+
+    def test_management_command(self):
+        Question.objects.filter(title='SpamQuestion').update(date_created = timezone.now() - datetime.timedelta(days = 30))
+        out = StringIO()
+        call_command('index_post_fingerprints', '--days', '7', stdout = out)
+        self.assertIn('Indexed 1 posts', out.getvalue())
+        self.assertEqual(PostFingerprint.objects.get().question.title, 'PlotQuestion')
@@ -0,0 +1,85 @@
+from django.test import override_settings
+from django.urls import reverse
+from django.contrib.auth.models import User, Group
+from website.models import FossCategory, ModeratorGroup
+from website import spamFilter, spamMetrics
+from website.tests.spamModel import SpamModelTestCase
+
+class SpamMetricsTest(SpamModelTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create sample moderator"""
+        user = User.objects.create_user("johndoe", "johndoe@example.com", "johndoe")
+        User.objects.create_user("johndoe2", "johndoe2@example.com", "johndoe2")
+        category = FossCategory.objects.create(name="TestCategory", email="category@example.com")
+        group = Group.objects.create(name="TestCategory_moderator")
+        ModeratorGroup.objects.create(group=group, category=category)
+        user.groups.add(group)
+
+    def setUp(self):
+        """Train into a temporary model directory and start counting afresh"""
+        super(SpamMetricsTest, self).setUp()
+        self.version = spamFilter.train()
+        spamMetrics.reset()
+
+    def test_histogram_quantile(self):
+        histogram = spamMetrics.Histogram((0.001, 0.01, 0.1))
+        for value in (0.0005, 0.0005, 0.005, 0.05, 1):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [2, 1, 1, 1])
+        self.assertEqual(histogram.quantile(0.4), 0.001)
+        self.assertEqual(histogram.quantile(0.6), 0.01)
+        self.assertIsNone(histogram.quantile(1))
+        self.assertIsNone(spamMetrics.Histogram().quantile(0.5))
+
+    def test_score_recorded(self):
+        spamFilter.score('How do I plot a graph in Scilab?', 3)
+        spamFilter.score('How do I plot a graph in Scilab?', 3)
+        spamFilter.score_batch(['Buy now at http://example.com'])
+        histograms, counters = spamMetrics.snapshot()
+        self.assertEqual(histograms['score'].count, 3)
+        self.assertEqual(histograms['clean'].count, 2)
+        self.assertEqual(histograms['model'].count, 2)
+        labels = (('category', '3'), ('model', self.version), ('verdict', 'not_spam'))
+        self.assertEqual(counters[('verdicts', labels)], 2)
+        self.assertEqual(counters[('link_posts', ())], 1)
+
+    def test_summary(self):
+        spamFilter.score('How do I plot a graph in Scilab?')
+        summary = spamMetrics.summary()
+        self.assertEqual([stage['count'] for stage in summary['stages']], [1, 1, 1])
+        self.assertEqual(summary['verdicts'], [{'model': self.version, 'verdict': 'not spam', 'count': 1}])
+
+    def test_view_forbidden(self):
+        response = self.client.get(reverse('website:spam_metrics'))
+        self.assertEqual(response.status_code, 403)
+        self.client.login(username='johndoe2', password='johndoe2')
+        response = self.client.get(reverse('website:spam_metrics'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_view_allowed_address(self):
+        with override_settings(SPAM_METRICS_IPS = ['127.0.0.1']):
+            response = self.client.get(reverse('website:spam_metrics'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_view_text(self):
+        spamFilter.score('Buy now at http://example.com')
+        self.client.login(username='johndoe', password='johndoe')
+        response = self.client.get(reverse('website:spam_metrics'))
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        text = response.content.decode('utf-8')
+        self.assertIn('spam_stage_seconds_count{stage="score"} 1\n', text)
+        self.assertIn('spam_stage_seconds_bucket{stage="clean",le="+Inf"} 1\n', text)
+        self.assertIn('spam_verdicts_total{category="None",model="' + self.version + '",verdict="spam"} 1\n', text)
+        self.assertIn('spam_link_posts_total 1\n', text)
+        self.assertIn('spam_model_info{version="' + self.version + '"', text)
+        self.assertIn('spam_model_corpus_size {0}\n'.format(spamFilter.live_info()['corpus_size']), text)
+        self.assertIn('spam_model_training_seconds{stage="fit"}', text)
+
+    def test_dashboard_panel(self):
+        spamFilter.score('How do I plot a graph in Scilab?')
+        self.client.login(username='johndoe', password='johndoe')
+        response = self.client.get(reverse('website:moderator_spam_model'))
+        self.assertEqual(response.context['metrics']['stages'][2]['count'], 1)
+        self.assertContains(response, 'Spam filter in this server process')
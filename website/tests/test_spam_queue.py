@@ -0,0 +1,138 @@
+from unittest import mock
+from django.test import override_settings
+from django.urls import reverse
+from django.contrib.auth.models import User, Group
+from website.models import FossCategory, ModeratorGroup, Question, Answer, Notification
+from website import spamFilter, spamQueue
+from website.tests.spamModel import SpamModelTestCase
+
+@override_settings(SPAM_CLASSIFY_QUEUE = True, SPAM_QUEUE_CONSUMER = 'command')
+class SpamQueueTest(SpamModelTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create sample data"""
+        user = User.objects.create_user("johndoe", "johndoe@example.com", "johndoe")
+        User.objects.create_user("johndoe2", "johndoe2@example.com", "johndoe2", first_name="John", last_name="Doe")
+        category = FossCategory.objects.create(name="TestCategory", email="category@example.com")
+        Question.objects.create(user=user, category=category, title="TestQuestion", body="Test question body")
+        group = Group.objects.create(name="TestCategory_moderator")
+        ModeratorGroup.objects.create(group=group, category=category)
+        user.groups.add(group)
+
+    def setUp(self):
+        """Train into a temporary model directory"""
+        super(SpamQueueTest, self).setUp()
+        spamFilter.train()
+
+    def post_question(self, title, body):
+        self.client.login(username='johndoe2', password='johndoe2')
+        category = FossCategory.objects.get(name='TestCategory')
+        return self.client.post(reverse('website:new_question'),\
+                                {'category': category.id, 'body': body, 'title': title, 'tutorial': None})
+
+    def post_answer(self, body):
+        self.client.login(username='johndoe2', password='johndoe2')
+        question = Question.objects.get(title='TestQuestion')
+        return self.client.post(reverse('website:question_answer', args=(question.id, )),\
+                                {'body': body, 'question': question.id})
+
+    def test_new_question_pending(self):
+        response = self.post_question('Test question title', 'How do I plot a graph in Scilab?')
+        question = Question.objects.get(title='Test question title')
+        self.assertRedirects(response, reverse('website:get_question', args=(question.id, )))
+        self.assertTrue(question.spam_pending)
+        self.assertTrue(question.is_spam)
+
+    def test_pending_question_hidden(self):
+        self.post_question('Test question title', 'How do I plot a graph in Scilab?')
+        response = self.client.get(reverse('website:home'))
+        self.assertNotIn(Question.objects.get(title='Test question title'), response.context['questions'])
+
+    def test_question_published(self):
+        self.post_question('Test question title', 'How do I plot a graph in Scilab?')
+        self.assertEqual(spamQueue.process_queue(), 1)
+        question = Question.objects.get(title='Test question title')
+        self.assertFalse(question.spam_pending)
+        self.assertFalse(question.is_spam)
+
+    def test_spam_question_stays_hidden(self):
+        self.post_question('Test question title', 'Buy now at http://example.com')
+        spamQueue.process_queue()
+        question = Question.objects.get(title='Test question title')
+        self.assertFalse(question.spam_pending)
+        self.assertTrue(question.is_spam)
+
+    def test_answer_notification_on_publish(self):
+        self.post_answer('You can use the plot2d function for that.')
+        answer = Answer.objects.get(question__title='TestQuestion')
+        self.assertTrue(answer.spam_pending)
+        self.assertFalse(Notification.objects.exists())
+        spamQueue.process_queue()
+        answer.refresh_from_db()
+        self.assertFalse(answer.is_spam)
+        self.assertEqual(Notification.objects.get().aid, answer.id)
+
+    def test_moderator_decision_takes_answer_off_queue(self):
+        self.post_answer('You can use the plot2d function for that.')
+        answer = Answer.objects.get(question__title='TestQuestion')
+        self.client.login(username='johndoe', password='johndoe')
+        self.client.post(reverse('website:mark_answer_spam', args=(answer.id, )), {'selector': 'not spam'})
+        answer.refresh_from_db()
+        self.assertFalse(answer.spam_pending)
+        self.assertFalse(answer.is_spam)
+        self.assertEqual(Notification.objects.get().aid, answer.id)
+        self.assertEqual(spamQueue.process_batch(Answer, 10), 0)
+
+    def test_moderated_post_not_classified(self):
+        self.post_question('Test question title', 'Buy now at http://example.com')
+        Question.objects.filter(title='Test question title').update(is_spam = False, spam_moderated = True)
+        self.assertEqual(spamQueue.process_batch(Question, 10), 0)
+        question = Question.objects.get(title='Test question title')
+        self.assertFalse(question.is_spam)
+        self.assertTrue(question.spam_moderated)
+
+    def test_pending_posts_not_trained_on(self):
+        self.post_question('Test question title', 'How do I plot a graph in Scilab?')
+        xData, yData = spamFilter.store(workers = 1)
+        self.assertEqual(yData[-1], 0)
+        self.assertEqual(len(yData), len(spamFilter.excel_rows()) + 1)
+
+    def test_queue_stats(self):
+        self.post_question('Test question title', 'How do I plot a graph in Scilab?')
+        self.assertEqual(spamQueue.queue_stats()['pending_questions'], 1)
+        spamQueue.process_queue()
+        stats = spamQueue.queue_stats()
+        self.assertEqual(stats['pending_questions'], 0)
+        self.assertTrue(stats['latency_max'] >= 0)
+
+    def test_failing_post_held_for_review(self):
+        self.post_question('Test question title', 'How do I plot a graph in Scilab?')
+        self.post_question('Broken question title', 'This post cannot be scored')
+        score = spamFilter.score
+        def failing_score(body, category=None):
+            if body == 'This post cannot be scored':
+                raise ValueError(body)
+            return score(body, category)
+        with mock.patch.object(spamFilter, 'score_batch', side_effect=ValueError),\
+                mock.patch.object(spamFilter, 'score', side_effect=failing_score),\
+                mock.patch('traceback.print_exc'):
+            self.assertEqual(spamQueue.process_queue(), 2)
+        question = Question.objects.get(title='Test question title')
+        self.assertFalse(question.spam_pending)
+        self.assertFalse(question.is_spam)
+        broken = Question.objects.get(title='Broken question title')
+        self.assertFalse(broken.spam_pending)
+        self.assertTrue(broken.is_spam)
+        self.assertTrue(broken.spam_review)
+        self.assertEqual(spamQueue.queue_stats()['pending_questions'], 0)
+
+    def test_queue_in_metrics(self):
+        self.post_question('Test question title', 'How do I plot a graph in Scilab?')
+        with override_settings(SPAM_METRICS_IPS = ['127.0.0.1']):
+            response = self.client.get(reverse('website:spam_metrics'))
+        self.assertIn('spam_queue_pending{model="question"} 1\n', response.content.decode('utf-8'))
+
+    def test_batch_matches_predict(self):
+        bodies = ['How do I plot a graph in Scilab?', 'Buy now at http://example.com', 'swiss replica watches buy']
+        self.assertEqual(spamFilter.predict_batch(bodies), [spamFilter.predict(body) for body in bodies])
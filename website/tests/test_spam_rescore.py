@@ -0,0 +1,99 @@
+from io import StringIO
+from django.test import override_settings
+from django.urls import reverse
+from django.core.management import call_command
+from django.contrib.auth.models import User
+from website.models import FossCategory, Question, Answer, AnswerComment
+from website import spamFilter, spamRescore
+from website.tests.spamModel import SpamModelTestCase
+
+class SpamRescoreTest(SpamModelTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create sample data"""
+        user = User.objects.create_user("johndoe", "johndoe@example.com", "johndoe")
+        category = FossCategory.objects.create(name="TestCategory", email="category@example.com")
+        question = Question.objects.create(user=user, category=category, title="TestQuestion",
+                                           body="How do I plot a graph in Scilab?")
+        Question.objects.create(user=user, category=category, title="SpamQuestion",
+                                body="Buy now at http://example.com")
+        Question.objects.create(user=user, category=category, title="PendingQuestion",
+                                body="Buy now at http://example.com", is_spam=True, spam_pending=True)
+        answer = Answer.objects.create(uid=user.id, question=question, body="Visit http://example.com",
+                                       is_spam=False)
+        AnswerComment.objects.create(uid=user.id, answer=answer, body="<a href='#'>cheap</a>")
+        Question.objects.create(user=user, category=category, title="ModeratedQuestion",
+                                body="Buy now at http://example.com", spam_moderated=True)
+
+    def setUp(self):
+        """Train into a temporary model directory"""
+        super(SpamRescoreTest, self).setUp()
+        spamFilter.train()
+
+    def test_rescore_writes_verdicts(self):
+        report = spamRescore.rescore(chunk_size = 2)
+        self.assertFalse(report['dry_run'])
+        self.assertEqual(report['scored'], {'questions': 2, 'answers': 1})
+        self.assertTrue(Question.objects.get(title='SpamQuestion').is_spam)
+        self.assertFalse(Question.objects.get(title='TestQuestion').is_spam)
+        self.assertTrue(Answer.objects.get().is_spam)
+
+    def test_rescore_writes_scores(self):
+        spamRescore.rescore()
+        question = Question.objects.get(title='SpamQuestion')
+        self.assertTrue(question.spam_score >= 1.0)
+        self.assertFalse(question.spam_review)
+        self.assertTrue(Question.objects.get(title='TestQuestion').spam_score < 0)
+
+    def test_moderated_left_alone(self):
+        spamRescore.rescore()
+        question = Question.objects.get(title='ModeratedQuestion')
+        self.assertFalse(question.is_spam)
+        self.assertIsNone(question.spam_score)
+
+    @override_settings(SPAM_SCORE_REVIEW = -100, SPAM_SCORE_SPAM = 100)
+    def test_unsure_posts_to_review(self):
+        report = spamRescore.rescore()
+        self.assertEqual(report['to_review'], {'questions': 2, 'answers': 1})
+        self.assertEqual(sum(report['to_spam'].values()), 0)
+        question = Question.objects.get(title='TestQuestion')
+        self.assertTrue(question.is_spam)
+        self.assertTrue(question.spam_review)
+
+    def test_dry_run_reports_flips(self):
+        report = spamRescore.rescore(dry_run = True)
+        self.assertEqual(report['to_spam'], {'questions': 1, 'answers': 1})
+        self.assertEqual(report['categories']['TestCategory']['to_spam'], 2)
+        self.assertFalse(Question.objects.get(title='SpamQuestion').is_spam)
+
+    def test_rescore_twice_changes_nothing(self):
+        spamRescore.rescore()
+        report = spamRescore.rescore()
+        self.assertEqual(sum(report['to_spam'].values()) + sum(report['to_not_spam'].values()), 0)
+
+    def test_pending_left_to_queue(self):
+        spamRescore.rescore()
+        question = Question.objects.get(title='PendingQuestion')
+        self.assertTrue(question.spam_pending)
+
+    def test_only_kinds(self):
+        report = spamRescore.rescore(kinds = ['answers'])
+        self.assertEqual(report['scored'], {'answers': 1})
+        self.assertFalse(Question.objects.get(title='SpamQuestion').is_spam)
+
+    def test_comments_left_alone(self):
+        spamRescore.rescore()
+        self.assertFalse(AnswerComment.objects.get().is_spam)
+
+    def test_spam_comment_hidden(self):
+        AnswerComment.objects.update(is_spam = True)
+        question = Question.objects.get(title='TestQuestion')
+        response = self.client.get(reverse('website:get_question', args=(question.id, )))
+        self.assertNotContains(response, 'cheap')
+
+    def test_management_command(self):
+        out = StringIO()
+        call_command('rescore_spam', '--dry-run', '--workers', '1', stdout = out)
+        self.assertIn('would change', out.getvalue())
+        self.assertIn('TestCategory: 2 to spam', out.getvalue())
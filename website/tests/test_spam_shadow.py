@@ -0,0 +1,139 @@
+import os
+from django.test import override_settings
+from django.urls import reverse
+from django.contrib.auth.models import User
+from website.models import FossCategory, Question, SpamShadowScore
+from website import spamFilter, spamShadow
+from website.tests.spamModel import SpamModelTestCase
+
+@override_settings(SPAM_SHADOW_IN_BACKGROUND = False)
+class SpamShadowTest(SpamModelTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create sample data"""
+        User.objects.create_user("johndoe2", "johndoe2@example.com", "johndoe2", first_name="John", last_name="Doe")
+        FossCategory.objects.create(name="TestCategory", email="category@example.com")
+
+    def setUp(self):
+        """Train a live and a candidate model into a temporary model directory"""
+        super(SpamShadowTest, self).setUp()
+        self.live = spamFilter.train()
+        self.candidate = spamFilter.train(candidate = True)
+
+    def tearDown(self):
+        spamShadow._candidate = None
+
+    def test_candidate_not_live(self):
+        self.assertEqual(spamFilter.candidate_version(), self.candidate)
+        spamFilter._live = None
+        self.assertEqual(spamFilter.live_artifact()['version'], self.live)
+
+    def test_new_candidate_replaces_old(self):
+        candidate = spamFilter.train(candidate = True)
+        self.assertEqual(spamFilter.candidate_version(), candidate)
+        self.assertNotIn(self.candidate, spamFilter.list_versions())
+
+    def test_promote(self):
+        self.assertEqual(spamFilter.promote(), self.candidate)
+        self.assertIsNone(spamFilter.candidate_version())
+        self.assertEqual(spamFilter.live_artifact()['version'], self.candidate)
+        self.assertIsNone(spamFilter.promote())
+
+    def test_discard(self):
+        self.assertEqual(spamFilter.discard_candidate(), self.candidate)
+        self.assertEqual(spamFilter.list_versions(), [self.live])
+        self.assertFalse(os.path.exists(spamFilter.shared_path(self.candidate)))
+
+    def test_rollback(self):
+        spamFilter.promote()
+        self.assertEqual(spamFilter.rollback(), self.live)
+        self.assertEqual(spamFilter.list_versions(), [self.live])
+        self.assertEqual(spamFilter.live_artifact()['version'], self.live)
+        self.assertIsNone(spamFilter.rollback())
+
+    def test_rollback_seen_by_other_process(self):
+        spamFilter.promote()
+        promoted = spamFilter._live
+        promoted_published = spamFilter._published
+        spamFilter.rollback()
+        # As seen by a process still on the promoted model
+        spamFilter._live = promoted
+        spamFilter._published = promoted_published
+        self.assertEqual(spamFilter.live_artifact()['version'], self.live)
+
+    def test_promoted_over_newer_version(self):
+        newer = spamFilter.train()
+        self.assertEqual(spamFilter.promote(), self.candidate)
+        # As seen by a process starting afresh
+        spamFilter._live = None
+        spamFilter._published = None
+        self.assertEqual(spamFilter.live_artifact()['version'], self.candidate)
+        self.assertEqual(spamFilter.rollback(), self.live)
+        self.assertEqual(spamFilter.list_versions(), [self.live, newer])
+        spamFilter._live = None
+        self.assertEqual(spamFilter.live_artifact()['version'], self.live)
+
+    @override_settings(SPAM_MODEL_KEEP = 1)
+    def test_published_and_candidate_not_pruned(self):
+        spamFilter.promote()
+        candidate = spamFilter.train(candidate = True)
+        spamFilter.train(candidate = True)
+        self.assertNotIn(candidate, spamFilter.list_versions())
+        self.assertIn(self.candidate, spamFilter.list_versions())
+        self.assertEqual(spamFilter.live_artifact()['version'], self.candidate)
+
+    def test_shadow_scores_recorded(self):
+        spamShadow.submit('How do I plot a graph in Scilab?', None, -1.0)
+        spamShadow.submit('Buy now at http://example.com', None, -1.0)
+        scores = SpamShadowScore.objects.order_by('id')
+        self.assertEqual([(score.candidate, score.live) for score in scores], [(self.candidate, self.live)] * 2)
+        self.assertEqual([score.agree for score in scores], [True, False])
+        # Only disagreements keep the post
+        self.assertEqual([score.body for score in scores], ['', 'Buy now at http://example.com'])
+
+    @override_settings(SPAM_SHADOW_IN_BACKGROUND = True)
+    def test_no_candidate(self):
+        spamFilter.discard_candidate()
+        spamShadow.submit('How do I plot a graph in Scilab?', None, -1.0)
+        self.assertEqual(len(spamShadow._pending), 0)
+        self.assertFalse(SpamShadowScore.objects.exists())
+
+    def test_scores_removed_with_candidate(self):
+        spamShadow.submit('How do I plot a graph in Scilab?', None, -1.0)
+        spamFilter.discard_candidate()
+        self.assertFalse(SpamShadowScore.objects.exists())
+
+    def test_scores_removed_on_promote(self):
+        spamShadow.submit('How do I plot a graph in Scilab?', None, -1.0)
+        spamFilter.promote()
+        self.assertFalse(SpamShadowScore.objects.exists())
+
+    def test_scores_removed_with_replaced_candidate(self):
+        spamShadow.submit('How do I plot a graph in Scilab?', None, -1.0)
+        spamFilter.train(candidate = True)
+        self.assertFalse(SpamShadowScore.objects.exists())
+
+    @override_settings(SPAM_SHADOW_SCORING = False)
+    def test_disabled(self):
+        spamShadow.submit('How do I plot a graph in Scilab?', None, -1.0)
+        self.assertFalse(SpamShadowScore.objects.exists())
+
+    def test_new_question_scored_in_shadow(self):
+        self.client.login(username='johndoe2', password='johndoe2')
+        category = FossCategory.objects.get(name='TestCategory')
+        self.client.post(reverse('website:new_question'),\
+                         {'category': category.id, 'body': 'Test question body', 'title': 'Test question title', 'tutorial': None})
+        score = SpamShadowScore.objects.get()
+        self.assertEqual(score.live_score, Question.objects.get(title='Test question title').spam_score)
+
+    def test_report(self):
+        spamShadow.submit('How do I plot a graph in Scilab?', None, -1.0)
+        spamShadow.submit('Buy now at http://example.com', None, -1.0)
+        report = spamShadow.report()
+        self.assertEqual((report['candidate'], report['live']), (self.candidate, self.live))
+        self.assertEqual((report['compared'], report['agreement']), (2, 0.5))
+        self.assertEqual([score.body for score in report['disagreements']], ['Buy now at http://example.com'])
+        self.assertEqual(sorted(report['candidate_ms']), ['max', 'p50', 'p95', 'p99'])
+        spamFilter.discard_candidate()
+        self.assertIsNone(spamShadow.report())
@@ -0,0 +1,235 @@
+import os
+import json
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+from django.db import connection, OperationalError
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
+from django.urls import reverse
+from django.contrib.auth.models import User
+from website.models import Question, FossCategory, ViewerSketch
+from website.viewerSketch import HyperLogLog
+from website import viewCounter
+
+@override_settings(QUESTION_VIEWS_FLUSH_INTERVAL=3600, QUESTION_VIEWS_BUFFER_SIZE=10000)
+class ViewCounterTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create sample data"""
+        cls.user = User.objects.create_user("johndoe", "johndoe@example.com", "johndoe")
+        cls.viewer = User.objects.create_user("johndoe2", "johndoe2@example.com", "johndoe2")
+        category = FossCategory.objects.create(name="TestCategory", email="category@example.com")
+        cls.questions = [Question.objects.create(user=cls.user, category=category, title="TestQuestion {0}".format(i))
+                         for i in range(4)]
+
+    def setUp(self):
+        viewCounter.reset()
+
+    def views(self, question):
+        return Question.objects.get(id=question.id).views
+
+    def test_views_written_when_flushed(self):
+        question = self.questions[0]
+        for i in range(3):
+            viewCounter.record(question.id)
+        self.assertEqual(self.views(question), 1)
+        self.assertEqual(viewCounter.flush(), 3)
+        self.assertEqual(self.views(question), 4)
+        self.assertEqual(viewCounter.flush(), 0)
+
+    def test_viewers_counted_once(self):
+        question = self.questions[0]
+        question.userViews.add(self.user)
+        viewCounter.record(question.id, self.user.id)
+        viewCounter.record(question.id, self.viewer.id)
+        viewCounter.record(question.id, self.viewer.id)
+        self.assertEqual(viewCounter.flush(), 1)
+        self.assertEqual(self.views(question), 2)
+        self.assertEqual(set(question.userViews.all()), {self.user, self.viewer})
+
+        viewCounter.record(question.id, self.viewer.id)
+        self.assertEqual(viewCounter.flush(), 0)
+        self.assertEqual(self.views(question), 2)
+
+    def test_equal_increments_written_together(self):
+        for question in self.questions:
+            viewCounter.record(question.id)
+        with CaptureQueriesContext(connection) as queries:
+            viewCounter.flush()
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([self.views(question) for question in self.questions], [2, 2, 2, 2])
+
+    def test_deleted_question(self):
+        question = Question.objects.create(user=self.user, category=self.questions[0].category)
+        viewCounter.record(question.id)
+        viewCounter.record(question.id, self.viewer.id)
+        question.delete()
+        self.assertEqual(viewCounter.flush(), 1)
+        self.assertFalse(Question.userViews.through.objects.filter(question_id=question.id).exists())
+
+    @override_settings(QUESTION_VIEWS_FLUSH_INTERVAL=0)
+    def test_written_at_once(self):
+        viewCounter.record(self.questions[0].id)
+        self.assertEqual(self.views(self.questions[0]), 2)
+
+    @override_settings(QUESTION_VIEWS_BUFFER_SIZE=2)
+    def test_written_when_buffer_full(self):
+        viewCounter.record(self.questions[0].id)
+        self.assertEqual(self.views(self.questions[0]), 1)
+        viewCounter.record(self.questions[1].id)
+        self.assertEqual(self.views(self.questions[0]), 2)
+        self.assertEqual(self.views(self.questions[1]), 2)
+
+    def test_get_question_does_not_save_question(self):
+        question = self.questions[0]
+        modified = Question.objects.get(id=question.id).date_modified
+        self.client.login(username="johndoe2", password="johndoe2")
+        response = self.client.get(reverse('website:get_question', args=(question.id,)))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Question.objects.get(id=question.id).date_modified, modified)
+        viewCounter.flush()
+        self.assertEqual(self.views(question), 2)
+        self.assertTrue(question.userViews.filter(id=self.viewer.id).exists())
+
+    def test_kept_when_database_fails(self):
+        question = self.questions[0]
+        viewCounter.record(question.id)
+        viewCounter.record(question.id, self.viewer.id)
+        with mock.patch('website.viewCounter.new_viewers', side_effect=OperationalError),\
+                mock.patch('traceback.print_exc'):
+            self.assertEqual(viewCounter.flush(), 0)
+        self.assertEqual(self.views(question), 1)
+        self.assertEqual(viewCounter.flush(), 2)
+        self.assertEqual(self.views(question), 3)
+
+    @override_settings(QUESTION_VIEWS_FLUSH_INTERVAL=0)
+    def test_get_question_when_database_fails(self):
+        question = self.questions[0]
+        with mock.patch('website.viewCounter.new_viewers', side_effect=OperationalError),\
+                mock.patch('traceback.print_exc'):
+            response = self.client.get(reverse('website:get_question', args=(question.id,)))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(viewCounter.flush(), 1)
+
+class HyperLogLogTest(TestCase):
+
+    def test_empty(self):
+        self.assertEqual(HyperLogLog().estimate(), 0)
+
+    def test_small_counts_exact(self):
+        sketch = HyperLogLog()
+        for i in range(10):
+            sketch.add(i)
+            sketch.add(i)
+        self.assertEqual(round(sketch.estimate()), 10)
+
+    def test_large_count_estimate(self):
+        sketch = HyperLogLog()
+        for i in range(20000):
+            sketch.add(i)
+        self.assertAlmostEqual(sketch.estimate() / 20000, 1, delta=0.1)
+
+    def test_bytes(self):
+        sketch = HyperLogLog(precision=8)
+        for i in range(100):
+            sketch.add(i)
+        copy = HyperLogLog.from_bytes(sketch.to_bytes())
+        self.assertEqual(copy.precision, 8)
+        self.assertEqual(copy.registers, sketch.registers)
+
+    def test_merge(self):
+        first = HyperLogLog()
+        second = HyperLogLog()
+        both = HyperLogLog()
+        for i in range(30):
+            first.add(i)
+            second.add(i + 20)
+        for i in range(50):
+            both.add(i)
+        first.merge(second)
+        self.assertEqual(first.registers, both.registers)
+        with self.assertRaises(ValueError):
+            first.merge(HyperLogLog(precision=8))
+
+@override_settings(QUESTION_VIEWERS='sketch', QUESTION_VIEWS_FLUSH_INTERVAL=3600, QUESTION_VIEWS_BUFFER_SIZE=10000)
+class ViewerSketchTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create sample data"""
+        cls.users = [User.objects.create_user("johndoe{0}".format(i), "johndoe@example.com", "johndoe")
+                     for i in range(3)]
+        category = FossCategory.objects.create(name="TestCategory", email="category@example.com")
+        cls.question = Question.objects.create(user=cls.users[0], category=category, title="TestQuestion")
+
+    def setUp(self):
+        viewCounter.reset()
+
+    def views(self):
+        return Question.objects.get(id=self.question.id).views
+
+    def test_viewers_counted_once(self):
+        for user in self.users + self.users:
+            viewCounter.record(self.question.id, user.id)
+        viewCounter.record(self.question.id)
+        self.assertEqual(viewCounter.flush(), 4)
+        self.assertEqual(self.views(), 5)
+        self.assertFalse(self.question.userViews.exists())
+
+        viewCounter.record(self.question.id, self.users[1].id)
+        self.assertEqual(viewCounter.flush(), 0)
+        self.assertEqual(self.views(), 5)
+        sketch = HyperLogLog.from_bytes(ViewerSketch.objects.get(question=self.question).registers)
+        self.assertEqual(round(sketch.estimate()), 3)
+
+    def test_add_viewer(self):
+        viewCounter.add_viewer(self.question, self.users[0])
+        self.assertEqual(self.views(), 1)
+        viewCounter.record(self.question.id, self.users[0].id)
+        viewCounter.record(self.question.id, self.users[1].id)
+        self.assertEqual(viewCounter.flush(), 1)
+
+    def test_build_viewer_sketches(self):
+        self.question.userViews.add(self.users[0], self.users[1])
+        call_command('build_viewer_sketches', '--delete-rows', stdout=StringIO())
+        self.assertFalse(self.question.userViews.exists())
+        sketch = HyperLogLog.from_bytes(ViewerSketch.objects.get(question=self.question).registers)
+        self.assertEqual(round(sketch.estimate()), 2)
+
+        for user in self.users:
+            viewCounter.record(self.question.id, user.id)
+        self.assertEqual(viewCounter.flush(), 1)
+
+    def test_build_viewer_sketches_again(self):
+        self.question.userViews.add(self.users[0])
+        call_command('build_viewer_sketches', '--delete-rows', stdout=StringIO())
+        self.question.userViews.add(self.users[1])
+        call_command('build_viewer_sketches', '--delete-rows', stdout=StringIO())
+        self.assertFalse(self.question.userViews.exists())
+        sketch = HyperLogLog.from_bytes(ViewerSketch.objects.get(question=self.question).registers)
+        self.assertEqual(round(sketch.estimate()), 2)
+
+class ViewsBenchmarkTest(TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+        viewCounter.reset()
+
+    def test_management_command(self):
+        output = os.path.join(self.output_dir, 'benchmark.json')
+        call_command('benchmark_question_views', '--questions', '5', '--users', '20', '--views', '200',
+                     '--flush-every', '50', '--output', output, stdout=StringIO())
+        with open(output) as f:
+            report = json.load(f)
+        self.assertEqual([result['mode'] for result in report['results']], ['unbuffered', 'table', 'sketch'])
+        for result in report['results']:
+            self.assertTrue(result['bytes'] >= 0)
+            self.assertIn(result['bytes_source'], ('measured', 'rows x average row size', 'estimated'))
+        self.assertFalse(Question.objects.exists())
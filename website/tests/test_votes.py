@@ -0,0 +1,48 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User, AnonymousUser
+from website.models import Question, Answer, FossCategory
+from website.votes import vote_state
+
+class VoteStateTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create sample data"""
+        cls.user = User.objects.create_user("johndoe", "johndoe@example.com", "johndoe")
+        cls.voter = User.objects.create_user("johndoe2", "johndoe2@example.com", "johndoe2")
+        category = FossCategory.objects.create(name="TestCategory", email="category@example.com")
+        cls.question = Question.objects.create(user=cls.user, category=category, title="TestQuestion")
+        cls.answers = [Answer.objects.create(question=cls.question, uid=cls.user.id, body="TestAnswer")
+                       for i in range(3)]
+        cls.answers[0].userUpVotes.add(cls.voter)
+        cls.answers[1].userDownVotes.add(cls.voter)
+        cls.answers[2].userUpVotes.add(cls.user)
+        cls.question.userDownVotes.add(cls.voter)
+
+    def test_answers(self):
+        state = vote_state(self.voter, self.answers)
+        self.assertEqual(state, {
+            self.answers[0].id: (1, 0),
+            self.answers[1].id: (0, 1),
+            self.answers[2].id: (0, 0),
+        })
+
+    def test_questions(self):
+        self.assertEqual(vote_state(self.voter, [self.question]), {self.question.id: (0, 1)})
+        self.assertEqual(vote_state(self.user, [self.question]), {self.question.id: (0, 0)})
+
+    def test_queries_do_not_grow_with_posts(self):
+        with CaptureQueriesContext(connection) as queries:
+            vote_state(self.voter, Answer.objects.all())
+        self.assertEqual(len(queries), 3)
+
+    def test_anonymous_user(self):
+        with CaptureQueriesContext(connection) as queries:
+            state = vote_state(AnonymousUser(), self.answers)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(set(state.values()), {(0, 0)})
+
+    def test_no_posts(self):
+        self.assertEqual(vote_state(self.voter, []), {})
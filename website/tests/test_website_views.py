@@ -1,9 +1,11 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth.models import User, Group
 from django.conf import settings
 from website.models import *
 from website.forms import *
+from website import spamFilter
+from website.tests.spamModel import SpamModelTestCase
 
 class HomeViewTest(TestCase):
 
@@ -70,6 +72,8 @@ class QuestionsViewTest(TestCase):
         self.assertQuerysetEqual(response.context['questions'],
                                     ['<Question: {0} - TestCategory -  - TestQuestion - johndoe>'.format(question_id)])
 
+# Views are written at once, none are left buffered after the test database is gone
+@override_settings(QUESTION_VIEWS_FLUSH_INTERVAL=0)
 class GetQuestionViewTest(TestCase):
 
     @classmethod
@@ -165,7 +169,7 @@ class GetQuestionViewTest(TestCase):
         self.assertTrue('net_count' in response.context)
         self.assertEqual(response.context['net_count'], 1)
 
-class QuestionAnswerViewTest(TestCase):
+class QuestionAnswerViewTest(SpamModelTestCase):
 
     @classmethod
     def setUpTestData(cls):
@@ -385,7 +389,7 @@ class FilterViewTest(TestCase):
                                     ['<Question: {0} - TestCategory2 -  - TestQuestion4 - johndoe>'.format(question2_id),\
                                     '<Question: {0} - TestCategory2 -  - TestQuestion3 - johndoe>'.format(question_id)])
 
-class NewQuestionViewTest(TestCase):
+class NewQuestionViewTest(SpamModelTestCase):
 
     @classmethod
     def setUpTestData(cls):
@@ -503,6 +507,7 @@ class NewQuestionViewTest(TestCase):
         self.assertFormError(response, 'form', 'body', 'Body should be minimum 12 characters long')
 
     def test_view_post_spam_question(self):
+        spamFilter.train()
         self.client.login(username='johndoe2', password='johndoe2')
         category = FossCategory.objects.get(name='TestCategory')
         response = self.client.post(reverse('website:new_question'),\
@@ -539,7 +544,7 @@ class NewQuestionViewTest(TestCase):
         self.assertTrue('form' in response.context)
         self.assertIsInstance(response.context['form'], NewQuestionForm)
 
-class EditQuestionViewTest(TestCase):
+class EditQuestionViewTest(SpamModelTestCase):
 
     @classmethod
     def setUpTestData(cls):
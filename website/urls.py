@@ -29,7 +29,12 @@ urlpatterns = [
     path('moderator/', views.moderator_home, name = 'moderator_home'),
     path('moderator/questions/', views.moderator_questions, name = 'moderator_questions'),
     path('moderator/unanswered/', views.moderator_unanswered, name = 'moderator_unanswered'),
+    path('moderator/review/', views.moderator_review, name = 'moderator_review'),
+    path('moderator/review/<str:post_type>/<int:post_id>/', views.moderator_review_post, name = 'moderator_review_post'),
+    path('moderator/spam_model/', views.moderator_spam_model, name = 'moderator_spam_model'),
+    path('moderator/spam_metrics/', views.spam_metrics, name = 'spam_metrics'),
     path('moderator/train_spam_filter/', views.train_spam_filter, name = 'train_spam_filter'),
+    path('moderator/train_spam_filter/<str:job_id>/', views.train_spam_filter_status, name = 'train_spam_filter_status'),
 
     # Ajax helpers
     path('ajax-tutorials/', views.ajax_tutorials, name = 'ajax_tutorials'),
@@ -0,0 +1,191 @@
+import time
+import threading
+import traceback
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import F
+from django.contrib.auth import get_user_model
+from website.models import Question, ViewerSketch
+from website.viewerSketch import HyperLogLog
+
+# Buffered counting of question views. A view only adds to counts kept in
+# memory by the server process, which are written together once they are due:
+# one UPDATE of the views column for all the questions getting the same
+# increment, instead of saving the whole question on every view. Logged in
+# users count once per question, the viewers seen are checked all at once when
+# writing instead of on every view, against userViews or against a sketch of
+# the viewers of every question depending on QUESTION_VIEWERS. Server processes
+# write what is left when they exit, see forums/wsgi.py.
+
+_lock = threading.Lock()
+
+# Anonymous views per question id
+_views = Counter()
+
+# (question id, user id) of the logged in views
+_viewers = set()
+
+_last_flush = time.time()
+
+# Count a view of a question, user_id is None for an anonymous visitor
+def record(question_id, user_id = None):
+
+    with _lock:
+        if user_id is None:
+            _views[question_id] += 1
+        else:
+            _viewers.add((question_id, user_id))
+        due = (time.time() - _last_flush >= settings.QUESTION_VIEWS_FLUSH_INTERVAL
+               or len(_views) + len(_viewers) >= settings.QUESTION_VIEWS_BUFFER_SIZE)
+
+    if due:
+        flush()
+
+# Write the views counted so far. Returns the number of views added. If the
+# database fails they are kept for the next time instead.
+def flush():
+
+    global _views, _viewers, _last_flush
+    with _lock:
+        views, viewers = _views, _viewers
+        _views, _viewers = Counter(), set()
+        _last_flush = time.time()
+    if not views and not viewers:
+        return 0
+
+    try:
+        write(views, viewers)
+    except DatabaseError:
+        traceback.print_exc()
+        # The viewers already recorded are not counted again, their views are in views
+        with _lock:
+            _views.update(views)
+            _viewers.update(viewers)
+        return 0
+
+    return sum(views.values())
+
+# Record the new viewers and add all the views to their questions
+def write(views, viewers):
+
+    if settings.QUESTION_VIEWERS == 'sketch':
+        views.update(new_sketch_viewers(viewers))
+    else:
+        views.update(new_viewers(viewers))
+
+    # Questions getting the same increment are updated by the same query
+    increments = defaultdict(list)
+    for question_id, count in views.items():
+        increments[count].append(question_id)
+    if len(increments) > 1:
+        # All or none, so that views kept after a failure are not written twice
+        with transaction.atomic():
+            update_views(increments)
+    else:
+        update_views(increments)
+
+def update_views(increments):
+    for count, question_ids in increments.items():
+        Question.objects.filter(id__in = question_ids).update(views = F('views') + count)
+
+# Record the viewers not in userViews yet. Returns their number per question id.
+def new_viewers(viewers):
+
+    if not viewers:
+        return Counter()
+
+    question_ids = set(question_id for question_id, user_id in viewers)
+    user_ids = set(user_id for question_id, user_id in viewers)
+    through = Question.userViews.through
+    seen = set(through.objects.filter(question_id__in = question_ids, user_id__in = user_ids)
+               .values_list('question_id', 'user_id'))
+    new = viewers - seen
+    if not new:
+        return Counter()
+
+    # Questions or users deleted since the view are left out
+    question_ids = set(Question.objects.filter(id__in = set(question_id for question_id, user_id in new))
+                       .values_list('id', flat = True))
+    user_ids = set(get_user_model().objects.filter(id__in = set(user_id for question_id, user_id in new))
+                   .values_list('id', flat = True))
+    new = [(question_id, user_id) for question_id, user_id in new
+           if question_id in question_ids and user_id in user_ids]
+
+    try:
+        with transaction.atomic():
+            through.objects.bulk_create([through(question_id = question_id, user_id = user_id)
+                                         for question_id, user_id in new])
+    except IntegrityError:
+        # Recorded by another process in the meantime: add them one by one,
+        # keeping the ones that are new
+        added = []
+        for question_id, user_id in new:
+            try:
+                with transaction.atomic():
+                    through.objects.create(question_id = question_id, user_id = user_id)
+                added.append((question_id, user_id))
+            except IntegrityError:
+                pass
+        new = added
+
+    return Counter(question_id for question_id, user_id in new)
+
+# Add the viewers to the sketches of their questions. Returns the growth of the
+# estimated number of viewers per question id.
+def new_sketch_viewers(viewers):
+
+    users = defaultdict(set)
+    for question_id, user_id in viewers:
+        users[question_id].add(user_id)
+    # Questions deleted since the view are left out
+    question_ids = list(Question.objects.filter(id__in = list(users)).values_list('id', flat = True))
+
+    try:
+        return add_to_sketches(users, question_ids)
+    except IntegrityError:
+        # Another process created one of the sketches in the meantime
+        return add_to_sketches(users, question_ids)
+
+def add_to_sketches(users, question_ids):
+
+    added = Counter()
+    with transaction.atomic():
+        stored = dict(ViewerSketch.objects.select_for_update().filter(question_id__in = question_ids)
+                      .values_list('question_id', 'registers'))
+        created = []
+        for question_id in question_ids:
+            if question_id in stored:
+                sketch = HyperLogLog.from_bytes(stored[question_id])
+            else:
+                sketch = HyperLogLog(settings.QUESTION_VIEWERS_PRECISION)
+            before = round(sketch.estimate())
+            changed = False
+            for user_id in users[question_id]:
+                changed = sketch.add(user_id) or changed
+            if not changed:
+                continue
+
+            growth = round(sketch.estimate()) - before
+            if growth > 0:
+                added[question_id] = growth
+            if question_id in stored:
+                ViewerSketch.objects.filter(question_id = question_id).update(registers = sketch.to_bytes())
+            else:
+                created.append(ViewerSketch(question_id = question_id, registers = sketch.to_bytes()))
+        ViewerSketch.objects.bulk_create(created)
+    return added
+
+# Remember a viewer of a question without counting a view, for the author of a new question
+def add_viewer(question, user):
+    if settings.QUESTION_VIEWERS == 'sketch':
+        new_sketch_viewers({(question.id, user.id)})
+    else:
+        question.userViews.add(user)
+
+# Forget the views counted so far without writing them
+def reset():
+
+    global _views, _viewers
+    with _lock:
+        _views, _viewers = Counter(), set()
@@ -0,0 +1,54 @@
+import math
+import zlib
+import hashlib
+
+# HyperLogLog sketch of the users who viewed a question, an estimate of their
+# number in a fixed amount of memory instead of a userViews row per viewer.
+# With the default precision of 10 the sketch has 1024 one byte registers and
+# the estimate is exact for the first few viewers and within about 3% of the
+# real count beyond. Sketches are stored compressed: under 500 bytes however
+# many viewers a question has, and a few dozen for the many with few viewers.
+
+class HyperLogLog(object):
+
+    def __init__(self, precision = 10, registers = None):
+        self.precision = precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(2 ** precision)
+
+    # Sketch stored by to_bytes
+    @classmethod
+    def from_bytes(cls, data):
+        registers = zlib.decompress(data)
+        return cls(int(math.log(len(registers), 2)), registers)
+
+    def to_bytes(self):
+        return zlib.compress(bytes(self.registers), 9)
+
+    # Add a value, its string form is hashed. Returns whether the sketch changed.
+    def add(self, value):
+        hashed = int.from_bytes(hashlib.sha1(str(value).encode('utf-8')).digest()[:8], 'big')
+        bits = 64 - self.precision
+        index = hashed >> bits
+        # Position of the first set bit of the rest of the hash
+        rank = bits - (hashed & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    # Add the values of another sketch of the same precision
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError('Cannot merge sketches of precision {0} and {1}'.format(self.precision, other.precision))
+        self.registers = bytearray(max(pair) for pair in zip(self.registers, other.registers))
+
+    # Estimated number of distinct values added
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small counts
+            estimate = m * math.log(m / zeros)
+        return estimate
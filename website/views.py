@@ -1,8 +1,9 @@
 from builtins import zip
 from builtins import str
 from django import forms
-from django.http import HttpResponse, HttpResponseRedirect, Http404
+from django.http import HttpResponse, HttpResponseRedirect, HttpResponseForbidden, Http404, JsonResponse
 from django.shortcuts import render, get_object_or_404
+from django.urls import reverse
 from django.template.context_processors import csrf
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required, user_passes_test
@@ -10,12 +11,16 @@ from django.contrib.auth import get_user_model
 from django.conf import settings
 from django.contrib import messages
 from django.utils.html import strip_tags
+from django.db.models import Count, Prefetch
 from website.models import *
 from website.forms import NewQuestionForm, AnswerQuestionForm, AnswerCommentForm
 from website.templatetags.helpers import prettify
+from website.votes import vote_state
 from django.core.mail import send_mail
 from django.core.mail import EmailMultiAlternatives
-from .spamFilter import predict, train
+from .spam import spamFilter, spamJobs, spamQueue, spamFingerprint, spamShadow
+from . import spamMetrics
+from . import viewCounter
 
 User = get_user_model()
 admins = (
@@ -23,6 +28,15 @@ admins = (
 )
 categories = FossCategory.objects.order_by('name')
 
+# Questions with the category, author and answer count shown by the question
+# lists, fetched in the same query instead of one query per question
+def listed(questions):
+    return questions.select_related('category', 'user').annotate(answer_count = Count('answer'))
+
+# Categories with their number of questions, used by the latest_question tag
+def counted(categories):
+    return categories.annotate(question_count = Count('question'))
+
 # Function to check if user is in any moderator group
 def is_moderator(user):
     return user.groups.count() > 0
@@ -36,9 +50,9 @@ def home(request):
 
     settings.MODERATOR_ACTIVATED = False
 
-    questions = Question.objects.all().order_by('-date_created').filter(is_spam = False)
+    questions = listed(Question.objects.all().order_by('-date_created').filter(is_spam = False))
     context = {
-        'categories': categories,
+        'categories': counted(categories),
         'questions': questions,
     }
 
@@ -46,7 +60,7 @@ def home(request):
 
 # to get all questions posted till now and pagination, 20 questions at a time
 def questions(request):
-    questions = Question.objects.all().filter(is_spam = False).order_by('-date_created')
+    questions = listed(Question.objects.all().filter(is_spam = False).order_by('-date_created'))
     context = {
         'questions': questions,
     }
@@ -65,15 +79,20 @@ def get_question(request, question_id = None, pretty_url = None):
         answers = question.answer_set.all()
     else:
         answers = question.answer_set.filter(is_spam = False).all()
+    # The authors of the answers and the comments of all the answers with their
+    # authors, a query each whatever the size of the thread
+    comments = AnswerComment.objects.filter(is_spam = False).order_by('date_created').prefetch_related('author')
+    answers = answers.prefetch_related('author', Prefetch('answercomment_set', queryset = comments))
     ans_count = len(answers)
     form = AnswerQuestionForm()
-    thisuserupvote = question.userUpVotes.filter(id = request.user.id).count()
-    thisuserdownvote = question.userDownVotes.filter(id = request.user.id).count()
+    thisuserupvote, thisuserdownvote = vote_state(request.user, [question])[question.id]
 
+    # The user's votes on all the answers, fetched at once
+    answer_votes = vote_state(request.user, answers)
     ans_votes = []
-    for vote in answers:
-        net_ans_count  = vote.num_votes
-        ans_votes.append([vote.userUpVotes.filter(id = request.user.id).count(), vote.userDownVotes.filter(id = request.user.id).count(), net_ans_count])
+    for answer in answers:
+        upvote, downvote = answer_votes[answer.id]
+        ans_votes.append([upvote, downvote, answer.num_votes])
 
     main_list = list(zip(answers, ans_votes))
     context = {
@@ -86,16 +105,13 @@ def get_question(request, question_id = None, pretty_url = None):
         'thisUserDownvote': thisuserdownvote,
         'net_count': question.num_votes,
     }
+    # Looked up in the fingerprint index for the moderators only
+    if (is_moderator(request.user)):
+        context['possible_duplicates'] = spamFingerprint.possible_duplicates(question)
     context.update(csrf(request))
 
-    # updating views count
-    if (request.user.is_anonymous):  # if no one logged in
-        question.views += 1
-    elif (question.userViews.filter(id = request.user.id).count() == 0):
-        question.views += 1
-        question.userViews.add(request.user)
-
-    question.save()
+    # updating views count, written with the other views counted by this process
+    viewCounter.record(question.id, None if request.user.is_anonymous else request.user.id)
 
     context['SITE_KEY'] = settings.GOOGLE_RECAPTCHA_SITE_KEY
     return render(request, 'website/templates/get-question.html', context)
@@ -123,9 +139,19 @@ def question_answer(request, question_id):
             answer.body = body
             if ('image' in request.FILES):
                 answer.image = request.FILES['image']
-            if (predict(answer.body) == "Spam"):
+            fingerprint = spamFingerprint.signature(answer.body)
+            if (spamFingerprint.is_spam_duplicate(fingerprint)):
+                # A near-duplicate of known spam, no need to ask the spam filter
                 answer.is_spam = True
+            elif (settings.SPAM_CLASSIFY_QUEUE):
+                spamQueue.hold(answer)
+            else:
+                spamFilter.apply_score(answer, spamFilter.score(answer.body, question.category_id))
+                spamShadow.submit(answer.body, question.category_id, answer.spam_score)
             answer.save()
+            spamFingerprint.add(answer, fingerprint)
+            if (answer.spam_pending):
+                spamQueue.notify()
 
             # if user_id of question does not match to user_id of answer, send notification
             if ((question.user.id != request.user.id) and (answer.is_spam == False)):
@@ -250,7 +276,7 @@ def answer_comment(request):
             email.send(fail_silently = True)
 
             # notifying other users in the comment thread
-            uids = answer.answercomment_set.filter(answer = answer).values_list('uid', flat = True)
+            uids = answer.answercomment_set.filter(answer = answer).values_list('author', flat = True)
             answer_comments = answer.answercomment_set.filter(answer = answer)
 
             comment_creator_emails = []
@@ -325,7 +351,7 @@ def filter(request, category = None, tutorial = None):
         questions = questions.filter(is_spam = False)
 
     context = {
-        'questions': questions,
+        'questions': listed(questions),
         'category': category,
         'tutorial': tutorial,
     }
@@ -373,13 +399,23 @@ def new_question(request):
             question.body = cleaned_data['body']
             question.views = 1
             question.save()
-            question.userViews.add(request.user)
+            viewCounter.add_viewer(question, request.user)
             if (str(question.sub_category) == 'None'):
                 question.sub_category = ""
-            if (predict(question.body) == "Spam"):
+            fingerprint = spamFingerprint.signature(question.body)
+            if (spamFingerprint.is_spam_duplicate(fingerprint)):
+                # A near-duplicate of known spam, no need to ask the spam filter
                 question.is_spam = True
+            elif (settings.SPAM_CLASSIFY_QUEUE):
+                spamQueue.hold(question)
+            else:
+                spamFilter.apply_score(question, spamFilter.score(question.body, question.category_id))
+                spamShadow.submit(question.body, question.category_id, question.spam_score)
 
             question.save()
+            spamFingerprint.add(question, fingerprint)
+            if (question.spam_pending):
+                spamQueue.notify()
 
             #Sending email when a new question is asked
             sender_name = "FOSSEE Forums"
@@ -404,7 +440,7 @@ def new_question(request):
                 question.category,
                 question.body,
                 settings.DOMAIN_NAME + '/question/'+ str(question.id),
-                question.is_spam,
+                "Pending" if question.spam_pending else question.is_spam,
             )
             email = EmailMultiAlternatives(
                 subject, '',
@@ -417,7 +453,7 @@ def new_question(request):
             email.mixed_subtype = 'related'
             email.send(fail_silently = True)
 
-            if (question.is_spam):
+            if (question.is_spam and not question.spam_pending):
                 return HttpResponseRedirect('/')
             return HttpResponseRedirect('/question/{0}/'.format(question.id))
 
@@ -484,17 +520,38 @@ def edit_question(request, question_id):
 
             question.title = cleaned_data['title']
             question.body = cleaned_data['body']
+            previous_is_spam = question.is_spam
             question.is_spam = cleaned_data['is_spam']
+            if (is_moderator(request.user) and question.is_spam != previous_is_spam):
+                spamFilter.learn(question.body, question.is_spam)
+            if (is_moderator(request.user)):
+                question.spam_pending = False
+                question.spam_review = False
+                question.spam_moderated = True
+            else:
+                # No moderator has seen the edited question yet
+                question.spam_moderated = False
             question.views = 1
             question.save()
-            question.userViews.add(request.user)
+            viewCounter.add_viewer(question, request.user)
             if str(question.sub_category) == 'None':
                 question.sub_category = ""
-            if (not settings.MODERATOR_ACTIVATED):
-                if (predict(question.body) == "Spam"):
+
+            # Checked again like a new question, unless a moderator decided
+            fingerprint = spamFingerprint.signature(question.body)
+            if (not settings.MODERATOR_ACTIVATED and not question.spam_moderated):
+                if (spamFingerprint.is_spam_duplicate(fingerprint, question)):
                     question.is_spam = True
+                elif (settings.SPAM_CLASSIFY_QUEUE):
+                    spamQueue.hold(question)
+                else:
+                    spamFilter.apply_score(question, spamFilter.score(question.body, question.category_id))
+                    spamShadow.submit(question.body, question.category_id, question.spam_score)
 
             question.save()
+            spamFingerprint.add(question, fingerprint)
+            if (question.spam_pending):
+                spamQueue.notify()
 
             # Sending email when a new question is asked
             sender_name = "FOSSEE Forums"
@@ -667,13 +724,23 @@ def mark_answer_spam(request, answer_id):
     question_id = answer.question.id
 
     if (request.method == "POST"):
+        previous_is_spam = answer.is_spam
+        was_pending = answer.spam_pending
         type = request.POST['selector']
         if (type == "spam"):
             answer.is_spam = True
         else:
             answer.is_spam = False
+        if (answer.is_spam != previous_is_spam):
+            spamFilter.learn(answer.body, answer.is_spam)
+        answer.spam_pending = False
+        answer.spam_review = False
+        answer.spam_moderated = True
 
     answer.save()
+    # The moderator took the answer off the queue, so the queue will not notify about it
+    if (request.method == "POST" and was_pending and not answer.is_spam):
+        spamQueue.publish_answer(answer)
     return HttpResponseRedirect('/question/{0}/#answer{1}/'.format(question_id, answer.id))
 
 # return number of votes and initial votes
@@ -794,7 +861,13 @@ def user_notifications(request, user_id):
 
     if (user_id == request.user.id):
         try:
-            notifications = Notification.objects.filter(uid = user_id).order_by('-date_created')
+            notifications = list(Notification.objects.filter(uid = user_id).order_by('-date_created'))
+            # The posts notified about, fetched at once
+            questions = Question.objects.in_bulk(set(notification.qid for notification in notifications))
+            answers = Answer.objects.in_bulk(set(notification.aid for notification in notifications))
+            for notification in notifications:
+                notification.question = questions.get(notification.qid)
+                notification.answer = answers.get(notification.aid)
             context = {
                 'notifications': notifications,
             }
@@ -834,8 +907,8 @@ def moderator_home(request):
 
     # If user is a master moderator
     if (request.user.groups.filter(name = "forum_moderator").exists()):
-        questions = Question.objects.all().order_by('-date_created')
-        categories = FossCategory.objects.order_by('name')
+        questions = listed(Question.objects.all().order_by('-date_created'))
+        categories = counted(FossCategory.objects.order_by('name'))
 
     else:
         # Finding the moderator's categories
@@ -845,7 +918,7 @@ def moderator_home(request):
         # Getting the questions related to moderator's categories
         questions = []
         for category in categories:
-            questions.extend(Question.objects.filter(category__name = category.name).order_by('-date_created'))
+            questions.extend(listed(Question.objects.filter(category__name = category.name).order_by('-date_created')))
 
     context = {
         'questions': questions,
@@ -861,7 +934,7 @@ def moderator_questions(request):
 
     # If user is a master moderator
     if (request.user.groups.filter(name = "forum_moderator").exists()):
-        questions = Question.objects.all().order_by('-date_created')
+        questions = listed(Question.objects.all().order_by('-date_created'))
         if ('spam' in request.GET):
             questions = questions.filter(is_spam = True)
         elif ('non-spam' in request.GET):
@@ -872,7 +945,7 @@ def moderator_questions(request):
         questions = []
         for group in request.user.groups.all():
             category = ModeratorGroup.objects.get(group = group).category
-            questions_to_add = Question.objects.filter(category__name = category.name).order_by('-date_created')
+            questions_to_add = listed(Question.objects.filter(category__name = category.name).order_by('-date_created'))
             if ('spam' in request.GET):
                 questions_to_add = questions_to_add.filter(is_spam = True)
             elif ('non-spam' in request.GET):
@@ -892,14 +965,14 @@ def moderator_unanswered(request):
 
     # If user is a master moderator
     if (request.user.groups.filter(name = "forum_moderator").exists()):
-        questions = Question.objects.all().filter(is_spam = True).order_by('date_created').reverse()
+        questions = listed(Question.objects.all().filter(is_spam = True).order_by('date_created').reverse())
 
     else:
         # Finding the moderator's category questions
         questions = []
         for group in request.user.groups.all():
             category = ModeratorGroup.objects.get(group = group).category
-            questions.extend(Question.objects.filter(category__name = category.name).order_by('-date_created'))
+            questions.extend(listed(Question.objects.filter(category__name = category.name).order_by('-date_created')))
 
     context = {
         'questions': questions,
@@ -907,14 +980,125 @@ def moderator_unanswered(request):
 
     return render(request, 'website/templates/moderator/unanswered.html', context)
 
-# Re-training spam filter
+# Posts held for review by the spam filter, the ones closest to spam first
+@login_required
+@user_passes_test(is_moderator)
+def moderator_review(request):
+
+    questions = Question.objects.filter(spam_review = True)
+    answers = Answer.objects.filter(spam_review = True)
+
+    # If user is not a master moderator, only the moderator's categories
+    if (not request.user.groups.filter(name = "forum_moderator").exists()):
+        categories = [ModeratorGroup.objects.get(group = group).category for group in request.user.groups.all()]
+        questions = questions.filter(category__in = categories)
+        answers = answers.filter(question__category__in = categories)
+
+    context = {
+        'questions': questions.select_related('category', 'user').order_by('-spam_score'),
+        'answers': answers.select_related('question__category').order_by('-spam_score'),
+    }
+
+    return render(request, 'website/templates/moderator/review.html', context)
+
+# Moderator decision on a question or answer held for review
+@login_required
+@user_passes_test(is_moderator)
+def moderator_review_post(request, post_type, post_id):
+
+    if (post_type == 'question'):
+        post = get_object_or_404(Question, id = post_id, spam_review = True)
+    elif (post_type == 'answer'):
+        post = get_object_or_404(Answer, id = post_id, spam_review = True)
+    else:
+        raise Http404
+
+    if (request.method == "POST"):
+        post.is_spam = (request.POST['selector'] == "spam")
+        post.spam_pending = False
+        post.spam_review = False
+        post.spam_moderated = True
+        post.save()
+        # A held post was unsure for the model, the decision is worth learning either way
+        spamFilter.learn(post.body, post.is_spam)
+        if (post_type == 'answer' and not post.is_spam):
+            spamQueue.publish_answer(post)
+        messages.info(request, 'Marked {0} {1} as {2}.'.format(
+            post_type, post.id, "spam" if post.is_spam else "not spam"))
+
+    return HttpResponseRedirect(reverse('website:moderator_review'))
+
+# Re-training spam filter in the background, the new model is a candidate until a moderator promotes it
 @login_required
 @user_passes_test(is_moderator)
 def train_spam_filter(request):
 
-    train()
+    job_id = spamJobs.start_training()
+    status_url = reverse('website:train_spam_filter_status', args = (job_id, ))
+
+    if (request.is_ajax()):
+        return JsonResponse({'job_id': job_id, 'status_url': status_url}, status = 202)
+
+    messages.info(request, 'Re-training spam filter, job id {0}. Promote the new model from the spam model page once it is trained.'.format(job_id))
     return HttpResponseRedirect('/moderator/')
 
+# Comparison of the candidate spam model with the live one, and promoting,
+# discarding or rolling back models
+@login_required
+@user_passes_test(is_moderator)
+def moderator_spam_model(request):
+
+    if (request.method == "POST"):
+        action = request.POST.get('action')
+        if (action == 'promote'):
+            version = spamFilter.promote()
+            message = 'Spam model {0} is now live.'
+        elif (action == 'discard'):
+            version = spamFilter.discard_candidate()
+            message = 'Discarded candidate spam model {0}.'
+        elif (action == 'rollback'):
+            version = spamFilter.rollback()
+            message = 'Rolled back to spam model {0}.'
+        else:
+            raise Http404
+        if version is None:
+            messages.info(request, 'No spam model to {0}.'.format(action))
+        else:
+            messages.info(request, message.format(version))
+        return HttpResponseRedirect(reverse('website:moderator_spam_model'))
+
+    context = {
+        'live': spamFilter.live_artifact(),
+        'report': spamShadow.report(),
+        'can_rollback': spamFilter.rollback_version() is not None,
+        'metrics': spamMetrics.summary(),
+        'cache': spamFilter.predict_cache_info(),
+    }
+
+    return render(request, 'website/templates/moderator/spam-model.html', context)
+
+# Spam filter metrics of this server process as plain text, for moderators
+# and for metrics collectors on the addresses in SPAM_METRICS_IPS
+def spam_metrics(request):
+
+    if (request.META.get('REMOTE_ADDR') not in settings.SPAM_METRICS_IPS and
+            not (request.user.is_authenticated and is_moderator(request.user))):
+        return HttpResponseForbidden()
+
+    queue = spamQueue.queue_stats() if settings.SPAM_CLASSIFY_QUEUE else None
+    text = spamMetrics.render(spamFilter.live_info(), spamFilter.predict_cache_info(), queue)
+    return HttpResponse(text, content_type = 'text/plain; version=0.0.4; charset=utf-8')
+
+# Status of a spam filter re-training job
+@login_required
+@user_passes_test(is_moderator)
+def train_spam_filter_status(request, job_id):
+
+    job = spamJobs.get_job(job_id)
+    if job is None:
+        raise Http404
+    return JsonResponse(job)
+
 # AJAX SECTION
 # All the ajax views go below
 @csrf_exempt
@@ -947,6 +1131,7 @@ def ajax_answer_update(request):
             if (is_moderator(request.user)):
                 answer.body = str(body)
                 answer.save()
+                spamFingerprint.add(answer)
                 return HttpResponse('saved')
             else:
                 return HttpResponse('Only moderator can update.')
@@ -998,7 +1183,7 @@ def ajax_keyword_search(request):
     if request.method == "POST":
         key = request.POST['key']
 
-        questions = Question.objects.filter(title__contains = key).filter(is_spam=False)
+        questions = listed(Question.objects.filter(title__contains = key).filter(is_spam=False))
         context = {
             'questions': questions
         }
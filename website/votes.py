@@ -0,0 +1,26 @@
+# Vote state of a user on many posts at once, for the pages showing which
+# questions or answers the user voted on. Looking it up per post takes two
+# queries for every post on the page, this takes two for all of them.
+
+# Dict of post id to (upvoted, downvoted), each 1 or 0, for the given posts,
+# questions or answers but not both. No query for an anonymous user.
+def vote_state(user, posts):
+
+    posts = list(posts)
+    if not posts or user.is_anonymous:
+        return dict((post.id, (0, 0)) for post in posts)
+
+    model = type(posts[0])
+    ids = [post.id for post in posts]
+    voted = []
+    for votes in (model.userUpVotes, model.userDownVotes):
+        # The user's rows of the vote table among the posts
+        post_field = votes.field.m2m_field_name()
+        user_field = votes.field.m2m_reverse_field_name()
+        voted.append(set(votes.through.objects.filter(**{
+            user_field: user.id,
+            post_field + '__in': ids,
+        }).values_list(post_field, flat = True)))
+
+    upvoted, downvoted = voted
+    return dict((post_id, (int(post_id in upvoted), int(post_id in downvoted))) for post_id in ids)